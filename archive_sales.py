@@ -0,0 +1,52 @@
+"""
+ย้ายประวัติการขายเก่าออกจากไฟล์หลักไปเก็บเป็นไฟล์ archive รายเดือน
+ไฟล์หลักจึงเล็กและเร็ว ส่วนรายงาน/ค้นหาประวัติยังเห็นบิลที่ย้ายไปแล้ว
+
+ใช้งาน:
+    python archive_sales.py                    เก็บ 12 เดือนล่าสุดไว้ในไฟล์หลัก
+    python archive_sales.py --months 6 --vacuum
+    python archive_sales.py --list             ดูเดือนที่ย้ายไปแล้ว
+
+ควรรันตอนร้านปิด (ระหว่างย้ายจะจองล็อกเขียนทีละเดือน)
+ไฟล์ archive อยู่ในโฟลเดอร์ archive ข้างไฟล์ .db ต้องสำรองไปพร้อมกับไฟล์หลัก
+"""
+
+import argparse
+import sys
+
+from database import ShabuDatabase
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ย้ายประวัติการขายเก่าไปไฟล์ archive รายเดือน")
+    parser.add_argument("--db", default="shabu_pos.db", help="ไฟล์ฐานข้อมูลของร้าน")
+    parser.add_argument("--months", type=int, default=12,
+                        help="จำนวนเดือนล่าสุดที่เก็บไว้ในไฟล์หลัก (ไม่นับเดือนปัจจุบัน)")
+    parser.add_argument("--archive-dir", default="archive",
+                        help="โฟลเดอร์เก็บไฟล์ archive (นับจากโฟลเดอร์ของไฟล์ .db)")
+    parser.add_argument("--vacuum", action="store_true", help="ลดขนาดไฟล์หลักหลังย้าย")
+    parser.add_argument("--list", action="store_true", help="แสดงเดือนที่ย้ายไปแล้ว")
+    args = parser.parse_args(argv)
+
+    db = ShabuDatabase(args.db)
+    try:
+        if not args.list:
+            moved = db.archive_sales(args.months, args.archive_dir, vacuum=args.vacuum)
+            if moved is None:
+                return 1
+            for month, count in moved:
+                print(f"✓ ย้ายบิลเดือน {month}: {count:,} บิล")
+            if not moved:
+                print("ไม่มีบิลที่เก่ากว่าเกณฑ์")
+
+        print(f"\n{'เดือน':<10} {'บิล':>10} {'ยอดขาย':>14}  ไฟล์")
+        for archive in db.get_archive_months():
+            print(f"{archive['month']:<10} {archive['bills']:>10,} "
+                  f"{archive['revenue']:>14,}  {archive['path']}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+สำรองฐานข้อมูลอัตโนมัติขณะร้านเปิด (snapshot ตามรอบเวลา พร้อมหมุนเวียนไฟล์เก่า)
+ใช้ SQLite online backup API ทีละน้อย จึงไม่ต้องปิดโปรแกรมและไม่ถ่วงการชำระเงิน
+
+ใช้งาน:
+    scheduler = BackupScheduler("shabu_pos.db")     สำรองทุก backup_interval วินาที
+    scheduler.backup_now()
+    scheduler.stop()
+
+    python backup_scheduler.py                      สำรองทันทีหนึ่งครั้ง
+    python backup_scheduler.py --list               ดู snapshot ที่มี
+    python backup_scheduler.py --verify FILE        ตรวจไฟล์สำรอง
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from database import DEFAULT_PROFILE, ShabuDatabase
+
+
+class BackupScheduler:
+    """Thread สำรองฐานข้อมูลตามรอบเวลา เป็นเจ้าของการเชื่อมต่อของตัวเองเหมือน DatabaseWorker
+
+    snapshot แรกเริ่มเมื่อ snapshot ล่าสุดเก่ากว่า backup_interval
+    (เปิดปิดโปรแกรมบ่อย ๆ จึงไม่สร้างไฟล์ซ้ำทุกครั้ง) backup_interval = 0 สำรองเมื่อสั่งเท่านั้น
+    """
+
+    def __init__(self, db_name="shabu_pos.db", profile=None):
+        self.db_name = db_name
+        self.profile = profile
+        self.interval = dict(DEFAULT_PROFILE, **(profile or {}))["backup_interval"]
+        self.last_result = None
+        self.last_attempt = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self.thread = threading.Thread(target=self._run, name="ShabuBackupScheduler",
+                                       daemon=True)
+        self.thread.start()
+
+    # ==================== API (เรียกจาก main thread) ====================
+
+    def backup_now(self):
+        """สั่ง snapshot ทันที (ทำบน thread ของ scheduler)"""
+        self._wake.set()
+
+    def stop(self, timeout=30):
+        """หยุด scheduler (รอ snapshot ที่กำลังทำอยู่ให้เสร็จ)"""
+        self._stopping = True
+        self._wake.set()
+        self.thread.join(timeout)
+
+    # ==================== Scheduler Thread ====================
+
+    def _run(self):
+        db = ShabuDatabase(self.db_name, profile=self.profile)
+        try:
+            delay = self._first_delay(db)
+            while True:
+                self._wake.wait(delay)
+                self._wake.clear()
+                if self._stopping:
+                    break
+                self.last_attempt = time.time()
+                result = db.snapshot()
+                if result is not None:
+                    self.last_result = result
+                    print(f"✓ สำรองข้อมูลแล้ว: {result['path']} ({result['seconds']} วินาที)")
+                delay = self.interval or None
+        finally:
+            db.close()
+
+    def _first_delay(self, db):
+        if not self.interval:
+            return None
+        snapshots = db.list_snapshots()
+        if not snapshots:
+            return 0
+        age = time.time() - snapshots[0]['timestamp'].timestamp()
+        return max(0.0, self.interval - age)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="สำรองฐานข้อมูลขณะโปรแกรมเปิดใช้งาน")
+    parser.add_argument("--db", default="shabu_pos.db", help="ไฟล์ฐานข้อมูลของร้าน")
+    parser.add_argument("--dir", help="โฟลเดอร์เก็บ snapshot (ค่าเริ่มต้น backups)")
+    parser.add_argument("--keep", type=int, help="จำนวน snapshot ล่าสุดที่เก็บไว้")
+    parser.add_argument("--list", action="store_true", help="แสดง snapshot ที่มี")
+    parser.add_argument("--verify", metavar="FILE", help="ตรวจ integrity ของไฟล์สำรอง")
+    args = parser.parse_args(argv)
+
+    db = ShabuDatabase(args.db)
+    try:
+        if args.verify:
+            if not os.path.exists(args.verify):
+                print(f"✗ ไม่พบไฟล์ {args.verify}")
+                return 1
+            result = db.verify_backup(args.verify)
+            print(f"{args.verify}: {result}")
+            return 0 if result == "ok" else 1
+
+        if not args.list:
+            result = db.snapshot(args.dir, args.keep)
+            if result is None:
+                return 1
+            print(f"✓ สำรองข้อมูลแล้ว: {result['path']} "
+                  f"({result['bytes']:,} ไบต์, {result['seconds']} วินาที, "
+                  f"integrity {result['integrity']})")
+
+        for snapshot in db.list_snapshots(args.dir):
+            archives = " (+archive)" if snapshot['archive_dir'] else ""
+            print(f"{snapshot['timestamp']:%Y-%m-%d %H:%M:%S}  {snapshot['bytes']:>14,}  "
+                  f"{snapshot['path']}{archives}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+วัดความเร็วของเมธอดหลักใน ShabuDatabase บนฐานข้อมูลจำลอง
+ใช้งาน:
+    python benchmark_db.py                           สร้างข้อมูลจำลองตามค่าเริ่มต้น แล้ววัดผล
+    python benchmark_db.py --bills 100000            กำหนดจำนวนบิลย้อนหลัง
+    python benchmark_db.py --output baseline.json    บันทึกผลเป็น JSON
+    python benchmark_db.py --compare baseline.json   เทียบกับผลครั้งก่อน (exit 1 ถ้าช้าลงเกินเกณฑ์)
+
+ฐานข้อมูลจำลองเก็บไว้ในโฟลเดอร์ชั่วคราวตามขนาดข้อมูล และใช้ซ้ำในรอบถัดไป
+(ใช้ --fresh เพื่อสร้างใหม่) ไม่แตะไฟล์ shabu_pos.db ของร้าน
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import ShabuDatabase
+from query_stats import percentile
+
+DEFAULT_VOLUMES = {
+    "tables": 50,
+    "menu_items": 300,
+    "bills": 1_000_000,
+    "items_per_bill": 4,
+    "days": 365,
+}
+
+# จำนวนครั้งที่เรียกแต่ละเมธอด (get_all_sales ดึงทุกบิล จึงเรียกไม่กี่ครั้ง)
+DEFAULT_ITERATIONS = {
+    "add_order_item": 2000,
+    "get_table_orders": 2000,
+    "add_sale": 1000,
+    "get_all_sales": 3,
+    "search_sales": 300,
+    "get_sale_details": 2000,
+    "delete_sale": 1000,
+}
+
+GENERATE_CHUNK = 10000
+SEARCH_LIMIT = 200
+
+
+# ==================== Synthetic Data ====================
+
+def scratch_path(volumes):
+    """ชื่อไฟล์ฐานข้อมูลจำลองตามขนาดข้อมูล"""
+    name = "shabu_bench_{tables}t_{menu_items}m_{bills}b_{items_per_bill}i.db".format(**volumes)
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def generate_data(db, volumes, seed=0):
+    """เติมโต๊ะ เมนู และบิลย้อนหลังลงฐานข้อมูลจำลอง
+
+    บิลย้อนหลังใส่ทีละชุดด้วย executemany (ไม่ผ่าน add_sale ทีละบิล)
+    แต่ยังผ่าน trigger ของดัชนีค้นหาและตารางสรุปยอดเหมือนข้อมูลจริง
+    """
+    rng = random.Random(seed)
+    tables = [f"T{i}" for i in range(1, volumes["tables"] + 1)]
+    menu = {f"เมนู {i:03d}": rng.randrange(30, 400) for i in range(1, volumes["menu_items"] + 1)}
+    for table_name in tables:
+        db.add_table(table_name)
+    for name, price in menu.items():
+        db.add_menu_item(name, price)
+
+    menu_items = list(menu.items())
+    start = datetime.now() - timedelta(days=volumes["days"])
+    span = volumes["days"] * 86400
+    total_bills = volumes["bills"]
+    began = time.perf_counter()
+
+    for offset in range(0, total_bills, GENERATE_CHUNK):
+        count = min(GENERATE_CHUNK, total_bills - offset)
+        # เวลาเรียงจากเก่าไปใหม่ เหมือนบิลที่เกิดขึ้นจริง
+        seconds = sorted(rng.randrange(span) for _ in range(count))
+        sales = []
+        items = []
+        for index, second in enumerate(seconds):
+            sale_id = offset + index + 1
+            lines = rng.sample(menu_items, min(volumes["items_per_bill"], len(menu_items)))
+            quantities = [rng.randint(1, 3) for _ in lines]
+            total = sum(price * quantity for (_, price), quantity in zip(lines, quantities))
+            created_at = (start + timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S")
+            sales.append((sale_id, f"B-{sale_id:08d}", rng.choice(tables), total, created_at))
+            items.extend((sale_id, name, price, quantity)
+                         for (name, price), quantity in zip(lines, quantities))
+
+        db._begin_write()
+        db.cursor.executemany(
+            "INSERT INTO sales_history (id, bill_id, table_name, total_amount, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            sales
+        )
+        db.cursor.executemany(
+            "INSERT INTO sale_items (sale_id, menu_name, price, quantity) VALUES (?, ?, ?, ?)",
+            items
+        )
+        db.conn.commit()
+        done = offset + count
+        print(f"\r  บิลย้อนหลัง {done:,}/{total_bills:,} "
+              f"({time.perf_counter() - began:.0f} s)", end="", flush=True)
+    if total_bills:
+        print()
+    db.cursor.execute("ANALYZE")
+    db.conn.commit()
+
+
+def open_scratch_database(volumes, path=None, fresh=False, seed=0):
+    """เปิดฐานข้อมูลจำลอง สร้างข้อมูลใหม่ถ้ายังไม่มีหรือสั่ง --fresh"""
+    path = path or scratch_path(volumes)
+    if fresh:
+        remove_database(path)
+    db = ShabuDatabase(path)
+    db.cursor.execute("SELECT COUNT(*) FROM sales_history")
+    if db.cursor.fetchone()[0] < volumes["bills"] or not db.get_all_tables():
+        db.close()
+        remove_database(path)
+        db = ShabuDatabase(path)
+        print(f"กำลังสร้างข้อมูลจำลองที่ {path}")
+        generate_data(db, volumes, seed)
+    else:
+        print(f"ใช้ข้อมูลจำลองเดิมที่ {path}")
+    return db
+
+
+# ==================== Timing ====================
+
+def time_calls(method, calls):
+    """เรียก method ตาม args ใน calls ทีละครั้ง คืนค่า (สถิติ, ผลลัพธ์)"""
+    latencies = []
+    results = []
+    began = time.perf_counter()
+    for args, kwargs in calls:
+        start = time.perf_counter()
+        results.append(method(*args, **kwargs))
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    stats = {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0.0,
+        "max_ms": round(latencies[-1] * 1000, 4) if latencies else 0.0,
+        "ops_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    return stats, results
+
+
+def run_benchmarks(db, volumes, iterations, seed=0):
+    """วัดเมธอดหลักตามลำดับที่ใช้งานจริง: สั่งอาหาร -> ดูบิล -> ชำระ -> ค้นประวัติ -> ลบ"""
+    rng = random.Random(seed + 1)
+    tables = db.get_all_tables()
+    menu_items = list(db.get_all_menu_items().items())
+    results = {}
+
+    def report(name, stats):
+        results[name] = stats
+        print(f"  {name:<18} n={stats['count']:<6} p50={stats['p50_ms']:>9.3f} ms  "
+              f"p99={stats['p99_ms']:>9.3f} ms  {stats['ops_per_sec']:>10.1f} ops/s")
+
+    # ออเดอร์ค้างของรอบก่อนจะทำให้ผลไม่คงที่
+    db._begin_write()
+    db.cursor.execute("DELETE FROM orders")
+    db.conn.commit()
+
+    calls = []
+    for _ in range(iterations["add_order_item"]):
+        name, price = rng.choice(menu_items)
+        calls.append(((rng.choice(tables), name, price), {}))
+    report("add_order_item", time_calls(db.add_order_item, calls)[0])
+
+    calls = [((rng.choice(tables),), {}) for _ in range(iterations["get_table_orders"])]
+    report("get_table_orders", time_calls(db.get_table_orders, calls)[0])
+
+    calls = []
+    for _ in range(iterations["add_sale"]):
+        lines = rng.sample(menu_items, min(volumes["items_per_bill"], len(menu_items)))
+        items = [{'name': name, 'price': price, 'quantity': rng.randint(1, 3)}
+                 for name, price in lines]
+        total = sum(item['price'] * item['quantity'] for item in items)
+        calls.append(((None, rng.choice(tables), items, total), {"bill_prefix": "BENCH"}))
+    stats, new_bills = time_calls(db.add_sale, calls)
+    report("add_sale", stats)
+
+    calls = [((), {}) for _ in range(iterations["get_all_sales"])]
+    report("get_all_sales", time_calls(db.get_all_sales, calls)[0])
+
+    # ค้นหาแบบที่หน้าประวัติใช้: ชื่อโต๊ะ เลขบิล วันที่ และข้อความสั้น (LIKE)
+    today = datetime.now()
+    queries = [
+        lambda: ((rng.choice(tables), "table"), {}),
+        lambda: ((f"{rng.randrange(volumes['bills'] or 1) + 1:08d}"[:6], "bill_id"), {}),
+        lambda: (((today - timedelta(days=rng.randrange(volumes["days"] or 1))).strftime("%Y-%m-%d"),
+                  "date"), {}),
+        lambda: ((str(rng.randrange(1, 10)), "all"), {}),
+    ]
+    calls = []
+    for index in range(iterations["search_sales"]):
+        args, kwargs = queries[index % len(queries)]()
+        kwargs["limit"] = SEARCH_LIMIT
+        calls.append((args, kwargs))
+    report("search_sales", time_calls(db.search_sales, calls)[0])
+
+    bill_count = volumes["bills"]
+    calls = []
+    for _ in range(iterations["get_sale_details"]):
+        if bill_count:
+            calls.append(((f"B-{rng.randrange(bill_count) + 1:08d}",), {}))
+        else:
+            calls.append(((rng.choice(new_bills),), {}))
+    report("get_sale_details", time_calls(db.get_sale_details, calls)[0])
+
+    # ลบเฉพาะบิลที่ add_sale สร้างในรอบนี้ ข้อมูลจำลองจึงคงเดิมสำหรับรอบถัดไป
+    deletable = [bill_id for bill_id in new_bills if bill_id][:iterations["delete_sale"]]
+    calls = [((bill_id,), {}) for bill_id in deletable]
+    report("delete_sale", time_calls(db.delete_sale, calls)[0])
+
+    db._begin_write()
+    db.cursor.execute("DELETE FROM orders")
+    db.conn.commit()
+    return results
+
+
+# ==================== Baseline ====================
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_baseline(db, volumes, iterations, results):
+    return {
+        "meta": {
+            "commit": git_revision(),
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "schema_version": db.get_schema_version(),
+            "volumes": volumes,
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """เทียบผลกับ baseline คืนค่ารายชื่อเมธอดที่ p50 หรือ p99 ช้าลงเกิน threshold"""
+    print(f"\n=== เทียบกับ baseline (commit {baseline['meta'].get('commit')}) ===")
+    if baseline["meta"].get("volumes") != current["meta"]["volumes"]:
+        print("! ขนาดข้อมูลไม่ตรงกับ baseline ผลเทียบอาจไม่มีความหมาย")
+    regressions = []
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            print(f"  {name:<18} (ไม่มีใน baseline)")
+            continue
+        changes = []
+        slower = False
+        for key in ("p50_ms", "p99_ms"):
+            change = (stats[key] - old[key]) / old[key] if old[key] else 0.0
+            changes.append(f"{key[:3]} {old[key]:.3f} -> {stats[key]:.3f} ms ({change:+.0%})")
+            slower = slower or change > threshold
+        mark = "✗" if slower else "✓"
+        print(f"{mark} {name:<18} " + "  ".join(changes))
+        if slower:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="วัดความเร็ว ShabuDatabase บนข้อมูลจำลอง")
+    for key, value in DEFAULT_VOLUMES.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=value,
+                            help=f"ค่าเริ่มต้น {value}")
+    parser.add_argument("--iterations", type=float, default=1.0,
+                        help="ตัวคูณจำนวนครั้งที่เรียกแต่ละเมธอด")
+    parser.add_argument("--db", help="ไฟล์ฐานข้อมูลจำลอง (ค่าเริ่มต้นอยู่ในโฟลเดอร์ชั่วคราว)")
+    parser.add_argument("--fresh", action="store_true", help="สร้างข้อมูลจำลองใหม่")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="บันทึกผลเป็นไฟล์ JSON")
+    parser.add_argument("--compare", help="ไฟล์ JSON baseline ที่จะเทียบ")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="สัดส่วนที่ถือว่าช้าลง (ค่าเริ่มต้น 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    volumes = {key: getattr(args, key) for key in DEFAULT_VOLUMES}
+    iterations = {name: max(1, int(count * args.iterations))
+                  for name, count in DEFAULT_ITERATIONS.items()}
+
+    db = open_scratch_database(volumes, args.db, args.fresh, args.seed)
+    print("\n=== ผลการวัด ===")
+    results = run_benchmarks(db, volumes, iterations, args.seed)
+    current = build_baseline(db, volumes, iterations, results)
+    db.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ บันทึกผลที่ {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"\n✗ ช้าลงเกิน {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print("\n✓ ไม่มีเมธอดที่ช้าลงเกินเกณฑ์")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
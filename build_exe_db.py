@@ -1,18 +1,88 @@
 """
 สคริปต์สำหรับแปลง main_with_database.py เป็นไฟล์ .exe
-ใช้งาน: python build_exe_db.py
+ใช้งาน:
+    python build_exe_db.py              สร้างแบบโฟลเดอร์ (onedir) เปิดเร็ว แนะนำ
+    python build_exe_db.py onefile      สร้างเป็นไฟล์เดียว (ต้องแตกไฟล์ทุกครั้งที่เปิด)
+    python build_exe_db.py importtime   วัดเวลา import ของโปรแกรมด้วย -X importtime
 """
 
 import os
+import subprocess
 import sys
 
-def build_exe():
+APP_NAME = "POS ชาบู (Database)"
+
+# โมดูลของโปรแกรมที่ import ภายในฟังก์ชัน (PyInstaller มองไม่เห็นเอง)
+# main_with_database.spec อ่านรายการนี้และ EXCLUDED_MODULES จากไฟล์นี้ แก้ที่นี่ที่เดียว
+HIDDEN_IMPORTS = [
+    "database",
+    "db_worker",
+    "pos_service",
+    "query_stats",
+    "ui_profiler",
+    "backup_scheduler",
+    "order_server",
+    "sales_analytics",
+]
+
+# โมดูลมาตรฐานที่โปรแกรมไม่ได้ใช้ ตัดออกเพื่อให้ bundle เล็กและโหลดเร็วขึ้น
+EXCLUDED_MODULES = [
+    "unittest",
+    "doctest",
+    "pydoc",
+    "pdb",
+    "lib2to3",
+    "distutils",
+    "email",
+    "http",
+    "xmlrpc",
+    "xml",
+    "html",
+    "multiprocessing",
+    # asyncio/concurrent ใช้กับ --serve (order_server) โหลดเฉพาะตอนเปิดเซิร์ฟเวอร์
+    "ssl",
+    "tkinter.test",
+    "test",
+]
+
+
+def measure_import_time(top=15):
+    """วัดเวลา import ของ main_with_database ด้วย python -X importtime"""
+    print("=" * 60)
+    print("วัดเวลา import (-X importtime)")
+    print("=" * 60)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main_with_database"],
+        capture_output=True, text=True
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+
+    if not rows:
+        print("✗ ไม่สามารถวัดเวลา import ได้")
+        print(result.stderr)
+        return []
+
+    total = max(row[0] for row in rows)
+    print(f"เวลา import รวม: {total / 1000:.1f} ms\n")
+    print(f"{'cumulative (ms)':>16} {'self (ms)':>10}  โมดูล")
+    for cumulative_us, self_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>16.1f} {self_us / 1000:>10.1f}  {module}")
+    return rows
+
+
+def build_exe(mode="onedir"):
     """สร้างไฟล์ .exe จาก main_with_database.py"""
-    
+
     print("=" * 60)
-    print("กำลังแปลงโปรแกรมเป็นไฟล์ .exe (เวอร์ชัน Database)")
+    print(f"กำลังแปลงโปรแกรมเป็นไฟล์ .exe (เวอร์ชัน Database, โหมด {mode})")
     print("=" * 60)
-    
+
     # ตรวจสอบว่าติดตั้ง PyInstaller แล้วหรือยัง
     try:
         import PyInstaller
@@ -22,31 +92,43 @@ def build_exe():
         print("\nกำลังติดตั้ง PyInstaller...")
         os.system(f"{sys.executable} -m pip install pyinstaller")
         print("✓ ติดตั้ง PyInstaller เรียบร้อย")
-    
+
     # คำสั่งสร้าง .exe
-    # --onefile = รวมทุกอย่างเป็นไฟล์เดียว
+    # --onedir = แตกไฟล์ไว้ในโฟลเดอร์ครั้งเดียว เปิดโปรแกรมได้ทันที (ไม่ต้องแตกไฟล์ทุกครั้ง)
+    # --onefile = รวมทุกอย่างเป็นไฟล์เดียว (ต้องแตกไฟล์ไปโฟลเดอร์ชั่วคราวทุกครั้งที่เปิด)
     # --windowed = ไม่แสดง console window
     # --name = ชื่อไฟล์ .exe
-    # --add-data = เพิ่มไฟล์ database.py
-    
-    command = f'pyinstaller --onefile --windowed --name "POS ชาบู (Database)" --hidden-import=database main_with_database.py'
-    
+    # --hidden-import = โมดูลที่ import ภายในฟังก์ชัน
+    # --exclude-module = ตัดโมดูลที่ไม่ได้ใช้
+    # --noupx = ไม่บีบอัดด้วย UPX (บีบอัดแล้วต้องคลายทุกครั้งที่เปิด ทำให้ช้าลง)
+
+    hidden = " ".join(f"--hidden-import={module}" for module in HIDDEN_IMPORTS)
+    excludes = " ".join(f"--exclude-module={module}" for module in EXCLUDED_MODULES)
+    command = (f'pyinstaller --{mode} --windowed --noupx --name "{APP_NAME}" '
+               f'{hidden} {excludes} main_with_database.py')
+
     print("\nกำลังสร้างไฟล์ .exe...")
     print(f"คำสั่ง: {command}")
     print("-" * 60)
-    
+
     result = os.system(command)
-    
+
     if result == 0:
         print("\n" + "=" * 60)
         print("✓ สร้างไฟล์ .exe สำเร็จ!")
         print("=" * 60)
-        print("\nไฟล์ .exe อยู่ที่: dist/POS ชาบู (Database).exe")
-        print("\nวิธีใช้งาน:")
-        print("1. คลิกเปิดไฟล์ .exe ได้เลย (ไม่ต้องติดตั้ง Python)")
-        print("2. ข้อมูลจะถูกบันทึกในไฟล์ shabu_pos.db (SQLite)")
-        print("3. เปิด-ปิดโปรแกรมได้ตามต้องการ ข้อมูลจะไม่หาย")
-        print("4. ไม่กินแรมเมื่อไม่ได้ใช้งาน")
+        if mode == "onedir":
+            print(f"\nโปรแกรมอยู่ที่โฟลเดอร์: dist/{APP_NAME}/")
+            print(f"ไฟล์ที่ต้องเปิด: dist/{APP_NAME}/{APP_NAME}.exe")
+            print("\nวิธีใช้งาน:")
+            print("1. คัดลอกทั้งโฟลเดอร์ไปไว้ที่เครื่องแคชเชียร์")
+            print("2. สร้าง Shortcut ของไฟล์ .exe ไว้ที่หน้าจอ แล้วดับเบิลคลิกเปิด")
+        else:
+            print(f"\nไฟล์ .exe อยู่ที่: dist/{APP_NAME}.exe")
+            print("\nวิธีใช้งาน:")
+            print("1. คลิกเปิดไฟล์ .exe ได้เลย (ไม่ต้องติดตั้ง Python)")
+        print("- ข้อมูลจะถูกบันทึกในไฟล์ shabu_pos.db (SQLite)")
+        print("- เปิด-ปิดโปรแกรมได้ตามต้องการ ข้อมูลจะไม่หาย")
         print("\nข้อดี:")
         print("- ✓ ใช้ SQLite Database (รวดเร็ว ปลอดภัย)")
         print("- ✓ ค้นหาข้อมูลได้เร็ว")
@@ -58,4 +140,10 @@ def build_exe():
         print("=" * 60)
 
 if __name__ == "__main__":
-    build_exe()
+    arg = sys.argv[1] if len(sys.argv) > 1 else "onedir"
+    if arg == "importtime":
+        measure_import_time()
+    elif arg in ("onedir", "onefile"):
+        build_exe(arg)
+    else:
+        print(__doc__)
@@ -0,0 +1,118 @@
+"""
+ส่งออกการเปลี่ยนแปลงของสาขา (change_log) เป็นไฟล์ JSON lines บีบอัด gzip สำหรับรวมยอดที่ส่วนกลาง
+แต่ละรอบส่งเฉพาะที่เปลี่ยนหลัง checkpoint ครั้งก่อน จึงเล็กตามจำนวนบิลใหม่ ไม่ใช่ขนาดฐานข้อมูล
+
+ใช้งาน:
+    python change_export.py                      ส่งออกการเปลี่ยนแปลงใหม่ไปโฟลเดอร์ outbox
+    python change_export.py --full               ส่งข้อมูลทั้งหมด (ครั้งแรก หรือส่วนกลางเริ่มใหม่)
+    python change_export.py --prune              ลบ change_log ที่ส่งออกแล้วจากไฟล์หลัก
+
+รูปแบบไฟล์ (<สาขา>-<since>-<until>.jsonl.gz):
+    บรรทัดแรก   {"format": "shabu-changes", "version": 1, "branch": ..., "since": ..., "until": ..., "full": ...}
+    บรรทัดต่อไป {"seq": ..., "entity": "sale|menu|table", "op": "insert|update|delete|clear",
+                 "key": ..., "data": ..., "at": ...}
+ไฟล์ถูกเขียนเป็น .part แล้วเปลี่ยนชื่อเมื่อเสร็จ ฝั่งรับจึงไม่เห็นไฟล์ที่เขียนไม่ครบ
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+
+from database import ShabuDatabase
+
+FORMAT = "shabu-changes"
+VERSION = 1
+
+
+def export_changes(db, outbox="outbox", since=None, full=False, batch_size=1000):
+    """เขียนการเปลี่ยนแปลงหลัง since (ค่าเริ่มต้น = checkpoint ที่บันทึกไว้) ลงไฟล์ใน outbox
+
+    ยังไม่เคยส่งออก (ไม่มี checkpoint) จะส่งแบบ full อัตโนมัติ
+    คืนค่า dict: path, since, until, records, full หรือ None ถ้าไม่มีอะไรใหม่
+    """
+    checkpoint = db.get_sync_value("exported_seq")
+    if since is None:
+        if checkpoint is None:
+            full = True
+        since = int(checkpoint or 0)
+    until = db.get_change_seq()
+    if not full and until <= since:
+        return None
+
+    branch = db.get_branch_id()
+    name = f"{branch}-full-{until:012d}" if full else f"{branch}-{since:012d}-{until:012d}"
+    os.makedirs(outbox, exist_ok=True)
+    path = os.path.join(outbox, name + ".jsonl.gz")
+    header = {"format": FORMAT, "version": VERSION, "branch": branch,
+              "since": 0 if full else since, "until": until, "full": full}
+    records = db.iter_snapshot(batch_size) if full else db.iter_changes(since, until, batch_size)
+
+    count = 0
+    try:
+        with gzip.open(path + ".part", "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                count += 1
+        os.replace(path + ".part", path)
+    finally:
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+
+    if checkpoint is None or until > int(checkpoint):
+        db.set_sync_value("exported_seq", until)
+    return {"path": path, "since": header["since"], "until": until, "records": count,
+            "full": full}
+
+
+def read_changes(path):
+    """อ่านไฟล์ที่ส่งออก คืนค่า (header, generator ของรายการ)"""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("format") != FORMAT or header.get("version") != VERSION:
+        f.close()
+        raise ValueError(f"{path}: ไม่ใช่ไฟล์ {FORMAT} เวอร์ชัน {VERSION}")
+
+    def records():
+        with f:
+            for line in f:
+                yield json.loads(line)
+    return header, records()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ส่งออกการเปลี่ยนแปลงของสาขาเป็นไฟล์ .jsonl.gz")
+    parser.add_argument("--db", default="shabu_pos.db", help="ไฟล์ฐานข้อมูลของร้าน")
+    parser.add_argument("--outbox", default="outbox", help="โฟลเดอร์เก็บไฟล์ที่ส่งออก")
+    parser.add_argument("--full", action="store_true", help="ส่งข้อมูลปัจจุบันทั้งหมด")
+    parser.add_argument("--since", type=int, help="ส่งตั้งแต่ seq นี้ (ไม่ใช้ checkpoint)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="จำนวนแถวที่อ่านจากฐานข้อมูลต่อครั้ง")
+    parser.add_argument("--prune", action="store_true",
+                        help="ลบ change_log ที่ส่งออกแล้ว (หลังส่วนกลางได้รับไฟล์แล้ว)")
+    args = parser.parse_args(argv)
+
+    db = ShabuDatabase(args.db)
+    try:
+        result = export_changes(db, args.outbox, args.since, args.full, args.batch_size)
+        if result is None:
+            print("ไม่มีการเปลี่ยนแปลงใหม่")
+        else:
+            kind = "ทั้งหมด" if result["full"] else f"seq {result['since'] + 1}-{result['until']}"
+            print(f"✓ ส่งออก {result['records']:,} รายการ ({kind}): {result['path']}")
+
+        if args.prune:
+            checkpoint = int(db.get_sync_value("exported_seq", 0))
+            deleted = db.prune_changes(checkpoint)
+            if deleted is None:
+                return 1
+            print(f"✓ ลบ change_log ที่ส่งออกแล้ว {deleted:,} แถว (ถึง seq {checkpoint})")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,646 @@
+"""
+รวมยอดขายของหลายสาขาเป็นฐานข้อมูลรายงานของส่วนกลาง (head office)
+แต่ละสาขาคือไฟล์ shabu_pos.db หรือโฟลเดอร์ outbox ที่ได้จาก change_export.py
+
+ใช้งาน:
+    python consolidate.py branches/*.db                       รวมทุกสาขาลง head_office.db
+    python consolidate.py สีลม=inbox/silom บางนา=bangna.db    ตั้งชื่อสาขาเอง (ชื่อ=path)
+    python consolidate.py branches/*.db --jobs 8
+    python consolidate.py --report                            ดูยอดรวมแยกสาขา/วัน/เมนู
+
+ทุกรอบอ่านเฉพาะการเปลี่ยนแปลงหลัง watermark (seq ล่าสุดที่รวมแล้ว) ของแต่ละสาขา
+สาขาที่ยังไม่เคยรวม ไฟล์ถูกแทนที่ (รหัสสาขาเปลี่ยน) หรือ change_log ถูก prune ข้ามไป จะรวมใหม่ทั้งสาขา
+ไฟล์ .db ของสาขาเปิดแบบอ่านอย่างเดียว ไฟล์เวอร์ชันเก่าที่ยังไม่มี change_log จะรวมใหม่ทั้งสาขาทุกรอบ
+การอ่านแต่ละสาขาทำใน process pool พร้อมกัน (ผลเขียนลงไฟล์ staging)
+แล้ว process หลักนำไฟล์ staging เข้าฐานข้อมูลรวมด้วย ATTACH ทีละสาขาใน transaction เดียว
+รหัสบิลของแต่ละสาขาอาจซ้ำกัน ฐานข้อมูลรวมจึงอ้างบิลด้วย (สาขา, bill_id) และ bill_key = "สาขา:bill_id"
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from change_export import read_changes
+from database import read_only_uri
+
+OUTBOX_FILE = re.compile(r"^([0-9a-f]+)-(full|\d+)-(\d+)\.jsonl\.gz$")
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS branches (
+        name TEXT PRIMARY KEY,
+        branch_id TEXT,
+        source TEXT,
+        last_seq INTEGER,
+        synced_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales (
+        branch TEXT NOT NULL,
+        bill_id TEXT NOT NULL,
+        bill_key TEXT NOT NULL UNIQUE,
+        table_name TEXT,
+        total_amount INTEGER NOT NULL,
+        created_at TIMESTAMP,
+        PRIMARY KEY (branch, bill_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sale_items (
+        branch TEXT NOT NULL,
+        bill_id TEXT NOT NULL,
+        menu_name TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sale_items_bill ON sale_items(branch, bill_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_created ON sales(created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS menu_items (
+        branch TEXT NOT NULL,
+        name TEXT NOT NULL,
+        price INTEGER,
+        PRIMARY KEY (branch, name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tables (
+        branch TEXT NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (branch, name)
+    )
+    """,
+    # ตารางสรุปรายวัน/รายเมนูต่อสาขา ปรับด้วย trigger เหมือนตารางสรุปของแต่ละสาขา
+    """
+    CREATE TABLE IF NOT EXISTS summary_daily (
+        branch TEXT NOT NULL,
+        day TEXT NOT NULL,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        bills INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (branch, day)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS summary_menu (
+        branch TEXT NOT NULL,
+        day TEXT NOT NULL,
+        menu_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (branch, day, menu_name)
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sales_insert AFTER INSERT ON sales
+    BEGIN
+        INSERT INTO summary_daily (branch, day, revenue, bills)
+        VALUES (NEW.branch, date(NEW.created_at, 'localtime'), NEW.total_amount, 1)
+        ON CONFLICT (branch, day) DO UPDATE SET
+            revenue = revenue + excluded.revenue, bills = bills + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sales_delete AFTER DELETE ON sales
+    BEGIN
+        UPDATE summary_daily SET revenue = revenue - OLD.total_amount, bills = bills - 1
+        WHERE branch = OLD.branch AND day = date(OLD.created_at, 'localtime');
+    END
+    """,
+    # รายการในบิลต้องเข้าหลังหัวบิล และลบก่อนหัวบิล (ใช้วันที่ของบิล)
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sale_items_insert AFTER INSERT ON sale_items
+    BEGIN
+        INSERT INTO summary_menu (branch, day, menu_name, quantity, revenue)
+        SELECT NEW.branch, date(s.created_at, 'localtime'), NEW.menu_name,
+               NEW.quantity, NEW.price * NEW.quantity
+        FROM sales s WHERE s.branch = NEW.branch AND s.bill_id = NEW.bill_id
+        ON CONFLICT (branch, day, menu_name) DO UPDATE SET
+            quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sale_items_delete AFTER DELETE ON sale_items
+    BEGIN
+        UPDATE summary_menu SET quantity = quantity - OLD.quantity,
+               revenue = revenue - OLD.price * OLD.quantity
+        WHERE branch = OLD.branch AND menu_name = OLD.menu_name
+          AND day = (SELECT date(created_at, 'localtime') FROM sales
+                     WHERE branch = OLD.branch AND bill_id = OLD.bill_id);
+    END
+    """,
+]
+
+# ไฟล์ staging ที่ worker เขียน: ผลสุทธิของการเปลี่ยนแปลงในรอบนี้ (บิลเดียวแก้หลายครั้งเหลือแถวเดียว)
+STAGING_SCHEMA = [
+    "CREATE TABLE meta (name TEXT PRIMARY KEY, value)",
+    """
+    CREATE TABLE sales (
+        bill_id TEXT PRIMARY KEY, table_name TEXT, total_amount INTEGER, created_at TIMESTAMP
+    )
+    """,
+    "CREATE TABLE sale_items (bill_id TEXT, menu_name TEXT, price INTEGER, quantity INTEGER)",
+    "CREATE INDEX idx_sale_items_bill ON sale_items(bill_id)",
+    "CREATE TABLE removed_bills (bill_id TEXT PRIMARY KEY)",
+    "CREATE TABLE menu_items (name TEXT PRIMARY KEY, price INTEGER, deleted INTEGER)",
+    "CREATE TABLE tables (name TEXT PRIMARY KEY, deleted INTEGER)",
+]
+
+
+# ==================== Extraction (worker process) ====================
+
+def branch_name(source):
+    """ชื่อสาขาจาก path: ไฟล์ใช้ชื่อไฟล์ (ไม่มีนามสกุล) โฟลเดอร์ใช้ชื่อโฟลเดอร์"""
+    base = os.path.basename(os.path.normpath(source))
+    return os.path.splitext(base)[0] if os.path.isfile(source) else base
+
+
+class Staging:
+    """เขียนผลสุทธิของการเปลี่ยนแปลงลงไฟล์ staging (ใช้ใน worker)"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        for statement in STAGING_SCHEMA:
+            self.conn.execute(statement)
+        self.reset_all = False
+        self.reset_sales = False
+        self.records = 0
+
+    def reset(self):
+        """ข้อมูลชุดใหม่ทั้งสาขา (snapshot): ล้างของเดิมของสาขาก่อนนำเข้า"""
+        for table in ("sales", "sale_items", "removed_bills", "menu_items", "tables"):
+            self.conn.execute(f"DELETE FROM {table}")
+        self.reset_all = True
+
+    def apply(self, record):
+        entity, op, key, data = record['entity'], record['op'], record['key'], record['data']
+        execute = self.conn.execute
+        self.records += 1
+        if entity == "sale":
+            if op == "clear":
+                for table in ("sales", "sale_items", "removed_bills"):
+                    execute(f"DELETE FROM {table}")
+                self.reset_sales = True
+                return
+            execute("DELETE FROM sale_items WHERE bill_id=?", (key,))
+            if op == "delete":
+                execute("DELETE FROM sales WHERE bill_id=?", (key,))
+                execute("INSERT OR IGNORE INTO removed_bills (bill_id) VALUES (?)", (key,))
+            else:
+                execute("INSERT OR REPLACE INTO sales VALUES (?, ?, ?, ?)",
+                        (key, data['table'], data['total'], data['created_at']))
+                self.conn.executemany(
+                    "INSERT INTO sale_items VALUES (?, ?, ?, ?)",
+                    [(key, name, price, quantity) for name, price, quantity in data['items']]
+                )
+        elif entity == "menu":
+            if op in ("update", "delete"):
+                execute("INSERT OR REPLACE INTO menu_items VALUES (?, NULL, 1)", (key,))
+            if op == "update":
+                execute("INSERT OR REPLACE INTO menu_items VALUES (?, ?, 0)",
+                        (data['name'], data['price']))
+            elif op == "insert":
+                execute("INSERT OR REPLACE INTO menu_items VALUES (?, ?, 0)", (key, data['price']))
+        elif entity == "table":
+            if op in ("update", "delete"):
+                execute("INSERT OR REPLACE INTO tables VALUES (?, 1)", (key,))
+            if op == "update":
+                execute("INSERT OR REPLACE INTO tables VALUES (?, 0)", (data['name'],))
+            elif op == "insert":
+                execute("INSERT OR REPLACE INTO tables VALUES (?, 0)", (key,))
+
+    def close(self, branch_id, until):
+        self.conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("branch_id", branch_id), ("until", until),
+            ("reset_all", int(self.reset_all)), ("reset_sales", int(self.reset_sales)),
+        ])
+        self.conn.commit()
+        self.conn.close()
+
+
+def extract_branch(name, source, branch_id, last_seq, staging_path):
+    """อ่านการเปลี่ยนแปลงของสาขาหลัง last_seq ลงไฟล์ staging (รันใน process pool)
+
+    คืนค่า dict: name, source, branch_id, until, records, full, staging
+    """
+    staging = Staging(staging_path)
+    if os.path.isdir(source):
+        branch_id, until = _extract_outbox(source, branch_id, last_seq, staging)
+    else:
+        branch_id, until = _extract_database(source, branch_id, last_seq, staging)
+    staging.close(branch_id, until)
+    return {"name": name, "source": source, "branch_id": branch_id, "until": until,
+            "records": staging.records, "full": staging.reset_all, "staging": staging_path}
+
+
+def _extract_database(path, known_branch, last_seq, staging):
+    """อ่านจากไฟล์ .db ของสาขาโดยตรงแบบอ่านอย่างเดียว (ไม่ migrate ไม่เปลี่ยน journal mode)
+
+    ไฟล์เวอร์ชันเก่าที่ยังไม่มี change_log อ่านทั้งสาขาทุกรอบ (รหัสสาขาเป็น None)
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    conn = sqlite3.connect(read_only_uri(path), uri=True)
+    try:
+        conn.execute("PRAGMA query_only = ON")
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if "change_log" not in tables:
+            staging.reset()
+            for record in _iter_file_snapshot(conn, tables, path, 0):
+                staging.apply(record)
+            return None, 0
+
+        row = conn.execute("SELECT value FROM sync_state WHERE name='branch_id'").fetchone()
+        branch_id = row[0] if row else None
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='change_log'").fetchone()
+        until = row[0] if row else 0
+        oldest = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+        full = (last_seq is None or branch_id != known_branch or until < last_seq
+                or (oldest is not None and oldest > last_seq + 1)
+                or (oldest is None and until > last_seq))
+        if full:
+            staging.reset()
+            records = _iter_file_snapshot(conn, tables, path, until)
+        else:
+            records = _iter_file_changes(conn, last_seq, until)
+        for record in records:
+            staging.apply(record)
+        return branch_id, until
+    finally:
+        conn.close()
+
+
+def _iter_file_changes(conn, since, until, batch_size=1000):
+    """change_log หลัง since ถึง until ในรูปแบบเดียวกับ ShabuDatabase.iter_changes"""
+    while since < until:
+        rows = conn.execute("""
+            SELECT seq, entity, op, key, data, created_at FROM change_log
+            WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?
+        """, (since, until, batch_size)).fetchall()
+        if not rows:
+            return
+        for seq, entity, op, key, data, created_at in rows:
+            yield {'seq': seq, 'entity': entity, 'op': op, 'key': key,
+                   'data': json.loads(data) if data is not None else None, 'at': created_at}
+        since = rows[-1][0]
+
+
+def _iter_file_snapshot(conn, tables, path, seq, batch_size=1000):
+    """ข้อมูลทั้งหมดของไฟล์สาขาในรูปแบบเดียวกับ ShabuDatabase.iter_snapshot (รวมไฟล์ archive)"""
+    for name, price in conn.execute("SELECT name, price FROM menu_items ORDER BY id").fetchall():
+        yield {'seq': seq, 'entity': 'menu', 'op': 'insert', 'key': name,
+               'data': {'price': price}, 'at': None}
+    for (table_name,) in conn.execute("SELECT table_name FROM tables ORDER BY id").fetchall():
+        yield {'seq': seq, 'entity': 'table', 'op': 'insert', 'key': table_name,
+               'data': None, 'at': None}
+
+    sources = []
+    if "archive_months" in tables:
+        # path ของไฟล์ archive เป็น relative กับไฟล์หลัก เหมือน ShabuDatabase._data_path
+        folder = os.path.dirname(os.path.abspath(path))
+        archives = conn.execute(
+            "SELECT path FROM archive_months WHERE status='done' ORDER BY month"
+        ).fetchall()
+        for (relative_path,) in archives:
+            archive_path = os.path.join(folder, relative_path)
+            if not os.path.exists(archive_path):
+                continue
+            archive = sqlite3.connect(read_only_uri(archive_path), uri=True)
+            # บิลที่ลบแล้วอาจค้างในไฟล์ archive: เอาเฉพาะบิลที่ยังอยู่ใน archived_bills
+            archive.execute("ATTACH DATABASE ? AS live", (read_only_uri(path),))
+            archive.execute("""
+                CREATE TEMP VIEW sales_history AS SELECT * FROM main.sales_history
+                WHERE bill_id IN (SELECT bill_id FROM live.archived_bills)
+            """)
+            archive.execute("PRAGMA query_only = ON")
+            sources.append(archive)
+    sources.append(conn)
+
+    try:
+        for source in sources:
+            for bill_id, sale in _iter_file_sales(source, batch_size):
+                yield {'seq': seq, 'entity': 'sale', 'op': 'insert', 'key': bill_id,
+                       'data': sale, 'at': sale['created_at']}
+    finally:
+        for source in sources[:-1]:
+            source.close()
+
+
+def _iter_file_sales(conn, batch_size):
+    """บิลพร้อมรายการทีละ batch_size บิล (ไฟล์ก่อนมีคอลัมน์ quantity นับแถวละ 1 ชิ้น)"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sale_items)")}
+    quantity = "quantity" if "quantity" in columns else "1"
+    last_id = 0
+    while True:
+        sales = conn.execute("""
+            SELECT id, bill_id, table_name, total_amount, created_at FROM sales_history
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, batch_size)).fetchall()
+        if not sales:
+            return
+        items = {}
+        rows = conn.execute(f"""
+            SELECT sale_id, menu_name, price, {quantity} FROM sale_items
+            WHERE sale_id BETWEEN ? AND ? ORDER BY sale_id, id
+        """, (sales[0][0], sales[-1][0]))
+        for sale_id, name, price, count in rows:
+            items.setdefault(sale_id, []).append([name, price, count])
+        for sale_id, bill_id, table_name, total, created_at in sales:
+            yield bill_id, {
+                "table": table_name,
+                "total": total,
+                "created_at": created_at,
+                "items": items.get(sale_id, []),
+            }
+        last_id = sales[-1][0]
+
+
+def _extract_outbox(folder, known_branch, last_seq, staging):
+    """อ่านไฟล์ .jsonl.gz จาก change_export.py ต่อกันเป็นช่วง seq ตั้งแต่ last_seq"""
+    full_files, change_files, branches = [], [], set()
+    for filename in os.listdir(folder):
+        match = OUTBOX_FILE.match(filename)
+        if not match:
+            continue
+        branch_id, since, until = match.group(1), match.group(2), int(match.group(3))
+        branches.add(branch_id)
+        path = os.path.join(folder, filename)
+        if since == "full":
+            full_files.append((until, path))
+        else:
+            change_files.append((int(since), until, path))
+    if not branches:
+        raise ValueError(f"{folder}: ไม่มีไฟล์ที่ส่งออกจาก change_export.py")
+    if len(branches) > 1:
+        raise ValueError(f"{folder}: มีไฟล์ของหลายสาขา ({', '.join(sorted(branches))}) "
+                         "แยกโฟลเดอร์ละหนึ่งสาขา")
+    branch_id = branches.pop()
+
+    def next_file(position):
+        # ไฟล์ที่ครอบ seq ถัดไปและไปได้ไกลที่สุด
+        candidates = [(until, path) for since, until, path in change_files
+                      if since <= position < until]
+        return max(candidates) if candidates else None
+
+    position = last_seq
+    if (last_seq is None or branch_id != known_branch
+            or (next_file(last_seq) is None
+                and any(until > last_seq for _, until, _ in change_files))):
+        if not full_files:
+            raise ValueError(f"{folder}: ต้องการไฟล์ full (รัน change_export.py --full ที่สาขา)")
+        position, path = max(full_files)
+        staging.reset()
+        _, records = read_changes(path)
+        for record in records:
+            staging.apply(record)
+
+    while True:
+        found = next_file(position)
+        if found is None:
+            return branch_id, position
+        until, path = found
+        _, records = read_changes(path)
+        for record in records:
+            if record['seq'] > position:
+                staging.apply(record)
+        position = until
+
+
+# ==================== Consolidated Database ====================
+
+class ConsolidatedDatabase:
+    """ฐานข้อมูลรายงานของส่วนกลาง (เขียนจาก process เดียว)"""
+
+    def __init__(self, db_name="head_office.db"):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.cursor = self.conn.cursor()
+        for statement in SCHEMA:
+            self.cursor.execute(statement)
+        self.conn.commit()
+
+    def get_watermarks(self):
+        """คืนค่า dict ชื่อสาขา -> (branch_id, last_seq)"""
+        self.cursor.execute("SELECT name, branch_id, last_seq FROM branches")
+        return {row[0]: (row[1], row[2]) for row in self.cursor.fetchall()}
+
+    def apply_branch(self, result):
+        """นำไฟล์ staging ของสาขาเข้าฐานข้อมูลรวมและเลื่อน watermark ใน transaction เดียว"""
+        branch = result['name']
+        self.cursor.execute("ATTACH DATABASE ? AS staging", (result['staging'],))
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.execute("SELECT name, value FROM staging.meta")
+            meta = dict(self.cursor.fetchall())
+            if meta['reset_all']:
+                for table in ("sale_items", "sales", "menu_items", "tables"):
+                    self.cursor.execute(f"DELETE FROM {table} WHERE branch=?", (branch,))
+            elif meta['reset_sales']:
+                for table in ("sale_items", "sales"):
+                    self.cursor.execute(f"DELETE FROM {table} WHERE branch=?", (branch,))
+
+            # บิลที่ถูกลบหรือแก้ในรอบนี้: ลบของเดิมก่อน (รายการก่อนหัวบิล ให้ trigger หาวันที่ได้)
+            changed = """
+                SELECT bill_id FROM staging.removed_bills UNION SELECT bill_id FROM staging.sales
+            """
+            self.cursor.execute(
+                f"DELETE FROM sale_items WHERE branch=? AND bill_id IN ({changed})", (branch,)
+            )
+            self.cursor.execute(
+                f"DELETE FROM sales WHERE branch=? AND bill_id IN ({changed})", (branch,)
+            )
+            self.cursor.execute("""
+                INSERT INTO sales (branch, bill_id, bill_key, table_name, total_amount, created_at)
+                SELECT ?1, bill_id, ?1 || ':' || bill_id, table_name, total_amount, created_at
+                FROM staging.sales
+            """, (branch,))
+            self.cursor.execute("""
+                INSERT INTO sale_items (branch, bill_id, menu_name, price, quantity)
+                SELECT ?, bill_id, menu_name, price, quantity FROM staging.sale_items
+            """, (branch,))
+
+            self.cursor.execute("""
+                DELETE FROM menu_items WHERE branch=? AND name IN (SELECT name FROM staging.menu_items)
+            """, (branch,))
+            self.cursor.execute("""
+                INSERT INTO menu_items (branch, name, price)
+                SELECT ?, name, price FROM staging.menu_items WHERE deleted = 0
+            """, (branch,))
+            self.cursor.execute("""
+                DELETE FROM tables WHERE branch=? AND name IN (SELECT name FROM staging.tables)
+            """, (branch,))
+            self.cursor.execute("""
+                INSERT INTO tables (branch, name) SELECT ?, name FROM staging.tables WHERE deleted = 0
+            """, (branch,))
+
+            self.cursor.execute("""
+                INSERT OR REPLACE INTO branches (name, branch_id, source, last_seq, synced_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (branch, meta['branch_id'], result['source'], meta['until']))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด ({branch}): {e}")
+            self.conn.rollback()
+            return False
+        finally:
+            self.cursor.execute("DETACH DATABASE staging")
+
+    # ==================== Reports ====================
+
+    def get_branch_summary(self):
+        """ยอดรวมแยกสาขา พร้อม watermark และเวลาที่รวมล่าสุด"""
+        self.cursor.execute("""
+            SELECT b.name, COALESCE(SUM(d.bills), 0), COALESCE(SUM(d.revenue), 0),
+                   b.last_seq, b.synced_at
+            FROM branches b LEFT JOIN summary_daily d ON d.branch = b.name
+            GROUP BY b.name ORDER BY 3 DESC
+        """)
+        return [{
+            'branch': row[0],
+            'bills': row[1],
+            'revenue': row[2],
+            'last_seq': row[3],
+            'synced_at': row[4]
+        } for row in self.cursor.fetchall()]
+
+    def get_daily_sales(self, days=7):
+        """ยอดขายรวมทุกสาขาของ days วันล่าสุดที่มีการขาย (วันล่าสุดก่อน)"""
+        self.cursor.execute("""
+            SELECT day, SUM(bills), SUM(revenue), COUNT(DISTINCT branch) FROM summary_daily
+            WHERE bills > 0 GROUP BY day ORDER BY day DESC LIMIT ?
+        """, (days,))
+        return [{'day': row[0], 'bills': row[1], 'revenue': row[2], 'branches': row[3]}
+                for row in self.cursor.fetchall()]
+
+    def get_top_menu(self, limit=10):
+        """เมนูขายดีรวมทุกสาขา"""
+        self.cursor.execute("""
+            SELECT menu_name, SUM(quantity), SUM(revenue) FROM summary_menu
+            GROUP BY menu_name HAVING SUM(quantity) > 0 ORDER BY 2 DESC LIMIT ?
+        """, (limit,))
+        return [{'name': row[0], 'quantity': row[1], 'revenue': row[2]}
+                for row in self.cursor.fetchall()]
+
+    def close(self):
+        self.conn.close()
+
+
+# ==================== Consolidation ====================
+
+def parse_sources(args):
+    """แปลงอาร์กิวเมนต์ "path" หรือ "ชื่อ=path" เป็น list ของ (ชื่อสาขา, path)"""
+    sources = []
+    for arg in args:
+        name, sep, path = arg.partition("=")
+        if not sep:
+            name, path = branch_name(arg), arg
+        sources.append((name, path))
+    names = [name for name, _ in sources]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"ชื่อสาขาซ้ำ: {', '.join(duplicates)} (ตั้งชื่อด้วย ชื่อ=path)")
+    return sources
+
+
+def consolidate(db, sources, jobs=None):
+    """รวมทุกสาขาเข้าฐานข้อมูลรวม คืนค่า list ผลของแต่ละสาขา (มี 'error' เมื่อไม่สำเร็จ)"""
+    watermarks = db.get_watermarks()
+    staging_dir = tempfile.mkdtemp(prefix="consolidate-",
+                                   dir=os.path.dirname(os.path.abspath(db.db_name)))
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {}
+            for index, (name, source) in enumerate(sources):
+                branch_id, last_seq = watermarks.get(name, (None, None))
+                staging_path = os.path.join(staging_dir, f"branch-{index}.db")
+                future = pool.submit(extract_branch, name, os.path.abspath(source),
+                                     branch_id, last_seq, staging_path)
+                futures[future] = name
+            # นำเข้าทีละสาขาตามลำดับที่อ่านเสร็จ ระหว่างนั้น worker อ่านสาขาอื่นต่อ
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"name": futures[future], "error": str(e)}
+                else:
+                    if (result['records'] or result['full']) and not db.apply_branch(result):
+                        result['error'] = "นำเข้าไม่สำเร็จ"
+                    os.remove(result['staging'])
+                results.append(result)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return results
+
+
+def print_report(db, days):
+    print(f"\n{'สาขา':<20} {'บิล':>10} {'ยอดขาย':>14} {'seq':>10}  รวมล่าสุด")
+    for row in db.get_branch_summary():
+        print(f"{row['branch']:<20} {row['bills']:>10,} {row['revenue']:>14,} "
+              f"{row['last_seq'] or 0:>10}  {row['synced_at']}")
+    print(f"\n{'วันที่':<12} {'สาขา':>6} {'บิล':>10} {'ยอดขาย':>14}")
+    for row in db.get_daily_sales(days):
+        print(f"{row['day']:<12} {row['branches']:>6} {row['bills']:>10,} {row['revenue']:>14,}")
+    print(f"\n{'เมนูขายดี':<24} {'จำนวน':>10} {'ยอดขาย':>14}")
+    for row in db.get_top_menu():
+        print(f"{row['name']:<24} {row['quantity']:>10,} {row['revenue']:>14,}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="รวมยอดขายหลายสาขาเป็นฐานข้อมูลรายงานส่วนกลาง")
+    parser.add_argument("sources", nargs="*",
+                        help="ไฟล์ .db หรือโฟลเดอร์ outbox ของแต่ละสาขา (ตั้งชื่อด้วย ชื่อ=path)")
+    parser.add_argument("--output", default="head_office.db", help="ไฟล์ฐานข้อมูลรวม")
+    parser.add_argument("--jobs", type=int, help="จำนวน process ที่อ่านสาขาพร้อมกัน (ค่าเริ่มต้น = จำนวน CPU)")
+    parser.add_argument("--report", action="store_true", help="แสดงรายงานหลังรวม")
+    parser.add_argument("--days", type=int, default=7, help="จำนวนวันในรายงานรายวัน")
+    args = parser.parse_args(argv)
+
+    # Windows ไม่ขยาย *.db ให้ใน command line
+    paths = []
+    for arg in args.sources:
+        matches = sorted(glob.glob(arg)) if any(c in arg for c in "*?[") else []
+        paths.extend(matches or [arg])
+    try:
+        sources = parse_sources(paths)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+
+    db = ConsolidatedDatabase(args.output)
+    try:
+        failed = 0
+        if sources:
+            started = time.perf_counter()
+            results = consolidate(db, sources, args.jobs)
+            for result in sorted(results, key=lambda row: row['name']):
+                if 'error' in result:
+                    failed += 1
+                    print(f"✗ {result['name']}: {result['error']}")
+                else:
+                    kind = "ทั้งสาขา" if result['full'] else "ส่วนที่เปลี่ยน"
+                    print(f"✓ {result['name']}: {result['records']:,} รายการ ({kind}) "
+                          f"ถึง seq {result['until']}")
+            print(f"รวม {len(sources)} สาขาใน {time.perf_counter() - started:.1f} วินาที")
+        if args.report or not sources:
+            print_report(db, args.days)
+        return 1 if failed else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
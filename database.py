@@ -1,26 +1,591 @@
-import sqlite3
+import csv
 import json
+import os
+import shutil
+import sqlite3
+import time
 from datetime import datetime
+from pathlib import Path
+
+from query_stats import QueryStats, TimedCursor, timed_method
+
+# RETURNING ใช้ได้ตั้งแต่ SQLite 3.35
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# ==================== Connection Profile ====================
+# ค่าเริ่มต้นสำหรับใช้หลายเครื่องพร้อมกัน (แคชเชียร์หลายจุด + จอครัว)
+# - WAL: ผู้อ่านไม่บล็อกผู้เขียน และผู้เขียนไม่บล็อกผู้อ่าน
+# - synchronous=NORMAL: ใน WAL ปลอดภัยต่อไฟดับระดับ transaction และ fsync น้อยลง
+# หมายเหตุ: WAL ใช้ไม่ได้กับไฟล์บน network share ให้ใช้ journal_mode="DELETE" แทน
+DEFAULT_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,          # ค่าลบ = หน่วย KiB (ประมาณ 16 MB)
+    "mmap_size": 64 * 1024 * 1024,
+    "busy_timeout": 5000,          # มิลลิวินาที ที่ SQLite รอเองก่อนคืน SQLITE_BUSY
+    "busy_retries": 5,             # จำนวนครั้งที่ลองใหม่หลัง busy_timeout หมด
+    "busy_backoff": 0.05,          # วินาที เริ่มต้นของ backoff (เพิ่มเท่าตัวทุกครั้ง)
+    "slow_query_ms": 50,           # คำสั่งที่ใช้เวลาตั้งแต่ค่านี้ถูกบันทึกลง slow-query log
+    "slow_query_log": "shabu_slow_queries.log",  # None = ไม่เขียนไฟล์ (ยังเก็บสถิติ)
+    "slow_query_log_bytes": 1024 * 1024,         # ขนาดไฟล์ก่อนหมุนเป็นไฟล์ใหม่
+    "slow_query_log_backups": 3,
+    "backup_dir": "backups",       # โฟลเดอร์ snapshot (นับจากโฟลเดอร์ของไฟล์ .db)
+    "backup_keep": 24,             # จำนวน snapshot ล่าสุดที่เก็บไว้
+    "backup_interval": 3600,       # วินาที ระหว่าง snapshot อัตโนมัติ (0 = ปิด)
+    "backup_pages": 64,            # จำนวนหน้าที่คัดลอกต่อรอบ
+    "backup_pause": 0.01,          # วินาที ที่พักระหว่างรอบ ให้ผู้เขียนคนอื่นได้ใช้ดิสก์
+}
+
+
+def is_busy_error(error):
+    """ตรวจว่าเป็นข้อผิดพลาดจากฐานข้อมูลถูกล็อก (SQLITE_BUSY / SQLITE_LOCKED)"""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def read_only_uri(path):
+    """URI สำหรับเปิดไฟล์แบบอ่านอย่างเดียว (sqlite3.connect(..., uri=True) หรือ ATTACH)"""
+    return Path(path).resolve().as_uri() + "?mode=ro"
+
+# ==================== Schema Migrations ====================
+# เงื่อนไขของ trigger สรุปยอด: ไม่ทำงานระหว่างย้ายบิลเข้า/ออกจากไฟล์ archive
+NOT_ARCHIVING = "NOT EXISTS (SELECT 1 FROM archive_months WHERE status = 'moving')"
+
+# ดัชนีค้นหา sales_search (FTS5 trigram ต้องใช้ SQLite 3.34 ขึ้นไป)
+SEARCH_INDEX_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS sales_search USING fts5(
+        bill_id, table_name, total_text, created_at, tokenize='trigram'
+    )
+    """,
+    """
+    INSERT INTO sales_search (rowid, bill_id, table_name, total_text, created_at)
+    SELECT id, bill_id, table_name, CAST(total_amount AS TEXT), created_at FROM sales_history
+    """,
+    # trigger ทำให้ดัชนีตรงกับ sales_history เสมอ ไม่ว่าจะเขียนผ่านเมธอดใด
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sales_search_insert AFTER INSERT ON sales_history BEGIN
+        INSERT INTO sales_search (rowid, bill_id, table_name, total_text, created_at)
+        VALUES (new.id, new.bill_id, new.table_name, CAST(new.total_amount AS TEXT), new.created_at);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sales_search_delete AFTER DELETE ON sales_history BEGIN
+        DELETE FROM sales_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_sales_search_update AFTER UPDATE ON sales_history BEGIN
+        UPDATE sales_search SET bill_id = new.bill_id, table_name = new.table_name,
+               total_text = CAST(new.total_amount AS TEXT), created_at = new.created_at
+        WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def create_search_index(cursor):
+    """สร้างดัชนีค้นหา sales_search ถ้า SQLite ของเครื่องรองรับ FTS5 trigram
+    
+    ไม่รองรับก็ข้ามไป (การค้นหาใช้ LIKE แทน ดู has_search_index) migration อื่นจึงยังทำงานต่อได้
+    """
+    try:
+        cursor.execute(SEARCH_INDEX_SQL[0])
+    except sqlite3.OperationalError as e:
+        print(f"⚠ ข้ามดัชนีค้นหา FTS5 trigram (SQLite {sqlite3.sqlite_version}): {e}")
+        return
+    for statement in SEARCH_INDEX_SQL[1:]:
+        cursor.execute(statement)
+
+
+# แต่ละรายการคือ (เวอร์ชัน, คำอธิบาย, [คำสั่ง SQL หรือฟังก์ชันที่รับ cursor]) เรียงตามเวอร์ชัน
+# เวอร์ชันปัจจุบันของไฟล์เก็บใน PRAGMA user_version
+MIGRATIONS = [
+    (1, "เพิ่ม index สำหรับ query ที่ใช้บ่อย", [
+        "CREATE INDEX IF NOT EXISTS idx_orders_table_created ON orders (table_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items (sale_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_history_created ON sales_history (created_at)",
+    ]),
+    (2, "เพิ่มดัชนีค้นหาข้อความ (FTS5 trigram) และ index ยอดรวม", [
+        "CREATE INDEX IF NOT EXISTS idx_sales_history_total ON sales_history (total_amount)",
+        create_search_index,
+    ]),
+    (3, "เพิ่มตารางสรุปยอดขาย (รายวัน/รายชั่วโมง/รายโต๊ะ/รายเมนู)", [
+        """
+        CREATE TABLE IF NOT EXISTS summary_daily (
+            day TEXT PRIMARY KEY,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            bill_count INTEGER NOT NULL DEFAULT 0,
+            item_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS summary_hourly (
+            day TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            bill_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, hour)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS summary_table (
+            day TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            bill_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, table_name)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS summary_menu (
+            day TEXT NOT NULL,
+            menu_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, menu_name)
+        )
+        """,
+        # ข้อมูลเดิม (วันที่ตามเวลาท้องถิ่นของเครื่อง)
+        """
+        INSERT INTO summary_daily (day, revenue, bill_count)
+        SELECT date(created_at, 'localtime'), SUM(total_amount), COUNT(*)
+        FROM sales_history GROUP BY 1
+        """,
+        """
+        UPDATE summary_daily SET item_count = (
+            SELECT COUNT(*) FROM sale_items i JOIN sales_history s ON s.id = i.sale_id
+            WHERE date(s.created_at, 'localtime') = summary_daily.day
+        )
+        """,
+        """
+        INSERT INTO summary_hourly (day, hour, revenue, bill_count)
+        SELECT date(created_at, 'localtime'), CAST(strftime('%H', created_at, 'localtime') AS INTEGER),
+               SUM(total_amount), COUNT(*)
+        FROM sales_history GROUP BY 1, 2
+        """,
+        """
+        INSERT INTO summary_table (day, table_name, revenue, bill_count)
+        SELECT date(created_at, 'localtime'), table_name, SUM(total_amount), COUNT(*)
+        FROM sales_history GROUP BY 1, 2
+        """,
+        """
+        INSERT INTO summary_menu (day, menu_name, quantity, revenue)
+        SELECT date(s.created_at, 'localtime'), i.menu_name, COUNT(*), SUM(i.price)
+        FROM sale_items i JOIN sales_history s ON s.id = i.sale_id GROUP BY 1, 2
+        """,
+        # trigger อัปเดตตารางสรุปใน transaction เดียวกับการบันทึก/ลบบิล
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sale_insert AFTER INSERT ON sales_history BEGIN
+            INSERT INTO summary_daily (day, revenue, bill_count)
+            VALUES (date(new.created_at, 'localtime'), new.total_amount, 1)
+            ON CONFLICT(day) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                           bill_count = bill_count + 1;
+            INSERT INTO summary_hourly (day, hour, revenue, bill_count)
+            VALUES (date(new.created_at, 'localtime'),
+                    CAST(strftime('%H', new.created_at, 'localtime') AS INTEGER),
+                    new.total_amount, 1)
+            ON CONFLICT(day, hour) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                                 bill_count = bill_count + 1;
+            INSERT INTO summary_table (day, table_name, revenue, bill_count)
+            VALUES (date(new.created_at, 'localtime'), new.table_name, new.total_amount, 1)
+            ON CONFLICT(day, table_name) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                                       bill_count = bill_count + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sale_delete AFTER DELETE ON sales_history BEGIN
+            UPDATE summary_daily SET revenue = revenue - old.total_amount, bill_count = bill_count - 1
+            WHERE day = date(old.created_at, 'localtime');
+            UPDATE summary_hourly SET revenue = revenue - old.total_amount, bill_count = bill_count - 1
+            WHERE day = date(old.created_at, 'localtime')
+              AND hour = CAST(strftime('%H', old.created_at, 'localtime') AS INTEGER);
+            UPDATE summary_table SET revenue = revenue - old.total_amount, bill_count = bill_count - 1
+            WHERE day = date(old.created_at, 'localtime') AND table_name = old.table_name;
+            DELETE FROM summary_daily WHERE day = date(old.created_at, 'localtime') AND bill_count <= 0;
+            DELETE FROM summary_hourly WHERE day = date(old.created_at, 'localtime') AND bill_count <= 0;
+            DELETE FROM summary_table WHERE day = date(old.created_at, 'localtime') AND bill_count <= 0;
+        END
+        """,
+        # รายการในบิลอ้างวันที่จากหัวบิล (หัวบิลถูกเพิ่มก่อนและลบหลังรายการเสมอ)
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_summary_item_insert AFTER INSERT ON sale_items BEGIN
+            INSERT INTO summary_menu (day, menu_name, quantity, revenue)
+            VALUES ((SELECT date(created_at, 'localtime') FROM sales_history WHERE id = new.sale_id),
+                    new.menu_name, 1, new.price)
+            ON CONFLICT(day, menu_name) DO UPDATE SET quantity = quantity + 1,
+                                                      revenue = revenue + excluded.revenue;
+            UPDATE summary_daily SET item_count = item_count + 1
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = new.sale_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_summary_item_delete AFTER DELETE ON sale_items BEGIN
+            UPDATE summary_menu SET quantity = quantity - 1, revenue = revenue - old.price
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id)
+              AND menu_name = old.menu_name;
+            UPDATE summary_daily SET item_count = item_count - 1
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id);
+            DELETE FROM summary_menu WHERE quantity <= 0
+              AND day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id);
+        END
+        """,
+    ]),
+    (4, "เพิ่มจำนวน (quantity) ในออเดอร์และรายการในบิล รวมแถวเมนูซ้ำเป็นแถวเดียว", [
+        # ปิด trigger สรุปรายเมนูชั่วคราว การรวมแถวไม่เปลี่ยนยอดสรุป
+        "DROP TRIGGER IF EXISTS trg_summary_item_insert",
+        "DROP TRIGGER IF EXISTS trg_summary_item_delete",
+        "ALTER TABLE orders ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1",
+        """
+        UPDATE orders SET quantity = (
+            SELECT COUNT(*) FROM orders o
+            WHERE o.table_id = orders.table_id AND o.menu_item_id = orders.menu_item_id
+              AND o.price = orders.price
+        )
+        WHERE id IN (SELECT MIN(id) FROM orders GROUP BY table_id, menu_item_id, price)
+        """,
+        "DELETE FROM orders WHERE id NOT IN (SELECT MIN(id) FROM orders GROUP BY table_id, menu_item_id, price)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_line ON orders (table_id, menu_item_id, price)",
+        "ALTER TABLE sale_items ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1",
+        """
+        UPDATE sale_items SET quantity = (
+            SELECT COUNT(*) FROM sale_items i
+            WHERE i.sale_id = sale_items.sale_id AND i.menu_name = sale_items.menu_name
+              AND i.price = sale_items.price
+        )
+        WHERE id IN (SELECT MIN(id) FROM sale_items GROUP BY sale_id, menu_name, price)
+        """,
+        "DELETE FROM sale_items WHERE id NOT IN (SELECT MIN(id) FROM sale_items GROUP BY sale_id, menu_name, price)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_summary_item_insert AFTER INSERT ON sale_items BEGIN
+            INSERT INTO summary_menu (day, menu_name, quantity, revenue)
+            VALUES ((SELECT date(created_at, 'localtime') FROM sales_history WHERE id = new.sale_id),
+                    new.menu_name, new.quantity, new.price * new.quantity)
+            ON CONFLICT(day, menu_name) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                      revenue = revenue + excluded.revenue;
+            UPDATE summary_daily SET item_count = item_count + new.quantity
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = new.sale_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_summary_item_delete AFTER DELETE ON sale_items BEGIN
+            UPDATE summary_menu SET quantity = quantity - old.quantity,
+                                    revenue = revenue - old.price * old.quantity
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id)
+              AND menu_name = old.menu_name;
+            UPDATE summary_daily SET item_count = item_count - old.quantity
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id);
+            DELETE FROM summary_menu WHERE quantity <= 0
+              AND day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id);
+        END
+        """,
+    ]),
+    (5, "เพิ่มดัชนีบิลที่ย้ายไปไฟล์ archive และไม่ปรับตารางสรุประหว่างย้าย", [
+        # เดือนที่ย้ายไปไฟล์ archive แล้ว (status='moving' เฉพาะระหว่าง transaction ที่ย้าย)
+        """
+        CREATE TABLE IF NOT EXISTS archive_months (
+            month TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            bill_count INTEGER NOT NULL DEFAULT 0,
+            revenue INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'done',
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # เลขที่บิล -> เดือนของไฟล์ archive สำหรับ get_sale_details
+        """
+        CREATE TABLE IF NOT EXISTS archived_bills (
+            bill_id TEXT PRIMARY KEY,
+            month TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        # ตารางสรุปเก็บยอดของบิลที่ย้ายไว้ตามเดิม จึงข้าม trigger สรุประหว่างย้าย
+        "DROP TRIGGER IF EXISTS trg_summary_sale_insert",
+        "DROP TRIGGER IF EXISTS trg_summary_sale_delete",
+        "DROP TRIGGER IF EXISTS trg_summary_item_insert",
+        "DROP TRIGGER IF EXISTS trg_summary_item_delete",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sale_insert AFTER INSERT ON sales_history
+        WHEN {NOT_ARCHIVING} BEGIN
+            INSERT INTO summary_daily (day, revenue, bill_count)
+            VALUES (date(new.created_at, 'localtime'), new.total_amount, 1)
+            ON CONFLICT(day) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                           bill_count = bill_count + 1;
+            INSERT INTO summary_hourly (day, hour, revenue, bill_count)
+            VALUES (date(new.created_at, 'localtime'),
+                    CAST(strftime('%H', new.created_at, 'localtime') AS INTEGER),
+                    new.total_amount, 1)
+            ON CONFLICT(day, hour) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                                 bill_count = bill_count + 1;
+            INSERT INTO summary_table (day, table_name, revenue, bill_count)
+            VALUES (date(new.created_at, 'localtime'), new.table_name, new.total_amount, 1)
+            ON CONFLICT(day, table_name) DO UPDATE SET revenue = revenue + excluded.revenue,
+                                                       bill_count = bill_count + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sale_delete AFTER DELETE ON sales_history
+        WHEN {NOT_ARCHIVING} BEGIN
+            UPDATE summary_daily SET revenue = revenue - old.total_amount, bill_count = bill_count - 1
+            WHERE day = date(old.created_at, 'localtime');
+            UPDATE summary_hourly SET revenue = revenue - old.total_amount, bill_count = bill_count - 1
+            WHERE day = date(old.created_at, 'localtime')
+              AND hour = CAST(strftime('%H', old.created_at, 'localtime') AS INTEGER);
+            UPDATE summary_table SET revenue = revenue - old.total_amount, bill_count = bill_count - 1
+            WHERE day = date(old.created_at, 'localtime') AND table_name = old.table_name;
+            DELETE FROM summary_daily WHERE day = date(old.created_at, 'localtime') AND bill_count <= 0;
+            DELETE FROM summary_hourly WHERE day = date(old.created_at, 'localtime') AND bill_count <= 0;
+            DELETE FROM summary_table WHERE day = date(old.created_at, 'localtime') AND bill_count <= 0;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_item_insert AFTER INSERT ON sale_items
+        WHEN {NOT_ARCHIVING} BEGIN
+            INSERT INTO summary_menu (day, menu_name, quantity, revenue)
+            VALUES ((SELECT date(created_at, 'localtime') FROM sales_history WHERE id = new.sale_id),
+                    new.menu_name, new.quantity, new.price * new.quantity)
+            ON CONFLICT(day, menu_name) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                      revenue = revenue + excluded.revenue;
+            UPDATE summary_daily SET item_count = item_count + new.quantity
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = new.sale_id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_item_delete AFTER DELETE ON sale_items
+        WHEN {NOT_ARCHIVING} BEGIN
+            UPDATE summary_menu SET quantity = quantity - old.quantity,
+                                    revenue = revenue - old.price * old.quantity
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id)
+              AND menu_name = old.menu_name;
+            UPDATE summary_daily SET item_count = item_count - old.quantity
+            WHERE day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id);
+            DELETE FROM summary_menu WHERE quantity <= 0
+              AND day = (SELECT date(created_at, 'localtime') FROM sales_history WHERE id = old.sale_id);
+        END
+        """,
+    ]),
+    (6, "เพิ่มบันทึกการเปลี่ยนแปลง (change_log) สำหรับส่งยอดขายของสาขาไปส่วนกลาง", [
+        # AUTOINCREMENT: seq ไม่ถูกใช้ซ้ำแม้ลบ log ที่ส่งออกแล้ว
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            op TEXT NOT NULL,
+            key TEXT,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)",
+        # รหัสสาขาสุ่มครั้งเดียวต่อไฟล์ ใช้แยกบิลของแต่ละสาขาเมื่อรวมยอด
+        "INSERT OR IGNORE INTO sync_state (name, value) VALUES ('branch_id', lower(hex(randomblob(8))))",
+    ]),
+    (7, "เพิ่มตัวนับการแก้ไขโต๊ะ/เมนู (catalog_version) สำหรับ cache ชื่อ -> id", [
+        "INSERT OR IGNORE INTO counters (name, value) VALUES ('catalog_version', 0)",
+    ] + [
+        # ทุกการเพิ่ม/แก้ไข/ลบโต๊ะหรือเมนู (จากทุก connection) เพิ่มค่าตัวนับ
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_catalog_{table}_{event.lower()} AFTER {event} ON {table}
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'catalog_version';
+        END
+        """
+        for table in ("tables", "menu_items") for event in ("INSERT", "UPDATE", "DELETE")
+    ]),
+]
+
+# เวอร์ชันของโต๊ะ/เมนูที่ cache ชื่อ -> id ใช้ตรวจว่ายังไม่เก่า (ไม่มีแถว = 0)
+CATALOG_VERSION_SQL = "COALESCE((SELECT value FROM counters WHERE name = 'catalog_version'), 0)"
+
+# ==================== Archive ====================
+# บิลเก่าถูกย้ายไปไฟล์ archive รายเดือน (archive/sales_YYYY-MM.db) ข้างไฟล์หลัก
+# ไฟล์หลักเก็บเฉพาะบิลล่าสุด ตารางสรุปยอด และดัชนี archived_bills ไว้หาบิลเก่า
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.sales_history (
+        id INTEGER PRIMARY KEY,
+        bill_id TEXT UNIQUE NOT NULL,
+        table_name TEXT NOT NULL,
+        total_amount INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.sale_items (
+        id INTEGER PRIMARY KEY,
+        sale_id INTEGER NOT NULL,
+        menu_name TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sales_history_created ON sales_history (created_at)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sale_items_sale ON sale_items (sale_id)",
+]
+
+# คอลัมน์ในดัชนีค้นหา sales_search ตามประเภทการค้นหา
+SEARCH_COLUMNS = {
+    "bill_id": "bill_id",
+    "table": "table_name",
+    "date": "created_at",
+    "total": "total_text",
+}
+
+# รายการในบิลพร้อมหัวบิล สำหรับส่งออก (เรียงตามเวลา อ่านตาม index ไม่ต้อง sort ทั้งชุด)
+# created_at ในฐานข้อมูลเป็น UTC ส่งออกเป็นเวลาท้องถิ่นให้ตรงกับรายงาน
+SALE_LINES_QUERY = """
+    SELECT s.bill_id, s.table_name, datetime(s.created_at, 'localtime'), s.total_amount,
+           i.menu_name, i.price, i.quantity, i.price * i.quantity
+    FROM sales_history s JOIN sale_items i ON i.sale_id = s.id
+"""
+SALE_LINE_COLUMNS = ("bill_id", "table_name", "created_at", "bill_total",
+                     "menu_name", "price", "quantity", "line_total")
+# จำนวนแถวที่อ่าน/เขียนต่อครั้งตอนส่งออก (หน่วยความจำคงที่ตามค่านี้)
+EXPORT_CHUNK_ROWS = 10000
+
+# query ที่ถูกเรียกบ่อย ใช้ตรวจด้วย EXPLAIN QUERY PLAN ว่าใช้ index จริง
+HOT_QUERIES = {
+    "get_table_id": ("SELECT id FROM tables WHERE table_name=?", ("T1",)),
+    "get_menu_item_id": ("SELECT id FROM menu_items WHERE name=?", ("x",)),
+    "get_table_orders": (
+        "SELECT id, menu_name, price, quantity FROM orders WHERE table_id=? ORDER BY created_at", (1,)),
+    "load_open_orders": (
+        "SELECT t.table_name, o.id, o.menu_name, o.price, o.quantity "
+        "FROM tables t LEFT JOIN orders o ON o.table_id = t.id "
+        "ORDER BY t.table_name, o.created_at, o.id", ()),
+    "add_order_item": (
+        "SELECT id, quantity FROM orders WHERE table_id=? AND menu_item_id=? AND price=?", (1, 1, 1)),
+    "checkout_table": (
+        "SELECT menu_name, price, quantity FROM orders WHERE table_id=? ORDER BY created_at, id", (1,)),
+    "clear_table_orders": ("DELETE FROM orders WHERE table_id=?", (1,)),
+    "get_sale_details": (
+        "SELECT menu_name, price, quantity FROM sale_items WHERE sale_id=? ORDER BY id", (1,)),
+    "get_sale_by_bill_id": (
+        "SELECT id, table_name, total_amount, created_at FROM sales_history WHERE bill_id=?", ("x",)),
+    "get_all_sales": (
+        "SELECT bill_id, table_name, total_amount, created_at FROM sales_history "
+        "ORDER BY created_at DESC", ()),
+    "get_sales_page": (
+        "SELECT id, bill_id, table_name, total_amount, created_at FROM sales_history "
+        "WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?",
+        ("2024-01-01", 1, 200)),
+    "search_sales_text": (
+        "SELECT rowid FROM sales_search WHERE sales_search MATCH ?", ('"S-2"',)),
+    "search_sales_date_range": (
+        "SELECT bill_id, table_name, total_amount, created_at FROM sales_history "
+        "WHERE created_at >= datetime(?, 'utc') AND created_at < datetime(?, '+1 day', 'utc') "
+        "ORDER BY created_at DESC",
+        ("2024-01-01", "2024-01-31")),
+    "search_sales_total_range": (
+        "SELECT bill_id, table_name, total_amount, created_at FROM sales_history "
+        "WHERE total_amount BETWEEN ? AND ?", (100, 200)),
+    "export_sales": (
+        SALE_LINES_QUERY + "WHERE created_at >= datetime(?, 'utc') "
+        "AND created_at < datetime(?, '+1 day', 'utc') "
+        "ORDER BY s.created_at, s.id, i.id", ("2024-01-01", "2024-12-31")),
+}
+
 
 class ShabuDatabase:
     """คลาสสำหรับจัดการฐานข้อมูล SQLite ของระบบ POS"""
     
-    def __init__(self, db_name="shabu_pos.db"):
+    def __init__(self, db_name="shabu_pos.db", profile=None):
         self.db_name = db_name
+        self.profile = dict(DEFAULT_PROFILE, **(profile or {}))
         self.conn = None
         self.cursor = None
+        self._id_cache = None
+        self._id_cache_version = None
+        # การเชื่อมต่อแบบอ่านอย่างเดียวของไฟล์ archive รายเดือน (เปิดเมื่อใช้ครั้งแรก)
+        self._archive_cursors = {}
+        # เวลาที่รอล็อกเขียน (BEGIN IMMEDIATE) สะสม สำหรับวัดผลตอนใช้งานหลายเครื่อง
+        self.lock_stats = {"transactions": 0, "wait_total": 0.0, "wait_max": 0.0,
+                           "busy_retries": 0, "busy_failures": 0}
+        # เวลาของทุกคำสั่ง SQL และทุกเมธอด (ดู get_query_stats)
+        self.query_stats = QueryStats(
+            self.profile["slow_query_ms"], self.profile["slow_query_log"],
+            self.profile["slow_query_log_bytes"], self.profile["slow_query_log_backups"]
+        )
         self.connect()
         self.create_tables()
+        self.migrate()
+        self._refresh_id_cache()
     
     def connect(self):
         """เชื่อมต่อกับฐานข้อมูล"""
         try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
+            self.conn = sqlite3.connect(
+                self.db_name, timeout=self.profile["busy_timeout"] / 1000
+            )
+            self.cursor = TimedCursor(self.conn.cursor(), self.query_stats, self.conn)
+            self.apply_profile()
             print(f"✓ เชื่อมต่อฐานข้อมูล {self.db_name} สำเร็จ")
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาดในการเชื่อมต่อฐานข้อมูล: {e}")
     
+    def apply_profile(self):
+        """ตั้งค่า PRAGMA ตาม connection profile"""
+        profile = self.profile
+        self.cursor.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+        self.cursor.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+        self.cursor.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+        self.cursor.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+        self.cursor.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    
+    def _begin_write(self):
+        """เริ่ม write transaction ด้วย BEGIN IMMEDIATE
+        
+        จองสิทธิ์เขียนตั้งแต่ต้น transaction จึงไม่เจอ SQLITE_BUSY กลางคัน
+        ถ้าเครื่องอื่นถือล็อกนานเกิน busy_timeout จะลองใหม่แบบ exponential backoff
+        """
+        if self.conn.in_transaction:
+            return
+        retries = self.profile["busy_retries"]
+        delay = self.profile["busy_backoff"]
+        stats = self.lock_stats
+        started = time.perf_counter()
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    self.cursor.execute("BEGIN IMMEDIATE")
+                    stats["transactions"] += 1
+                    return
+                except sqlite3.OperationalError as e:
+                    if not is_busy_error(e):
+                        raise
+                    if attempt == retries:
+                        stats["busy_failures"] += 1
+                        raise
+                    stats["busy_retries"] += 1
+                    time.sleep(delay)
+                    delay *= 2
+        finally:
+            waited = time.perf_counter() - started
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+    
+    def get_lock_stats(self):
+        """สถิติการรอล็อกเขียนของการเชื่อมต่อนี้ (เวลาเป็นวินาที)"""
+        return dict(self.lock_stats)
+    
+    def get_query_stats(self, top=None):
+        """สถิติเวลาของคำสั่ง SQL และเมธอดของการเชื่อมต่อนี้
+        
+        คืนค่า dict: statements/methods (count, total_ms, mean_ms, max_ms, errors)
+        เรียงตามเวลารวม, slow_queries คือจำนวนคำสั่งที่ช้ากว่า slow_query_ms
+        """
+        self.cursor.flush()
+        snapshot = self.query_stats.snapshot(top)
+        snapshot["lock"] = self.get_lock_stats()
+        return snapshot
+    
+    def reset_query_stats(self):
+        self.query_stats.reset()
+    
+    @timed_method
     def create_tables(self):
         """สร้างตารางทั้งหมดในฐานข้อมูล"""
         try:
@@ -80,51 +645,170 @@ class ShabuDatabase:
                 )
             ''')
             
+            # ตาราง counters - เก็บตัวนับลำดับ (เช่น เลขที่บิลของแต่ละวัน)
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            
             self.conn.commit()
             print("✓ สร้างตารางฐานข้อมูลสำเร็จ")
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาดในการสร้างตาราง: {e}")
     
+    @timed_method
+    def get_schema_version(self):
+        """ดึงเวอร์ชันของโครงสร้างฐานข้อมูล (PRAGMA user_version)"""
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+    
+    @timed_method
+    def migrate(self):
+        """อัปเกรดโครงสร้างฐานข้อมูลเดิมให้เป็นเวอร์ชันล่าสุด
+        
+        แต่ละเวอร์ชันทำใน transaction ของตัวเอง ถ้าล้มเหลวจะย้อนกลับ
+        และหยุดที่เวอร์ชันก่อนหน้า
+        """
+        for version, description, statements in MIGRATIONS:
+            if self.get_schema_version() >= version:
+                continue
+            try:
+                # BEGIN IMMEDIATE กันไม่ให้เครื่องอื่นอัปเกรดซ้อนกัน
+                self._begin_write()
+                if self.get_schema_version() >= version:
+                    self.conn.rollback()
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(self.cursor)
+                    else:
+                        self.cursor.execute(statement)
+                self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+                self.conn.commit()
+                print(f"✓ อัปเกรดฐานข้อมูลเป็นเวอร์ชัน {version}: {description}")
+            except Exception as e:
+                print(f"✗ เกิดข้อผิดพลาดในการอัปเกรดฐานข้อมูล (เวอร์ชัน {version}): {e}")
+                self.conn.rollback()
+                return False
+        return True
+    
+    @timed_method
+    def explain_query_plan(self, query, params=()):
+        """คืนค่ารายละเอียดจาก EXPLAIN QUERY PLAN ของ query"""
+        self.cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row[3] for row in self.cursor.fetchall()]
+    
+    @timed_method
+    def check_query_plans(self):
+        """ตรวจว่า query ที่ใช้บ่อยใช้ index ทั้งหมด
+        
+        คืนค่า dict {ชื่อ: (ผ่านหรือไม่, รายละเอียด plan)} query ไม่ผ่านเมื่อ
+        มีการ SCAN ตารางโดยไม่ใช้ index หรือต้องสร้าง TEMP B-TREE เพื่อเรียงลำดับ
+        """
+        results = {}
+        for name, (query, params) in HOT_QUERIES.items():
+            if name == "search_sales_text" and not self.has_search_index():
+                continue
+            plan = self.explain_query_plan(query, params)
+            uses_index = all(
+                "TEMP B-TREE" not in detail
+                and not (detail.startswith("SCAN") and "USING" not in detail
+                         and "VIRTUAL TABLE INDEX" not in detail)
+                for detail in plan
+            )
+            results[name] = (uses_index, plan)
+        return results
+    
+    # ==================== ID Cache ====================
+    
+    def _refresh_id_cache(self):
+        """คืนค่า cache ชื่อ -> id ของโต๊ะและเมนู
+        
+        โหลดใหม่เมื่อถูก invalidate (เขียนจาก connection นี้) หรือเมื่อ catalog_version เปลี่ยน
+        (trigger เพิ่มค่าเมื่อโต๊ะ/เมนูถูกแก้จาก connection ใดก็ตาม)
+        การเขียนอย่างอื่นจากเครื่องอื่น เช่น เพิ่มออเดอร์ ไม่ทำให้โหลดใหม่
+        """
+        self.cursor.execute(f"SELECT {CATALOG_VERSION_SQL}")
+        version = self.cursor.fetchone()[0]
+        if self._id_cache is not None and version == self._id_cache_version:
+            return self._id_cache
+        
+        self.cursor.execute("SELECT table_name, id FROM tables")
+        tables = dict(self.cursor.fetchall())
+        self.cursor.execute("SELECT name, id FROM menu_items")
+        menu_items = dict(self.cursor.fetchall())
+        self._id_cache = {"tables": tables, "menu_items": menu_items}
+        self._id_cache_version = version
+        return self._id_cache
+    
+    @timed_method
+    def invalidate_id_cache(self):
+        """ล้าง cache ชื่อ -> id (เรียกหลังเพิ่ม/แก้ไข/ลบโต๊ะหรือเมนู)"""
+        self._id_cache = None
+    
     # ==================== Menu Items ====================
     
+    @timed_method
     def add_menu_item(self, name, price):
         """เพิ่มเมนูอาหาร"""
         try:
+            self._begin_write()
             self.cursor.execute(
                 "INSERT INTO menu_items (name, price) VALUES (?, ?)",
                 (name, price)
             )
+            self._log_change("menu", "insert", name, {"price": price})
             self.conn.commit()
+            self.invalidate_id_cache()
             return True
         except sqlite3.IntegrityError:
+            self.conn.rollback()
             return False  # ชื่อซ้ำ
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def update_menu_item(self, old_name, new_name, price):
         """แก้ไขเมนูอาหาร"""
         try:
+            self._begin_write()
             self.cursor.execute(
                 "UPDATE menu_items SET name=?, price=?, updated_at=CURRENT_TIMESTAMP WHERE name=?",
                 (new_name, price, old_name)
             )
+            updated = self.cursor.rowcount > 0
+            if updated:
+                self._log_change("menu", "update", old_name, {"name": new_name, "price": price})
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            self.invalidate_id_cache()
+            return updated
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def delete_menu_item(self, name):
         """ลบเมนูอาหาร"""
         try:
+            self._begin_write()
             self.cursor.execute("DELETE FROM menu_items WHERE name=?", (name,))
+            deleted = self.cursor.rowcount > 0
+            if deleted:
+                self._log_change("menu", "delete", name)
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            self.invalidate_id_cache()
+            return deleted
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def get_all_menu_items(self):
         """ดึงรายการเมนูทั้งหมด"""
         try:
@@ -134,49 +818,63 @@ class ShabuDatabase:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return {}
     
+    @timed_method
     def get_menu_item_id(self, name):
-        """ดึง ID ของเมนู"""
+        """ดึง ID ของเมนู (จาก cache)"""
         try:
-            self.cursor.execute("SELECT id FROM menu_items WHERE name=?", (name,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
+            return self._refresh_id_cache()["menu_items"].get(name)
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return None
     
     # ==================== Tables ====================
     
+    @timed_method
     def add_table(self, table_name):
         """เพิ่มโต๊ะ"""
         try:
+            self._begin_write()
             self.cursor.execute(
                 "INSERT INTO tables (table_name) VALUES (?)",
                 (table_name,)
             )
+            self._log_change("table", "insert", table_name)
             self.conn.commit()
+            self.invalidate_id_cache()
             return True
         except sqlite3.IntegrityError:
+            self.conn.rollback()
             return False  # ชื่อซ้ำ
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def rename_table(self, old_name, new_name):
         """เปลี่ยนชื่อโต๊ะ"""
         try:
+            self._begin_write()
             self.cursor.execute(
                 "UPDATE tables SET table_name=? WHERE table_name=?",
                 (new_name, old_name)
             )
+            updated = self.cursor.rowcount > 0
+            if updated:
+                self._log_change("table", "update", old_name, {"name": new_name})
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            self.invalidate_id_cache()
+            return updated
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def delete_table(self, table_name):
         """ลบโต๊ะ"""
         try:
+            self._begin_write()
             # ลบออเดอร์ของโต๊ะนี้ก่อน
             table_id = self.get_table_id(table_name)
             if table_id:
@@ -184,12 +882,18 @@ class ShabuDatabase:
             
             # ลบโต๊ะ
             self.cursor.execute("DELETE FROM tables WHERE table_name=?", (table_name,))
+            deleted = self.cursor.rowcount > 0
+            if deleted:
+                self._log_change("table", "delete", table_name)
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            self.invalidate_id_cache()
+            return deleted
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def get_all_tables(self):
         """ดึงรายการโต๊ะทั้งหมด"""
         try:
@@ -199,37 +903,101 @@ class ShabuDatabase:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return []
     
+    @timed_method
     def get_table_id(self, table_name):
-        """ดึง ID ของโต๊ะ"""
+        """ดึง ID ของโต๊ะ (จาก cache)"""
         try:
-            self.cursor.execute("SELECT id FROM tables WHERE table_name=?", (table_name,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
+            return self._refresh_id_cache()["tables"].get(table_name)
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return None
     
     # ==================== Orders ====================
     
-    def add_order_item(self, table_name, menu_name, price):
-        """เพิ่มรายการในออเดอร์"""
-        try:
-            table_id = self.get_table_id(table_name)
-            menu_id = self.get_menu_item_id(menu_name)
-            
-            if not table_id or not menu_id:
-                return False
-            
+    def _insert_order_item(self, table_name, menu_name, price, quantity=1):
+        """เพิ่มรายการในออเดอร์ quantity หน่วย (ไม่ commit - ให้ผู้เรียกจัดการ transaction)
+        
+        ถ้าโต๊ะมีเมนูเดียวกันราคาเดียวกันอยู่แล้วจะเพิ่มจำนวนในแถวเดิม (ทุกหน่วยในคำสั่งเดียว)
+        คืนค่าแถว {"id", "name", "price", "quantity"} หรือ None ถ้าไม่พบโต๊ะ/เมนู
+        """
+        # ใช้ cache โดยไม่ถามเวอร์ชันก่อน: คำสั่งเพิ่มตรวจ catalog_version เองในคำสั่งเดียวกัน
+        # ถ้า cache เก่า (โต๊ะ/เมนูถูกแก้จากเครื่องอื่น) จะไม่เพิ่มแถว แล้วโหลด cache ใหม่และลองอีกครั้ง
+        ids = self._id_cache if self._id_cache is not None else self._refresh_id_cache()
+        for attempt in range(2):
+            table_id = ids["tables"].get(table_name)
+            menu_id = ids["menu_items"].get(menu_name)
+            if table_id and menu_id:
+                row = self._upsert_order_item(table_id, menu_id, menu_name, price, quantity)
+                if row:
+                    return row
+            if attempt == 0:
+                ids = self._refresh_id_cache()
+        return None
+    
+    def _upsert_order_item(self, table_id, menu_id, menu_name, price, quantity):
+        """เพิ่ม/รวมแถวออเดอร์ถ้า cache ยังตรงกับ catalog_version คืนค่าแถว หรือ None ถ้า cache เก่า"""
+        upsert = f"""
+            INSERT INTO orders (table_id, menu_item_id, menu_name, price, quantity)
+            SELECT ?, ?, ?, ?, ? WHERE {CATALOG_VERSION_SQL} = ?
+            ON CONFLICT(table_id, menu_item_id, price)
+            DO UPDATE SET quantity = quantity + excluded.quantity
+        """
+        params = (table_id, menu_id, menu_name, price, quantity, self._id_cache_version)
+        if HAS_RETURNING:
+            # คำสั่งเดียว: ตรวจเวอร์ชัน เพิ่ม/รวมแถว และคืน id กับจำนวนล่าสุด
+            self.cursor.execute(upsert + " RETURNING id, quantity", params)
+            row = self.cursor.fetchone()
+        else:
+            self.cursor.execute(upsert, params)
+            if self.cursor.rowcount == 0:
+                return None
             self.cursor.execute(
-                "INSERT INTO orders (table_id, menu_item_id, menu_name, price) VALUES (?, ?, ?, ?)",
-                (table_id, menu_id, menu_name, price)
+                "SELECT id, quantity FROM orders WHERE table_id=? AND menu_item_id=? AND price=?",
+                (table_id, menu_id, price)
             )
+            row = self.cursor.fetchone()
+        if row is None:
+            return None
+        order_id, total_quantity = row
+        return {"id": order_id, "name": menu_name, "price": price, "quantity": total_quantity}
+    
+    @timed_method
+    def add_order_item(self, table_name, menu_name, price, quantity=1):
+        """เพิ่มรายการในออเดอร์ quantity หน่วย (ทั้งหมดหรือไม่เพิ่มเลย)
+        
+        คืนค่าแถวหลังเพิ่ม หรือ False ถ้าไม่สำเร็จ
+        """
+        try:
+            self._begin_write()
+            row = self._insert_order_item(table_name, menu_name, price, quantity)
+            if not row:
+                self.conn.rollback()
+                return False
             self.conn.commit()
-            return True
+            return row
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
+    def add_order_items(self, lines):
+        """เพิ่มหลายรายการในออเดอร์ด้วย transaction เดียว (commit ครั้งเดียว)
+        
+        lines คือ list ของ (table_name, menu_name, price) หรือ (table_name, menu_name, price, quantity)
+        คืนค่า list ของแถวหลังเพิ่ม (None สำหรับรายการที่ไม่สำเร็จ) ตามลำดับ
+        """
+        try:
+            self._begin_write()
+            results = [self._insert_order_item(*line) for line in lines]
+            self.conn.commit()
+            return results
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
+            return [None] * len(lines)
+    
+    @timed_method
     def get_table_orders(self, table_name):
         """ดึงรายการออเดอร์ของโต๊ะ"""
         try:
@@ -238,29 +1006,82 @@ class ShabuDatabase:
                 return []
             
             self.cursor.execute(
-                "SELECT id, menu_name, price FROM orders WHERE table_id=? ORDER BY created_at",
+                "SELECT id, menu_name, price, quantity FROM orders WHERE table_id=? ORDER BY created_at",
                 (table_id,)
             )
-            return [{"id": row[0], "name": row[1], "price": row[2]} for row in self.cursor.fetchall()]
+            return [{"id": row[0], "name": row[1], "price": row[2], "quantity": row[3]}
+                    for row in self.cursor.fetchall()]
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return []
     
+    @timed_method
+    def load_open_orders(self, table_names=None):
+        """โหลดออเดอร์ที่ยังไม่ชำระของทุกโต๊ะด้วย query เดียว
+        
+        คืนค่า dict {ชื่อโต๊ะ: [ออเดอร์]} เรียงตามชื่อโต๊ะ (รวมโต๊ะว่าง)
+        table_names จำกัดเฉพาะโต๊ะที่ระบุ (เช่น โหลดโต๊ะที่แสดงอยู่ก่อน)
+        """
+        try:
+            query = """
+                SELECT t.table_name, o.id, o.menu_name, o.price, o.quantity
+                FROM tables t LEFT JOIN orders o ON o.table_id = t.id
+            """
+            params = ()
+            if table_names is not None:
+                table_names = list(table_names)
+                query += f" WHERE t.table_name IN ({', '.join('?' * len(table_names))})"
+                params = tuple(table_names)
+            query += " ORDER BY t.table_name, o.created_at, o.id"
+            self.cursor.execute(query, params)
+            
+            tables = {}
+            for table_name, order_id, menu_name, price, quantity in self.cursor.fetchall():
+                orders = tables.setdefault(table_name, [])
+                if order_id is not None:
+                    orders.append({"id": order_id, "name": menu_name, "price": price,
+                                   "quantity": quantity})
+            return tables
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return {}
+    
+    @timed_method
     def delete_order_item(self, order_id):
-        """ลบรายการจากออเดอร์"""
+        """ลดรายการในออเดอร์ลง 1 หน่วย (ลบแถวเมื่อเหลือ 0)
+        
+        คืนค่าแถวหลังลด โดย quantity คือจำนวนที่เหลือ หรือ False ถ้าไม่พบ
+        """
         try:
-            self.cursor.execute("DELETE FROM orders WHERE id=?", (order_id,))
+            self._begin_write()
+            self.cursor.execute(
+                "SELECT id, menu_name, price, quantity FROM orders WHERE id=?", (order_id,)
+            )
+            row = self.cursor.fetchone()
+            if not row:
+                self.conn.rollback()
+                return False
+            
+            remaining = row[3] - 1
+            if remaining > 0:
+                self.cursor.execute("UPDATE orders SET quantity=? WHERE id=?", (remaining, order_id))
+            else:
+                self.cursor.execute("DELETE FROM orders WHERE id=?", (order_id,))
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            return {"id": row[0], "name": row[1], "price": row[2], "quantity": remaining}
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    @timed_method
     def clear_table_orders(self, table_name):
         """ล้างออเดอร์ทั้งหมดของโต๊ะ"""
         try:
+            self._begin_write()
             table_id = self.get_table_id(table_name)
             if not table_id:
+                self.conn.rollback()
                 return False
             
             self.cursor.execute("DELETE FROM orders WHERE table_id=?", (table_id,))
@@ -268,13 +1089,55 @@ class ShabuDatabase:
             return True
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
             return False
     
+    # ==================== Sequences ====================
+    
+    def _next_sequence(self, name):
+        """เพิ่มค่าตัวนับและคืนค่าใหม่ (ไม่ commit - ให้ผู้เรียกจัดการ transaction)"""
+        self.cursor.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+        self.cursor.execute("SELECT value FROM counters WHERE name=?", (name,))
+        return self.cursor.fetchone()[0]
+    
+    def _next_bill_id(self, prefix=None):
+        """สร้างเลขที่บิลถัดไป รูปแบบ S-YYYYMMDD-0001 (นับใหม่ทุกวัน)"""
+        prefix = prefix or datetime.now().strftime("%Y%m%d")
+        value = self._next_sequence(f"bill:{prefix}")
+        return f"S-{prefix}-{value:04d}"
+    
+    @timed_method
+    def next_sequence(self, name):
+        """เพิ่มค่าตัวนับและ commit ทันที"""
+        try:
+            self._begin_write()
+            value = self._next_sequence(name)
+            self.conn.commit()
+            return value
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
+            return None
+    
     # ==================== Sales History ====================
     
-    def add_sale(self, bill_id, table_name, items, total):
-        """บันทึกการขาย"""
+    @timed_method
+    def add_sale(self, bill_id, table_name, items, total, bill_prefix=None):
+        """บันทึกการขาย
+        
+        ถ้า bill_id เป็น None จะออกเลขที่บิลจากตัวนับใน transaction เดียวกัน
+        (ไม่ซ้ำแม้ลบบิลหรือชำระพร้อมกันหลายเครื่อง) คืนค่า bill_id เมื่อสำเร็จ
+        """
         try:
+            self._begin_write()
+            # ออกเลขที่บิลใน transaction เดียวกับการบันทึกบิล
+            if bill_id is None:
+                bill_id = self._next_bill_id(bill_prefix)
+            
             # เพิ่มข้อมูลหลักของบิล
             self.cursor.execute(
                 "INSERT INTO sales_history (bill_id, table_name, total_amount) VALUES (?, ?, ?)",
@@ -282,22 +1145,92 @@ class ShabuDatabase:
             )
             sale_id = self.cursor.lastrowid
             
-            # เพิ่มรายการในบิล
+            # เพิ่มรายการในบิล (รวมเมนูเดียวกันราคาเดียวกันเป็นแถวเดียว)
+            lines = {}
             for item in items:
-                self.cursor.execute(
-                    "INSERT INTO sale_items (sale_id, menu_name, price) VALUES (?, ?, ?)",
-                    (sale_id, item['name'], item['price'])
-                )
+                key = (item['name'], item['price'])
+                lines[key] = lines.get(key, 0) + item.get('quantity', 1)
+            self.cursor.executemany(
+                "INSERT INTO sale_items (sale_id, menu_name, price, quantity) VALUES (?, ?, ?, ?)",
+                [(sale_id, name, price, quantity) for (name, price), quantity in lines.items()]
+            )
+            self._log_sale(sale_id, bill_id, table_name, total,
+                           [(name, price, quantity) for (name, price), quantity in lines.items()])
             
             self.conn.commit()
-            return True
+            return bill_id
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             self.conn.rollback()
             return False
     
+    @timed_method
+    def checkout_table(self, table_name, bill_prefix=None):
+        """ชำระเงินทั้งโต๊ะใน transaction เดียว
+        
+        ย้ายออเดอร์ไปเป็นบิลด้วย INSERT ... SELECT แล้วล้างออเดอร์ของโต๊ะ
+        commit ครั้งเดียว คืนค่าใบเสร็จ (dict แบบเดียวกับ get_sale_details)
+        หรือ None ถ้าโต๊ะไม่มีรายการ/เกิดข้อผิดพลาด
+        """
+        try:
+            self._begin_write()
+            table_id = self.get_table_id(table_name)
+            if not table_id:
+                self.conn.rollback()
+                return None
+            
+            self.cursor.execute(
+                "SELECT menu_name, price, quantity FROM orders WHERE table_id=? ORDER BY created_at, id",
+                (table_id,)
+            )
+            items = [{'name': row[0], 'price': row[1], 'quantity': row[2]}
+                     for row in self.cursor.fetchall()]
+            if not items:
+                self.conn.rollback()
+                return None
+            total = sum(item['price'] * item['quantity'] for item in items)
+            
+            bill_id = self._next_bill_id(bill_prefix)
+            insert = "INSERT INTO sales_history (bill_id, table_name, total_amount) VALUES (?, ?, ?)"
+            # เวลาในใบเสร็จคือ created_at ที่บันทึกจริง (เหมือนประวัติการขายและการพิมพ์ซ้ำ)
+            if HAS_RETURNING:
+                self.cursor.execute(insert + " RETURNING id, created_at", (bill_id, table_name, total))
+                sale_id, timestamp = self.cursor.fetchone()
+            else:
+                self.cursor.execute(insert, (bill_id, table_name, total))
+                sale_id = self.cursor.lastrowid
+                self.cursor.execute("SELECT created_at FROM sales_history WHERE id=?", (sale_id,))
+                timestamp = self.cursor.fetchone()[0]
+            
+            # ย้ายรายการทั้งหมดด้วยคำสั่งเดียว แทนการวน INSERT ทีละรายการ
+            self.cursor.execute(
+                """
+                INSERT INTO sale_items (sale_id, menu_name, price, quantity)
+                SELECT ?, menu_name, price, quantity FROM orders WHERE table_id=?
+                ORDER BY created_at, id
+                """,
+                (sale_id, table_id)
+            )
+            self.cursor.execute("DELETE FROM orders WHERE table_id=?", (table_id,))
+            self._log_sale(sale_id, bill_id, table_name, total,
+                           [(item['name'], item['price'], item['quantity']) for item in items])
+            
+            self.conn.commit()
+            return {
+                'id': bill_id,
+                'table': table_name,
+                'total': total,
+                'timestamp': timestamp,
+                'items': items
+            }
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
+            return None
+    
+    @timed_method
     def get_all_sales(self):
-        """ดึงประวัติการขายทั้งหมด"""
+        """ดึงประวัติการขายทั้งหมด (รวมบิลที่ย้ายไปไฟล์ archive แล้ว)"""
         try:
             self.cursor.execute("""
                 SELECT bill_id, table_name, total_amount, created_at 
@@ -313,53 +1246,76 @@ class ShabuDatabase:
                     'total': row[2],
                     'timestamp': row[3]
                 })
+            for row in self._archived_sales([], []):
+                sales.append({
+                    'id': row[1],
+                    'table': row[2],
+                    'total': row[3],
+                    'timestamp': row[4]
+                })
             return sales
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return []
     
+    @timed_method
     def get_sale_details(self, bill_id):
-        """ดึงรายละเอียดของบิล"""
+        """ดึงรายละเอียดของบิล (ถ้าไม่อยู่ในไฟล์หลักจะหาในไฟล์ archive ผ่าน archived_bills)"""
         try:
-            # ดึงข้อมูลหลักของบิล
-            self.cursor.execute(
-                "SELECT id, table_name, total_amount, created_at FROM sales_history WHERE bill_id=?",
-                (bill_id,)
-            )
-            sale = self.cursor.fetchone()
-            
-            if not sale:
-                return None
-            
-            sale_id, table_name, total, timestamp = sale
-            
-            # ดึงรายการในบิล
-            self.cursor.execute(
-                "SELECT menu_name, price FROM sale_items WHERE sale_id=?",
-                (sale_id,)
-            )
-            items = [{'name': row[0], 'price': row[1]} for row in self.cursor.fetchall()]
-            
-            return {
-                'id': bill_id,
-                'table': table_name,
-                'total': total,
-                'timestamp': timestamp,
-                'items': items
-            }
+            sale = self._read_sale_details(self.cursor, bill_id)
+            if sale is None:
+                self.cursor.execute("SELECT month FROM archived_bills WHERE bill_id=?", (bill_id,))
+                row = self.cursor.fetchone()
+                cursor = self._archive_cursor(row[0]) if row else None
+                if cursor is not None:
+                    sale = self._read_sale_details(cursor, bill_id)
+            return sale
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return None
     
+    def _read_sale_details(self, cursor, bill_id):
+        """อ่านหัวบิลและรายการในบิลผ่าน cursor ที่ให้มา (ไฟล์หลักหรือไฟล์ archive)"""
+        # ดึงข้อมูลหลักของบิล
+        cursor.execute(
+            "SELECT id, table_name, total_amount, created_at FROM sales_history WHERE bill_id=?",
+            (bill_id,)
+        )
+        sale = cursor.fetchone()
+        
+        if not sale:
+            return None
+        
+        sale_id, table_name, total, timestamp = sale
+        
+        # ดึงรายการในบิล
+        cursor.execute(
+            "SELECT menu_name, price, quantity FROM sale_items WHERE sale_id=? ORDER BY id",
+            (sale_id,)
+        )
+        items = [{'name': row[0], 'price': row[1], 'quantity': row[2]}
+                 for row in cursor.fetchall()]
+        
+        return {
+            'id': bill_id,
+            'table': table_name,
+            'total': total,
+            'timestamp': timestamp,
+            'items': items
+        }
+    
+    @timed_method
     def delete_sale(self, bill_id):
         """ลบประวัติการขาย"""
         try:
+            self._begin_write()
             # ดึง sale_id
             self.cursor.execute("SELECT id FROM sales_history WHERE bill_id=?", (bill_id,))
             result = self.cursor.fetchone()
             
             if not result:
-                return False
+                self.conn.rollback()
+                return self._delete_archived_sale(bill_id)
             
             sale_id = result[0]
             
@@ -368,6 +1324,7 @@ class ShabuDatabase:
             
             # ลบบิล
             self.cursor.execute("DELETE FROM sales_history WHERE id=?", (sale_id,))
+            self._log_change("sale", "delete", bill_id)
             
             self.conn.commit()
             return True
@@ -376,46 +1333,114 @@ class ShabuDatabase:
             self.conn.rollback()
             return False
     
+    @timed_method
     def clear_all_sales(self):
-        """ล้างประวัติการขายทั้งหมด"""
+        """ล้างประวัติการขายทั้งหมด (รวมไฟล์ archive และตารางสรุปยอด)"""
         try:
+            self._begin_write()
+            self.cursor.execute("SELECT path FROM archive_months")
+            paths = [self._data_path(row[0]) for row in self.cursor.fetchall()]
             self.cursor.execute("DELETE FROM sale_items")
             self.cursor.execute("DELETE FROM sales_history")
+            # ตารางสรุปยังมียอดของบิลที่ย้ายไป archive จึงล้างตรง ๆ
+            for table in ("summary_daily", "summary_hourly", "summary_table", "summary_menu",
+                          "archived_bills", "archive_months"):
+                self.cursor.execute(f"DELETE FROM {table}")
+            self._log_change("sale", "clear", None)
             self.conn.commit()
+            
+            self._close_archives()
+            for path in paths:
+                self._clear_archive_file(path)
             return True
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             self.conn.rollback()
             return False
     
-    def search_sales(self, search_text, search_field="all"):
-        """ค้นหาประวัติการขาย"""
-        try:
-            search_text = f"%{search_text}%"
-            
+    @timed_method
+    def has_search_index(self):
+        """ตรวจว่ามีดัชนีค้นหา sales_search (FTS5) หรือไม่"""
+        self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sales_search'"
+        )
+        return self.cursor.fetchone() is not None
+    
+    def _sales_conditions(self, search_text="", search_field="all", date_from=None,
+                          date_to=None, min_total=None, max_total=None, use_index=True):
+        """สร้างเงื่อนไข WHERE สำหรับค้นหา/กรองประวัติการขาย
+        
+        use_index=False ใช้ LIKE แทนดัชนี FTS (ไฟล์ archive ไม่มีดัชนี sales_search)
+        คืนค่า (list ของเงื่อนไข, list ของพารามิเตอร์) หรือ None ถ้าประเภทการค้นหาไม่ถูกต้อง
+        """
+        if search_field != "all" and search_field not in SEARCH_COLUMNS:
+            return None
+        
+        conditions = []
+        params = []
+        
+        if search_text and len(search_text) >= 3 and use_index and self.has_search_index():
+            phrase = '"' + search_text.replace('"', '""') + '"'
+            if search_field != "all":
+                phrase = f"{SEARCH_COLUMNS[search_field]} : {phrase}"
+            conditions.append(
+                "id IN (SELECT rowid FROM sales_search WHERE sales_search MATCH ?)"
+            )
+            params.append(phrase)
+        elif search_text:
+            like_columns = {
+                "bill_id": "bill_id",
+                "table": "table_name",
+                "date": "created_at",
+                "total": "CAST(total_amount AS TEXT)",
+            }
             if search_field == "all":
-                query = """
-                    SELECT bill_id, table_name, total_amount, created_at 
-                    FROM sales_history 
-                    WHERE bill_id LIKE ? OR table_name LIKE ? OR 
-                          CAST(total_amount AS TEXT) LIKE ? OR created_at LIKE ?
-                    ORDER BY created_at DESC
-                """
-                params = (search_text, search_text, search_text, search_text)
-            elif search_field == "bill_id":
-                query = "SELECT bill_id, table_name, total_amount, created_at FROM sales_history WHERE bill_id LIKE ? ORDER BY created_at DESC"
-                params = (search_text,)
-            elif search_field == "table":
-                query = "SELECT bill_id, table_name, total_amount, created_at FROM sales_history WHERE table_name LIKE ? ORDER BY created_at DESC"
-                params = (search_text,)
-            elif search_field == "date":
-                query = "SELECT bill_id, table_name, total_amount, created_at FROM sales_history WHERE created_at LIKE ? ORDER BY created_at DESC"
-                params = (search_text,)
-            elif search_field == "total":
-                query = "SELECT bill_id, table_name, total_amount, created_at FROM sales_history WHERE CAST(total_amount AS TEXT) LIKE ? ORDER BY created_at DESC"
-                params = (search_text,)
+                columns = list(like_columns.values())
             else:
+                columns = [like_columns[search_field]]
+            conditions.append("(" + " OR ".join(f"{c} LIKE ?" for c in columns) + ")")
+            params.extend([f"%{search_text}%"] * len(columns))
+        
+        # วันที่เป็นวันตามเวลาท้องถิ่น (เหมือนตารางสรุปยอด) แปลงเป็นขอบเขต UTC
+        # แทนการแปลง created_at ทุกแถว จึงยังใช้ index ของ created_at ได้
+        if date_from:
+            conditions.append("created_at >= datetime(?, 'utc')")
+            params.append(date_from)
+        if date_to:
+            conditions.append("created_at < datetime(?, '+1 day', 'utc')")
+            params.append(date_to)
+        if min_total is not None:
+            conditions.append("total_amount >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            conditions.append("total_amount <= ?")
+            params.append(max_total)
+        return conditions, params
+    
+    @timed_method
+    def search_sales(self, search_text, search_field="all", date_from=None, date_to=None,
+                     min_total=None, max_total=None, limit=None):
+        """ค้นหาประวัติการขาย
+        
+        ข้อความตั้งแต่ 3 ตัวอักษรค้นผ่านดัชนี FTS5 trigram (ไม่ scan ทั้งตาราง)
+        ข้อความที่สั้นกว่านั้นใช้ LIKE ตามเดิม
+        date_from/date_to ('YYYY-MM-DD' ตามเวลาท้องถิ่น รวมวันสุดท้าย) และ min_total/max_total
+        เป็นตัวกรองช่วงที่ใช้ index ของ created_at และ total_amount
+        """
+        try:
+            where = self._sales_conditions(search_text, search_field, date_from, date_to,
+                                           min_total, max_total)
+            if where is None:
                 return []
+            conditions, params = where
+            
+            query = "SELECT bill_id, table_name, total_amount, created_at FROM sales_history"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY created_at DESC"
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
             
             self.cursor.execute(query, params)
             
@@ -427,13 +1452,929 @@ class ShabuDatabase:
                     'total': row[2],
                     'timestamp': row[3]
                 })
+            
+            # บิลในไฟล์ archive เก่ากว่าทุกบิลในไฟล์หลัก จึงต่อท้ายได้เลย
+            if not limit or len(sales) < limit:
+                conditions, params = self._sales_conditions(
+                    search_text, search_field, date_from, date_to, min_total, max_total,
+                    use_index=False
+                )
+                for row in self._archived_sales(conditions, params,
+                                                limit - len(sales) if limit else None):
+                    sales.append({
+                        'id': row[1],
+                        'table': row[2],
+                        'total': row[3],
+                        'timestamp': row[4]
+                    })
             return sales
         except Exception as e:
             print(f"✗ เกิดข้อผิดพลาด: {e}")
             return []
     
+    @timed_method
+    def get_sales_page(self, before=None, limit=200, search_text="", search_field="all",
+                       **filters):
+        """ดึงประวัติการขายทีละหน้า แบบ keyset (ใหม่ไปเก่า)
+        
+        before คือ cursor (created_at, id) ของแถวสุดท้ายจากหน้าก่อน (None = หน้าแรก)
+        แต่ละแถวมี 'cursor' สำหรับส่งเป็น before ของหน้าถัดไป
+        ใช้เวลาเท่ากันทุกหน้า ไม่ว่าจะอยู่ลึกแค่ไหน (ไม่ใช้ OFFSET)
+        รับตัวกรองเดียวกับ search_sales
+        """
+        try:
+            where = self._sales_conditions(search_text, search_field, **filters)
+            if where is None:
+                return []
+            conditions, params = where
+            if before is not None:
+                conditions.append("(created_at, id) < (?, ?)")
+                params.extend(before)
+            
+            query = "SELECT id, bill_id, table_name, total_amount, created_at FROM sales_history"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+            params.append(limit)
+            
+            self.cursor.execute(query, params)
+            rows = self.cursor.fetchall()
+            
+            # หน้าที่เลยบิลในไฟล์หลักไปแล้วอ่านต่อจากไฟล์ archive (เดือนล่าสุดก่อน)
+            if len(rows) < limit:
+                conditions, params = self._sales_conditions(search_text, search_field,
+                                                            use_index=False, **filters)
+                if before is not None:
+                    conditions.append("(created_at, id) < (?, ?)")
+                    params.extend(before)
+                rows += self._archived_sales(conditions, params, limit - len(rows))
+            
+            return [{
+                'id': row[1],
+                'table': row[2],
+                'total': row[3],
+                'timestamp': row[4],
+                'cursor': (row[4], row[0])
+            } for row in rows]
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return []
+    
+    def iter_sales(self, before=None, limit=200, **filters):
+        """วนอ่านประวัติการขายทีละหน้า (generator) ใช้หน่วยความจำคงที่ไม่ว่าข้อมูลมากแค่ไหน"""
+        while True:
+            page = self.get_sales_page(before, limit, **filters)
+            yield from page
+            if len(page) < limit:
+                return
+            before = page[-1]['cursor']
+    
+    def iter_sale_lines(self, date_from=None, date_to=None, batch_size=EXPORT_CHUNK_ROWS):
+        """วนอ่านรายการในบิลพร้อมหัวบิล (generator) เรียงจากเก่าไปใหม่ รวมบิลในไฟล์ archive
+        
+        แต่ละแถวเป็น tuple ตามลำดับ SALE_LINE_COLUMNS
+        date_from/date_to ('YYYY-MM-DD' ตามเวลาท้องถิ่น รวมวันสุดท้าย) เหมือน search_sales
+        """
+        for batch in self._iter_sale_line_batches(date_from, date_to, batch_size):
+            yield from batch
+    
+    def iter_sales_columns(self, date_from=None, date_to=None, batch_size=EXPORT_CHUNK_ROWS):
+        """วนอ่านหัวบิลทีละ batch_size บิลในรูปคอลัมน์ (generator) รวมบิลในไฟล์ archive
+        
+        แต่ละชุดเป็น tuple (table_name, total_amount, created_at) ของคอลัมน์ยาวเท่ากัน
+        สำหรับเติม NumPy array ทีละชุด created_at เป็น UTC ตามที่เก็บ (ไม่แปลงทีละแถวใน SQL)
+        date_from/date_to ('YYYY-MM-DD' ตามเวลาท้องถิ่น รวมวันสุดท้าย) เหมือน search_sales
+        """
+        conditions, params = self._sales_conditions(date_from=date_from, date_to=date_to,
+                                                    use_index=False)
+        query = "SELECT table_name, total_amount, created_at FROM sales_history"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        for cursor in self._sales_cursors():
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield tuple(zip(*rows))
+    
+    def _iter_sale_line_batches(self, date_from, date_to, batch_size):
+        """อ่านทีละ batch_size แถวจาก statement เดียว (SQLite อ่านทีละแถวจากดิสก์ ไม่โหลดทั้งผลลัพธ์)"""
+        conditions, params = self._sales_conditions(date_from=date_from, date_to=date_to,
+                                                    use_index=False)
+        query = SALE_LINES_QUERY
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY s.created_at, s.id, i.id"
+        
+        for cursor in self._sales_cursors():
+            cursor.execute(query, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+    
+    @timed_method
+    def export_sales(self, dest_path, date_from=None, date_to=None, fmt=None,
+                     chunk_rows=EXPORT_CHUNK_ROWS):
+        """ส่งออกรายการในบิลเป็นไฟล์ CSV หรือ Parquet ทีละ chunk_rows แถว (หน่วยความจำคงที่)
+        
+        fmt: "csv" หรือ "parquet" (ไม่ระบุ = ดูจากนามสกุลไฟล์) Parquet ต้องติดตั้ง pyarrow
+        CSV เข้ารหัส UTF-8 แบบมี BOM ให้ Excel อ่านภาษาไทยได้
+        เขียนลงไฟล์ .part ก่อนแล้วเปลี่ยนชื่อเมื่อเสร็จ
+        คืนค่า dict: path, rows, bytes, seconds หรือ None ถ้าไม่สำเร็จ
+        """
+        if fmt is None:
+            fmt = "parquet" if dest_path.lower().endswith(".parquet") else "csv"
+        if fmt not in ("csv", "parquet"):
+            print(f"✗ ไม่รองรับรูปแบบ {fmt}")
+            return None
+        
+        started = time.perf_counter()
+        part_path = dest_path + ".part"
+        batches = self._iter_sale_line_batches(date_from, date_to, chunk_rows)
+        try:
+            if fmt == "parquet":
+                rows = self._write_parquet(part_path, batches)
+            else:
+                rows = 0
+                # เขียน BOM เอง (codec utf-8-sig ช้ากว่าเพราะเข้ารหัสทีละแถวใน Python)
+                with open(part_path, "w", newline="", encoding="utf-8",
+                          buffering=1024 * 1024) as f:
+                    f.write("\ufeff")
+                    writer = csv.writer(f)
+                    writer.writerow(SALE_LINE_COLUMNS)
+                    for batch in batches:
+                        writer.writerows(batch)
+                        rows += len(batch)
+            os.replace(part_path, dest_path)
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return None
+        finally:
+            batches.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        
+        return {
+            'path': dest_path,
+            'rows': rows,
+            'bytes': os.path.getsize(dest_path),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def _write_parquet(self, path, batches):
+        """เขียน Parquet หนึ่ง row group ต่อ batch (import pyarrow เมื่อใช้เท่านั้น)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("ส่งออก Parquet ต้องติดตั้ง pyarrow (pip install pyarrow)")
+        
+        schema = pa.schema([
+            ("bill_id", pa.string()), ("table_name", pa.string()), ("created_at", pa.string()),
+            ("bill_total", pa.int64()), ("menu_name", pa.string()), ("price", pa.int64()),
+            ("quantity", pa.int64()), ("line_total", pa.int64()),
+        ])
+        rows = 0
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in batches:
+                columns = [pa.array(column, type=field.type)
+                           for column, field in zip(zip(*batch), schema)]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                rows += len(batch)
+        return rows
+    
+    # ==================== Archive ====================
+    
+    def _data_path(self, relative_path):
+        """path จริงของไฟล์ข้างไฟล์หลัก (archive/backup เก็บ path แบบ relative กับไฟล์หลัก)"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_name)), relative_path)
+    
+    def _archive_cursor(self, month):
+        """cursor แบบอ่านอย่างเดียวของไฟล์ archive เดือน month หรือ None ถ้าไม่มีไฟล์"""
+        cursor = self._archive_cursors.get(month)
+        if cursor is None:
+            self.cursor.execute(
+                "SELECT path FROM archive_months WHERE month=? AND status='done'", (month,)
+            )
+            row = self.cursor.fetchone()
+            if not row or not os.path.exists(self._data_path(row[0])):
+                return None
+            conn = sqlite3.connect(read_only_uri(self._data_path(row[0])), uri=True)
+            # บิลที่ลบแล้วอาจค้างในไฟล์ archive ได้ (ลบจากไฟล์หลักก่อน ดู _delete_archived_sale)
+            # view ชั่วคราวชื่อเดียวกันบัง sales_history ให้เห็นเฉพาะบิลที่ยังอยู่ใน archived_bills
+            conn.execute("ATTACH DATABASE ? AS live", (read_only_uri(self.db_name),))
+            conn.execute("""
+                CREATE TEMP VIEW sales_history AS SELECT * FROM main.sales_history
+                WHERE bill_id IN (SELECT bill_id FROM live.archived_bills)
+            """)
+            conn.execute("PRAGMA query_only = ON")
+            cursor = TimedCursor(conn.cursor(), self.query_stats, conn)
+            self._archive_cursors[month] = cursor
+        return cursor
+    
+    def _sales_cursors(self):
+        """cursor สำหรับอ่านประวัติการขายทุกไฟล์: archive เดือนเก่าสุดก่อน แล้วจึงไฟล์หลัก
+        
+        ไฟล์หลักได้ cursor ใหม่ (ไม่ใช้ self.cursor) จึงอ่านแบบ generator ได้โดยไม่ชนคำสั่งอื่น
+        """
+        cursors = [self._archive_cursor(archive['month'])
+                   for archive in reversed(self.get_archive_months())]
+        cursors.append(TimedCursor(self.conn.cursor(), self.query_stats, self.conn))
+        return [cursor for cursor in cursors if cursor is not None]
+    
+    def _close_archives(self):
+        for cursor in self._archive_cursors.values():
+            cursor.connection.close()
+        self._archive_cursors = {}
+    
+    def _clear_archive_file(self, path):
+        """ล้างบิลในไฟล์ archive ด้วย SQL แล้วลองลบไฟล์ (หลังล้าง archive_months แล้ว)
+        
+        ไฟล์อาจถูกเปิดค้างโดยการเชื่อมต่ออื่น (เช่น worker) ซึ่งลบบน Windows ไม่ได้
+        จึงล้างข้อมูลก่อน ไฟล์ที่ลบไม่ได้จะว่างเปล่า ย้ายเดือนเดิมซ้ำได้โดยบิลเก่าไม่กลับมา
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            self.cursor.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                self.cursor.execute("BEGIN")
+                self.cursor.execute("DELETE FROM archive.sale_items")
+                self.cursor.execute("DELETE FROM archive.sales_history")
+                self.conn.commit()
+            finally:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                self.cursor.execute("DETACH DATABASE archive")
+            os.remove(path)
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠ ลบไฟล์ archive {path} ไม่สำเร็จ: {e}")
+    
+    def _archived_sales(self, conditions, params, limit=None):
+        """ค้นบิลในไฟล์ archive ด้วยเงื่อนไขแบบเดียวกับไฟล์หลัก (เดือนล่าสุดก่อน)
+        
+        คืนค่า list ของ (id, bill_id, table_name, total_amount, created_at) ใหม่ไปเก่า
+        """
+        rows = []
+        for archive in self.get_archive_months():
+            cursor = self._archive_cursor(archive['month'])
+            if cursor is None:
+                continue
+            query = "SELECT id, bill_id, table_name, total_amount, created_at FROM sales_history"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY created_at DESC, id DESC"
+            month_params = list(params)
+            if limit is not None:
+                query += " LIMIT ?"
+                month_params.append(limit - len(rows))
+            cursor.execute(query, month_params)
+            rows.extend(cursor.fetchall())
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows
+    
+    @timed_method
+    def get_archive_months(self):
+        """เดือนที่ย้ายไปไฟล์ archive แล้ว เรียงจากเดือนล่าสุด"""
+        try:
+            self.cursor.execute("""
+                SELECT month, path, bill_count, revenue, archived_at FROM archive_months
+                WHERE status = 'done' ORDER BY month DESC
+            """)
+            return [{
+                'month': row[0],
+                'path': row[1],
+                'bills': row[2],
+                'revenue': row[3],
+                'archived_at': row[4]
+            } for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return []
+    
+    @timed_method
+    def archive_sales(self, keep_months=12, archive_dir="archive", vacuum=False):
+        """ย้ายบิลที่เก่ากว่า keep_months เดือน (นับเต็มเดือนตามเวลาท้องถิ่น) ไปไฟล์ archive รายเดือน
+        
+        ไฟล์หลักเหลือบิลล่าสุด ตารางสรุปยอดยังรวมยอดของบิลที่ย้ายไว้ (รายงานไม่เปลี่ยน)
+        get_sale_details และการค้นหาประวัติยังเห็นบิลที่ย้ายแล้ว
+        vacuum=True ลดขนาดไฟล์หลักหลังย้าย (ใช้เวลานาน ควรทำตอนร้านปิด)
+        คืนค่า list ของ (เดือน, จำนวนบิลที่ย้าย) หรือ None ถ้าเกิดข้อผิดพลาด
+        """
+        try:
+            now = datetime.now()
+            year, month = divmod(now.year * 12 + now.month - 1 - keep_months, 12)
+            cutoff = f"{year:04d}-{month + 1:02d}-01 00:00:00"
+            self.cursor.execute("""
+                SELECT DISTINCT strftime('%Y-%m', created_at, 'localtime') FROM sales_history
+                WHERE created_at < datetime(?, 'utc') ORDER BY 1
+            """, (cutoff,))
+            months = [row[0] for row in self.cursor.fetchall()]
+            
+            moved = [(month, self._archive_month(month, archive_dir)) for month in months]
+            if vacuum and moved:
+                self.cursor.execute("VACUUM")
+            return moved
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            return None
+    
+    def _archive_month(self, month, archive_dir):
+        """ย้ายบิลของเดือน month ('YYYY-MM' เวลาท้องถิ่น) คืนค่าจำนวนบิลที่ย้าย
+        
+        ขั้นแรกคัดลอกลงไฟล์ archive แล้ว commit ก่อน จากนั้นจึงลบออกจากไฟล์หลัก
+        (โหมด WAL ไม่รับประกัน commit ข้ามไฟล์พร้อมกัน) ถ้าหยุดกลางทางรันซ้ำได้โดยบิลไม่ซ้ำ
+        """
+        self.cursor.execute("SELECT datetime(?, 'utc'), datetime(?, '+1 month', 'utc')",
+                            (f"{month}-01 00:00:00", f"{month}-01 00:00:00"))
+        month_range = self.cursor.fetchone()
+        relative_path = os.path.join(archive_dir, f"sales_{month}.db")
+        path = self._data_path(relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        self.cursor.execute("ATTACH DATABASE ? AS archive", (path,))
+        try:
+            for statement in ARCHIVE_SCHEMA:
+                self.cursor.execute(statement.format(schema="archive"))
+            # อ่านไฟล์หลักอย่างเดียว จึงไม่ต้องจองล็อกเขียนของไฟล์หลัก
+            self.cursor.execute("BEGIN")
+            # ลบแถวที่ id/เลขบิลชนกันก่อน (สำเนาจากการรันที่หยุดกลางทาง หรือบิลเก่าที่ค้างในไฟล์)
+            self.cursor.execute("""
+                DELETE FROM archive.sale_items WHERE sale_id IN (
+                    SELECT id FROM archive.sales_history WHERE id IN (
+                        SELECT id FROM main.sales_history WHERE created_at >= ? AND created_at < ?
+                    ) OR bill_id IN (
+                        SELECT bill_id FROM main.sales_history WHERE created_at >= ? AND created_at < ?
+                    )
+                ) OR id IN (
+                    SELECT i.id FROM main.sales_history s JOIN main.sale_items i ON i.sale_id = s.id
+                    WHERE s.created_at >= ? AND s.created_at < ?
+                )
+            """, month_range * 3)
+            self.cursor.execute("""
+                DELETE FROM archive.sales_history WHERE id IN (
+                    SELECT id FROM main.sales_history WHERE created_at >= ? AND created_at < ?
+                ) OR bill_id IN (
+                    SELECT bill_id FROM main.sales_history WHERE created_at >= ? AND created_at < ?
+                )
+            """, month_range * 2)
+            self.cursor.execute("""
+                INSERT INTO archive.sales_history
+                    (id, bill_id, table_name, total_amount, created_at)
+                SELECT id, bill_id, table_name, total_amount, created_at FROM main.sales_history
+                WHERE created_at >= ? AND created_at < ?
+            """, month_range)
+            self.cursor.execute("""
+                INSERT INTO archive.sale_items (id, sale_id, menu_name, price, quantity)
+                SELECT i.id, i.sale_id, i.menu_name, i.price, i.quantity
+                FROM main.sales_history s JOIN main.sale_items i ON i.sale_id = s.id
+                WHERE s.created_at >= ? AND s.created_at < ?
+            """, month_range)
+            self.conn.commit()
+        finally:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            self.cursor.execute("DETACH DATABASE archive")
+        
+        # status='moving' ปิด trigger สรุปยอด ยอดของบิลที่ย้ายจึงยังอยู่ในรายงาน
+        self._begin_write()
+        self.cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM sales_history
+            WHERE created_at >= ? AND created_at < ?
+        """, month_range)
+        count, revenue = self.cursor.fetchone()
+        self.cursor.execute("""
+            INSERT INTO archive_months (month, path, bill_count, revenue, status)
+            VALUES (?, ?, ?, ?, 'moving')
+            ON CONFLICT(month) DO UPDATE SET path = excluded.path,
+                bill_count = bill_count + excluded.bill_count,
+                revenue = revenue + excluded.revenue,
+                status = 'moving', archived_at = CURRENT_TIMESTAMP
+        """, (month, relative_path, count, revenue))
+        self.cursor.execute("""
+            INSERT OR REPLACE INTO archived_bills (bill_id, month)
+            SELECT bill_id, ? FROM sales_history WHERE created_at >= ? AND created_at < ?
+        """, (month, *month_range))
+        self.cursor.execute("""
+            DELETE FROM sale_items WHERE sale_id IN (
+                SELECT id FROM sales_history WHERE created_at >= ? AND created_at < ?
+            )
+        """, month_range)
+        self.cursor.execute(
+            "DELETE FROM sales_history WHERE created_at >= ? AND created_at < ?", month_range
+        )
+        self.cursor.execute("UPDATE archive_months SET status='done' WHERE month=?", (month,))
+        self.conn.commit()
+        return count
+    
+    def _delete_archived_sale(self, bill_id):
+        """ลบบิลที่อยู่ในไฟล์ archive และหักยอดออกจากตารางสรุป
+        
+        คืนบิลเข้าไฟล์หลักชั่วคราวขณะ status='moving' (ไม่ปรับตารางสรุป)
+        แล้วลบตามปกติ ให้ trigger หักยอดเหมือนบิลในไฟล์หลัก
+        commit ข้ามไฟล์ไม่ atomic จึงแยกสองขั้น: ลบในไฟล์หลักและ archived_bills ก่อน
+        แล้วจึงลบจากไฟล์ archive (ถ้าค้างอยู่ ผู้อ่านไม่เห็นเพราะไม่อยู่ใน archived_bills)
+        """
+        self.cursor.execute("""
+            SELECT b.month, m.path FROM archived_bills b JOIN archive_months m ON m.month = b.month
+            WHERE b.bill_id = ?
+        """, (bill_id,))
+        row = self.cursor.fetchone()
+        if not row or not os.path.exists(self._data_path(row[1])):
+            return False
+        month, relative_path = row
+        
+        self.cursor.execute("ATTACH DATABASE ? AS archive", (self._data_path(relative_path),))
+        try:
+            self._begin_write()
+            self.cursor.execute(
+                "SELECT id, total_amount FROM archive.sales_history WHERE bill_id=?", (bill_id,)
+            )
+            sale = self.cursor.fetchone()
+            if not sale:
+                self.conn.rollback()
+                return False
+            sale_id, total = sale
+            
+            self.cursor.execute("UPDATE archive_months SET status='moving' WHERE month=?", (month,))
+            self.cursor.execute("""
+                INSERT INTO main.sales_history (id, bill_id, table_name, total_amount, created_at)
+                SELECT id, bill_id, table_name, total_amount, created_at
+                FROM archive.sales_history WHERE id=?
+            """, (sale_id,))
+            self.cursor.execute("""
+                INSERT INTO main.sale_items (id, sale_id, menu_name, price, quantity)
+                SELECT id, sale_id, menu_name, price, quantity FROM archive.sale_items WHERE sale_id=?
+            """, (sale_id,))
+            self.cursor.execute("""
+                UPDATE archive_months SET status='done', bill_count = bill_count - 1,
+                       revenue = revenue - ?
+                WHERE month=?
+            """, (total, month))
+            
+            self.cursor.execute("DELETE FROM main.sale_items WHERE sale_id=?", (sale_id,))
+            self.cursor.execute("DELETE FROM main.sales_history WHERE id=?", (sale_id,))
+            self.cursor.execute("DELETE FROM archived_bills WHERE bill_id=?", (bill_id,))
+            self._log_change("sale", "delete", bill_id)
+            self.conn.commit()
+            
+            # ขั้นที่สอง: ลบซ้ำได้ ถ้าล้มเหลวบิลยังถือว่าลบแล้ว
+            try:
+                self.cursor.execute("BEGIN")
+                self.cursor.execute("DELETE FROM archive.sale_items WHERE sale_id=?", (sale_id,))
+                self.cursor.execute("DELETE FROM archive.sales_history WHERE bill_id=?", (bill_id,))
+                self.conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠ ลบบิล {bill_id} ออกจากไฟล์ archive ไม่สำเร็จ (ซ่อนไว้แล้ว): {e}")
+            return True
+        finally:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            self.cursor.execute("DETACH DATABASE archive")
+    
+    # ==================== Change Log ====================
+    
+    def _log_change(self, entity, op, key, data=None):
+        """บันทึกการเปลี่ยนแปลงลง change_log ใน transaction เดียวกับการแก้ข้อมูล (ไม่ commit เอง)
+        
+        ย้ายบิลไป archive ไม่นับเป็นการเปลี่ยนแปลง (ข้อมูลบิลเหมือนเดิม)
+        """
+        if data is not None:
+            data = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self.cursor.execute(
+            "INSERT INTO change_log (entity, op, key, data) VALUES (?, ?, ?, ?)",
+            (entity, op, key, data)
+        )
+    
+    def _log_sale(self, sale_id, bill_id, table_name, total, items):
+        """บันทึกบิลใหม่พร้อมรายการ (items เป็น list ของ (ชื่อ, ราคา, จำนวน))"""
+        self.cursor.execute("SELECT created_at FROM sales_history WHERE id=?", (sale_id,))
+        created_at = self.cursor.fetchone()[0]
+        self._log_change("sale", "insert", bill_id, {
+            "table": table_name,
+            "total": total,
+            "created_at": created_at,
+            "items": [list(item) for item in items],
+        })
+    
+    @timed_method
+    def get_branch_id(self):
+        """รหัสสาขาของไฟล์นี้ (สุ่มครั้งเดียวตอนสร้าง change_log)"""
+        return self.get_sync_value("branch_id")
+    
+    @timed_method
+    def get_sync_value(self, name, default=None):
+        """อ่านค่าใน sync_state เช่น checkpoint ของการส่งออก"""
+        try:
+            self.cursor.execute("SELECT value FROM sync_state WHERE name=?", (name,))
+            row = self.cursor.fetchone()
+            return row[0] if row else default
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return default
+    
+    @timed_method
+    def set_sync_value(self, name, value):
+        """บันทึกค่าใน sync_state"""
+        try:
+            self._begin_write()
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", (name, str(value))
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
+            return False
+    
+    @timed_method
+    def get_change_seq(self):
+        """เลขลำดับการเปลี่ยนแปลงล่าสุด (0 ถ้ายังไม่มี) ไม่ลดลงแม้ลบ log ด้วย prune_changes"""
+        self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name='change_log'")
+        row = self.cursor.fetchone()
+        return row[0] if row else 0
+    
+    def iter_changes(self, since=0, until=None, batch_size=1000):
+        """วนอ่านการเปลี่ยนแปลงที่ seq > since (และ <= until) เรียงตาม seq (generator)
+        
+        อ่านทีละ batch_size แถวด้วย keyset จึงใช้หน่วยความจำคงที่และเวลาตามจำนวนการเปลี่ยนแปลง
+        แต่ละรายการเป็น dict: seq, entity, op, key, data, at
+        """
+        if until is None:
+            until = self.get_change_seq()
+        cursor = TimedCursor(self.conn.cursor(), self.query_stats, self.conn)
+        while since < until:
+            cursor.execute("""
+                SELECT seq, entity, op, key, data, created_at FROM change_log
+                WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?
+            """, (since, until, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            for seq, entity, op, key, data, created_at in rows:
+                yield {
+                    'seq': seq,
+                    'entity': entity,
+                    'op': op,
+                    'key': key,
+                    'data': json.loads(data) if data is not None else None,
+                    'at': created_at
+                }
+            since = rows[-1][0]
+    
+    def iter_snapshot(self, batch_size=1000):
+        """วนอ่านข้อมูลปัจจุบันทั้งหมดในรูปแบบเดียวกับ iter_changes (op='insert') สำหรับส่งครั้งแรก
+        
+        ทุกรายการมี seq = เลขลำดับล่าสุดก่อนเริ่มอ่าน การเปลี่ยนแปลงระหว่างอ่านจะมาซ้ำ
+        ในรอบถัดไป ฝั่งรับจึงต้องนำไปใช้แบบทับของเดิมได้ (insert ซ้ำ = แทนที่)
+        บิลในไฟล์ archive ถูกส่งด้วย
+        """
+        seq = self.get_change_seq()
+        self.cursor.execute("SELECT name, price FROM menu_items ORDER BY id")
+        for name, price in self.cursor.fetchall():
+            yield {'seq': seq, 'entity': 'menu', 'op': 'insert', 'key': name,
+                   'data': {'price': price}, 'at': None}
+        self.cursor.execute("SELECT table_name FROM tables ORDER BY id")
+        for (table_name,) in self.cursor.fetchall():
+            yield {'seq': seq, 'entity': 'table', 'op': 'insert', 'key': table_name,
+                   'data': None, 'at': None}
+        
+        for cursor in self._sales_cursors():
+            for bill_id, sale in self._iter_sale_records(cursor, batch_size):
+                yield {'seq': seq, 'entity': 'sale', 'op': 'insert', 'key': bill_id,
+                       'data': sale, 'at': sale['created_at']}
+    
+    def _iter_sale_records(self, cursor, batch_size):
+        """วนอ่านบิลพร้อมรายการทีละ batch_size บิล (อ่านรายการของทั้ง batch ในคำสั่งเดียว)"""
+        last_id = 0
+        while True:
+            cursor.execute("""
+                SELECT id, bill_id, table_name, total_amount, created_at FROM sales_history
+                WHERE id > ? ORDER BY id LIMIT ?
+            """, (last_id, batch_size))
+            sales = cursor.fetchall()
+            if not sales:
+                return
+            items = {}
+            cursor.execute("""
+                SELECT sale_id, menu_name, price, quantity FROM sale_items
+                WHERE sale_id BETWEEN ? AND ? ORDER BY sale_id, id
+            """, (sales[0][0], sales[-1][0]))
+            for sale_id, name, price, quantity in cursor.fetchall():
+                items.setdefault(sale_id, []).append([name, price, quantity])
+            for sale_id, bill_id, table_name, total, created_at in sales:
+                yield bill_id, {
+                    "table": table_name,
+                    "total": total,
+                    "created_at": created_at,
+                    "items": items.get(sale_id, []),
+                }
+            last_id = sales[-1][0]
+    
+    @timed_method
+    def prune_changes(self, up_to_seq):
+        """ลบการเปลี่ยนแปลงที่ seq <= up_to_seq (ส่งออกแล้ว) คืนค่าจำนวนแถวที่ลบ"""
+        try:
+            self._begin_write()
+            self.cursor.execute("DELETE FROM change_log WHERE seq <= ?", (up_to_seq,))
+            deleted = self.cursor.rowcount
+            self.conn.commit()
+            return deleted
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            self.conn.rollback()
+            return None
+    
+    # ==================== Backup ====================
+    
+    @timed_method
+    def backup(self, dest_path, pages=None, pause=None, verify=True):
+        """สำรองฐานข้อมูลขณะเปิดใช้งานด้วย SQLite online backup API
+        
+        คัดลอกทีละ pages หน้าแล้วพัก pause วินาที ภายใน read transaction เดียว
+        สำเนาจึงเป็นภาพ ณ เวลาเริ่ม และในโหมด WAL ไม่บล็อกการเขียนของเครื่องอื่น
+        เขียนลงไฟล์ .part แล้วค่อยเปลี่ยนชื่อเมื่อผ่าน integrity check (ไม่มีไฟล์สำรองครึ่ง ๆ)
+        สำรองเฉพาะไฟล์หลัก (ไฟล์ archive ดู snapshot)
+        คืนค่า dict สรุปผล หรือ None ถ้าสำรองไม่สำเร็จ
+        """
+        try:
+            return self._copy_database(self.conn, dest_path, pages, pause, verify)
+        except Exception as e:
+            print(f"✗ สำรองข้อมูลไม่สำเร็จ: {e}")
+            return None
+    
+    def _copy_database(self, source, dest_path, pages=None, pause=None, verify=True):
+        """คัดลอกการเชื่อมต่อ source ไป dest_path ผ่านไฟล์ .part (ดู backup)
+        
+        คืนค่า dict สรุปผล หรือ None ถ้าไม่ผ่าน integrity check
+        """
+        pages = pages or self.profile["backup_pages"]
+        pause = self.profile["backup_pause"] if pause is None else pause
+        temp_path = dest_path + ".part"
+        steps = [0, 0]
+        
+        def throttle(status, remaining, total):
+            steps[0] += 1
+            steps[1] = total
+            if pause:
+                time.sleep(pause)
+        
+        started = time.perf_counter()
+        target = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            target = sqlite3.connect(temp_path)
+            
+            # ค้าง read transaction ไว้ ไม่เช่นนั้น backup เริ่มใหม่ทุกครั้งที่มีการเขียน
+            if source is self.conn:
+                self.cursor.execute("BEGIN")
+                self.cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+                self.cursor.fetchone()
+            else:
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            try:
+                source.backup(target, pages=pages, progress=throttle)
+            finally:
+                source.rollback()
+            
+            # snapshot เป็นไฟล์เดียวจบ ไม่ต้องมี -wal/-shm ตามไป
+            target.execute("PRAGMA journal_mode = DELETE")
+            target.close()
+            target = None
+            
+            integrity = self.verify_backup(temp_path) if verify else None
+            if verify and integrity != "ok":
+                print(f"✗ ไฟล์สำรองไม่ผ่าน integrity check: {integrity}")
+                return None
+            os.replace(temp_path, dest_path)
+            return {
+                'path': dest_path,
+                'pages': steps[1],
+                'steps': steps[0],
+                'bytes': os.path.getsize(dest_path),
+                'seconds': round(time.perf_counter() - started, 3),
+                'integrity': integrity
+            }
+        finally:
+            if target is not None:
+                target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    @timed_method
+    def verify_backup(self, path):
+        """PRAGMA integrity_check ของไฟล์สำรอง คืนค่า "ok" หรือข้อความปัญหาที่พบ"""
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            rows = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+        except sqlite3.DatabaseError as e:
+            # ไฟล์เสียจนเปิดอ่าน schema ไม่ได้
+            return str(e)
+        finally:
+            conn.close()
+        return "; ".join(rows[:10])
+    
+    def _snapshot_prefix(self):
+        return os.path.splitext(os.path.basename(self.db_name))[0] + "-"
+    
+    @timed_method
+    def list_snapshots(self, backup_dir=None):
+        """snapshot ที่มีอยู่ เรียงจากล่าสุด"""
+        directory = self._data_path(backup_dir or self.profile["backup_dir"])
+        if not os.path.isdir(directory):
+            return []
+        prefix = self._snapshot_prefix()
+        snapshots = []
+        for name in os.listdir(directory):
+            # ชื่อไฟล์: <ชื่อฐานข้อมูล>-YYYYMMDD-HHMMSS.db (ไฟล์ archive อยู่ในโฟลเดอร์ชื่อเดียวกัน)
+            stamp = name[len(prefix):-len(".db")]
+            if not (name.startswith(prefix) and name.endswith(".db") and len(stamp) == 15):
+                continue
+            path = os.path.join(directory, name)
+            archive_dir = path[:-len(".db")]
+            snapshots.append({
+                'path': path,
+                'archive_dir': archive_dir if os.path.isdir(archive_dir) else None,
+                'timestamp': datetime.strptime(stamp, "%Y%m%d-%H%M%S"),
+                'bytes': os.path.getsize(path)
+            })
+        snapshots.sort(key=lambda snapshot: snapshot['timestamp'], reverse=True)
+        return snapshots
+    
+    @timed_method
+    def snapshot(self, backup_dir=None, keep=None):
+        """สำรองเป็นชุดใหม่ในโฟลเดอร์ backup แล้วลบ snapshot เก่าที่เกิน keep ชุด
+        
+        ไฟล์ archive ที่ snapshot อ้างถึง (archive_months) ถูกสำรองลงโฟลเดอร์ชื่อเดียวกับ snapshot
+        ตาม path เดิม เช่น shabu_pos-YYYYMMDD-HHMMSS/archive/sales_YYYY-MM.db
+        ไฟล์ .db ถูกเปลี่ยนชื่อเป็นขั้นสุดท้าย snapshot ที่เห็นใน list_snapshots จึงครบทุกไฟล์
+        คืนค่าผลของ backup() (เพิ่ม archives) หรือ None ถ้าไม่สำเร็จ (ไม่ลบ snapshot เก่าในกรณีนี้)
+        """
+        backup_dir = backup_dir or self.profile["backup_dir"]
+        keep = self.profile["backup_keep"] if keep is None else keep
+        stem = os.path.join(self._data_path(backup_dir),
+                            self._snapshot_prefix() + datetime.now().strftime("%Y%m%d-%H%M%S"))
+        pending = stem + ".db.pending"
+        result = self.backup(pending)
+        if result is None:
+            return None
+        try:
+            archives = self._backup_archives(pending, stem)
+            os.replace(pending, stem + ".db")
+        except Exception as e:
+            print(f"✗ สำรองไฟล์ archive ไม่สำเร็จ: {e}")
+            for path in (stem, stem + ".part"):
+                shutil.rmtree(path, ignore_errors=True)
+            if os.path.exists(pending):
+                os.remove(pending)
+            return None
+        
+        result['path'] = stem + ".db"
+        result['archives'] = len(archives)
+        result['bytes'] += sum(archive['bytes'] for archive in archives)
+        for old in self.list_snapshots(backup_dir)[max(keep, 1):]:
+            os.remove(old['path'])
+            if old['archive_dir']:
+                shutil.rmtree(old['archive_dir'], ignore_errors=True)
+        return result
+    
+    def _backup_archives(self, snapshot_path, archive_dir):
+        """สำรองไฟล์ archive ทุกเดือนที่ snapshot_path อ้างถึงลง archive_dir (ผ่านโฟลเดอร์ .part)
+        
+        อ่านรายการเดือนจากไฟล์สำรองเอง จึงตรงกับ snapshot แม้มีการย้ายเดือนใหม่ระหว่างสำรอง
+        """
+        conn = sqlite3.connect(read_only_uri(snapshot_path), uri=True)
+        try:
+            paths = [row[0] for row in conn.execute(
+                "SELECT path FROM archive_months WHERE status = 'done' ORDER BY month"
+            )]
+        finally:
+            conn.close()
+        if not paths:
+            return []
+        
+        temp_dir = archive_dir + ".part"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        results = []
+        for relative_path in paths:
+            source_path = self._data_path(relative_path)
+            if not os.path.exists(source_path):
+                print(f"⚠ ไม่พบไฟล์ archive {source_path} (ข้ามไป)")
+                continue
+            source = sqlite3.connect(read_only_uri(source_path), uri=True)
+            try:
+                result = self._copy_database(source, os.path.join(temp_dir, relative_path))
+            finally:
+                source.close()
+            if result is None:
+                raise sqlite3.DatabaseError(f"{relative_path} ไม่ผ่าน integrity check")
+            results.append(result)
+        if os.path.isdir(temp_dir):
+            os.replace(temp_dir, archive_dir)
+        return results
+    
+    # ==================== Reports ====================
+    
+    @timed_method
+    def get_daily_summary(self, date_from=None, date_to=None):
+        """ยอดขายรายวันจากตารางสรุป (ไม่ต้อง scan ประวัติการขาย)
+        
+        date_from/date_to รูปแบบ 'YYYY-MM-DD' (รวมวันสุดท้าย) เรียงจากวันล่าสุด
+        """
+        try:
+            self.cursor.execute(
+                """
+                SELECT day, revenue, bill_count, item_count FROM summary_daily
+                WHERE day >= ? AND day <= ? ORDER BY day DESC
+                """,
+                (date_from or "0000-00-00", date_to or "9999-99-99")
+            )
+            return [{'day': row[0], 'revenue': row[1], 'bills': row[2], 'items': row[3]}
+                    for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return []
+    
+    @timed_method
+    def get_hourly_summary(self, day):
+        """ยอดขายรายชั่วโมงของวันที่ระบุ"""
+        try:
+            self.cursor.execute(
+                "SELECT hour, revenue, bill_count FROM summary_hourly WHERE day=? ORDER BY hour",
+                (day,)
+            )
+            return [{'hour': row[0], 'revenue': row[1], 'bills': row[2]}
+                    for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return []
+    
+    @timed_method
+    def get_table_summary(self, date_from, date_to=None):
+        """ยอดขายรายโต๊ะในช่วงวันที่ เรียงตามยอดขาย"""
+        try:
+            self.cursor.execute(
+                """
+                SELECT table_name, SUM(revenue), SUM(bill_count) FROM summary_table
+                WHERE day >= ? AND day <= ? GROUP BY table_name ORDER BY 2 DESC
+                """,
+                (date_from, date_to or date_from)
+            )
+            return [{'table': row[0], 'revenue': row[1], 'bills': row[2]}
+                    for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return []
+    
+    @timed_method
+    def get_menu_summary(self, date_from, date_to=None):
+        """จำนวนและยอดขายรายเมนูในช่วงวันที่ เรียงตามจำนวนที่ขายได้ (ไม่ระบุวันที่ = ทั้งหมด)"""
+        try:
+            self.cursor.execute(
+                """
+                SELECT menu_name, SUM(quantity), SUM(revenue) FROM summary_menu
+                WHERE day >= ? AND day <= ? GROUP BY menu_name ORDER BY 2 DESC
+                """,
+                (date_from or "0000-00-00", date_to or date_from or "9999-99-99")
+            )
+            return [{'name': row[0], 'quantity': row[1], 'revenue': row[2]}
+                    for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด: {e}")
+            return []
+    
+    @timed_method
+    def get_sales_report(self, date_from, date_to=None):
+        """รายงานยอดขายช่วงวันที่ (Z-report เมื่อระบุวันเดียว, ยอดสะสมเดือนเมื่อระบุช่วง)"""
+        date_to = date_to or date_from
+        days = self.get_daily_summary(date_from, date_to)
+        return {
+            'date_from': date_from,
+            'date_to': date_to,
+            'revenue': sum(d['revenue'] for d in days),
+            'bills': sum(d['bills'] for d in days),
+            'items': sum(d['items'] for d in days),
+            'days': days,
+            'hours': self.get_hourly_summary(date_from) if date_from == date_to else [],
+            'tables': self.get_table_summary(date_from, date_to),
+            'menu': self.get_menu_summary(date_from, date_to),
+        }
+    
     # ==================== Utility ====================
     
+    @timed_method
     def initialize_default_data(self):
         """สร้างข้อมูลเริ่มต้น"""
         # เพิ่มเมนูเริ่มต้น
@@ -460,6 +2401,7 @@ class ShabuDatabase:
     def close(self):
         """ปิดการเชื่อมต่อฐานข้อมูล"""
         if self.conn:
+            self._close_archives()
             self.conn.close()
             print("✓ ปิดการเชื่อมต่อฐานข้อมูล")
     
@@ -487,4 +2429,140 @@ if __name__ == "__main__":
     for table in db.get_all_tables():
         print(f"- {table}")
     
+    print(f"\n=== ตรวจสอบ index (schema v{db.get_schema_version()}) ===")
+    for name, (ok, plan) in db.check_query_plans().items():
+        print(f"{'✓' if ok else '✗'} {name}: {'; '.join(plan)}")
+        assert ok, f"query {name} ไม่ได้ใช้ index: {plan}"
+    
+    import tempfile
+    
+    def id_cache_loads(db):
+        return sum(row['count'] for row in db.get_query_stats()['statements']
+                   if row['sql'].startswith("SELECT table_name, id FROM tables"))
+    
+    print("\n=== ตรวจสอบ cache ชื่อ -> id (สองเครื่องใช้ไฟล์เดียวกัน) ===")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "check.db")
+        first, second = ShabuDatabase(path), ShabuDatabase(path)
+        first.initialize_default_data()
+        for terminal in (first, second):
+            terminal.add_order_item("T1", "กุ้งสด", 89)
+            terminal.reset_query_stats()
+        for tap in range(50):
+            (first, second)[tap % 2].add_order_item("T1", "กุ้งสด", 89)
+        assert id_cache_loads(first) == id_cache_loads(second) == 0, "ออเดอร์จากอีกเครื่องทำให้โหลด cache ใหม่"
+        assert first.get_table_orders("T1")[0]['quantity'] == 52
+        # เมนูใหม่/เปลี่ยนชื่อจากอีกเครื่องต้องเห็นทันที
+        second.update_menu_item("กุ้งสด", "กุ้งแม่น้ำ", 120)
+        assert first.add_order_item("T2", "กุ้งแม่น้ำ", 120)
+        assert not first.add_order_item("T2", "กุ้งสด", 89)
+        assert id_cache_loads(first) == 1
+        first.close()
+        second.close()
+    print("✓ ออเดอร์จากอีกเครื่องไม่ทำให้โหลด cache ใหม่ แก้เมนูจากอีกเครื่องเห็นทันที")
+    
+    def total_revenue(db):
+        return sum(day['revenue'] for day in db.get_daily_summary())
+    
+    # โครงสร้างไฟล์ของโปรแกรมรุ่นแรก (user_version = 0 ไม่มี quantity/index/ตารางสรุป)
+    BASELINE_SCHEMA = [
+        "CREATE TABLE menu_items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, "
+        "price INTEGER NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+        "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        "CREATE TABLE tables (id INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT NOT NULL UNIQUE, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        "CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, table_id INTEGER NOT NULL, "
+        "menu_item_id INTEGER NOT NULL, menu_name TEXT NOT NULL, price INTEGER NOT NULL, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        "CREATE TABLE sales_history (id INTEGER PRIMARY KEY AUTOINCREMENT, bill_id TEXT NOT NULL UNIQUE, "
+        "table_name TEXT NOT NULL, total_amount INTEGER NOT NULL, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        "CREATE TABLE sale_items (id INTEGER PRIMARY KEY AUTOINCREMENT, sale_id INTEGER NOT NULL, "
+        "menu_name TEXT NOT NULL, price INTEGER NOT NULL)",
+    ]
+    
+    print("\n=== ตรวจสอบการอัปเกรดไฟล์รุ่นแรก ===")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "baseline.db")
+        conn = sqlite3.connect(path)
+        for statement in BASELINE_SCHEMA:
+            conn.execute(statement)
+        conn.execute("INSERT INTO menu_items (name, price) VALUES ('กุ้งสด', 89)")
+        conn.execute("INSERT INTO tables (table_name) VALUES ('T1')")
+        # รุ่นแรกเก็บหนึ่งแถวต่อหนึ่งหน่วย
+        conn.executemany("INSERT INTO orders (table_id, menu_item_id, menu_name, price) "
+                         "VALUES (1, 1, 'กุ้งสด', 89)", [()] * 3)
+        conn.execute("INSERT INTO sales_history (bill_id, table_name, total_amount) "
+                     "VALUES ('B-1', 'T1', 178)")
+        conn.executemany("INSERT INTO sale_items (sale_id, menu_name, price) VALUES (1, 'กุ้งสด', 89)",
+                         [()] * 2)
+        conn.commit()
+        conn.close()
+        
+        upgraded = ShabuDatabase(path)
+        assert upgraded.get_schema_version() == MIGRATIONS[-1][0]
+        assert [(row['name'], row['quantity']) for row in upgraded.get_table_orders("T1")] == [("กุ้งสด", 3)]
+        assert upgraded.get_sale_details("B-1")['items'] == [{'name': "กุ้งสด", 'price': 89, 'quantity': 2}]
+        assert total_revenue(upgraded) == 178
+        assert [row['quantity'] for row in upgraded.get_menu_summary(None)] == [2]
+        assert upgraded.get_branch_id()
+        upgraded.close()
+    print("✓ ไฟล์รุ่นแรกอัปเกรดครบทุกเวอร์ชัน ออเดอร์/บิลรวมแถวเป็นจำนวน ตารางสรุปตรงกับบิลเดิม")
+    
+    print("\n=== ตรวจสอบย้ายบิลไป archive แล้วลบ ===")
+    with tempfile.TemporaryDirectory() as folder:
+        shop = ShabuDatabase(os.path.join(folder, "archive.db"))
+        for bill_id, age in (("OLD-1", "-3 months"), ("OLD-2", "-3 months"), ("NEW-1", "-1 minute")):
+            shop.cursor.execute(
+                "INSERT INTO sales_history (bill_id, table_name, total_amount, created_at) "
+                "VALUES (?, 'T1', 178, datetime('now', ?))", (bill_id, age)
+            )
+            shop.cursor.execute(
+                "INSERT INTO sale_items (sale_id, menu_name, price, quantity) VALUES (?, 'กุ้งสด', 89, 2)",
+                (shop.cursor.lastrowid,)
+            )
+        shop.conn.commit()
+        assert total_revenue(shop) == 534
+        assert [count for _, count in shop.archive_sales(keep_months=1)] == [2]
+        # trigger สรุปยอดไม่ทำงานระหว่างย้าย (NOT_ARCHIVING) ยอดรวมจึงไม่เปลี่ยน
+        assert total_revenue(shop) == 534
+        assert shop.get_sale_details("OLD-1")['items'] == [{'name': "กุ้งสด", 'price': 89, 'quantity': 2}]
+        assert shop.delete_sale("OLD-1")
+        assert shop.get_sale_details("OLD-1") is None
+        assert shop.get_sale_details("OLD-2")['total'] == 178
+        assert total_revenue(shop) == 356
+        assert sorted(sale['id'] for sale in shop.get_all_sales()) == ["NEW-1", "OLD-2"]
+        assert len(list(shop.iter_sale_lines())) == 2
+        shop.close()
+    print("✓ บิลที่ย้ายแล้วยังเปิดดูได้ ลบแล้วหายจากทุกมุมมอง ยอดสรุปถูกต้อง")
+    
+    print("\n=== ตรวจสอบรวมยอดสาขา (consolidate) ซ้ำสองรอบ ===")
+    import consolidate
+    with tempfile.TemporaryDirectory() as folder:
+        branch_path = os.path.join(folder, "silom.db")
+        branch = ShabuDatabase(branch_path)
+        branch.initialize_default_data()
+        bill_ids = [branch.add_sale(None, "T1", [{'name': "กุ้งสด", 'price': 89, 'quantity': 2}], 178)
+                    for _ in range(3)]
+        head_office = consolidate.ConsolidatedDatabase(os.path.join(folder, "head_office.db"))
+        
+        def run_consolidate():
+            result, = consolidate.consolidate(head_office, [("silom", branch_path)], jobs=1)
+            assert 'error' not in result, result
+            summary, = head_office.get_branch_summary()
+            return result, (summary['bills'], summary['revenue'])
+        
+        first, totals = run_consolidate()
+        assert first['full'] and totals == (3, 534)
+        again, totals = run_consolidate()
+        assert not again['full'] and again['records'] == 0 and totals == (3, 534)
+        # รอบถัดไปอ่านเฉพาะที่เปลี่ยนหลัง watermark
+        assert branch.add_sale(None, "T2", [{'name': "หมึกสด", 'price': 79, 'quantity': 1}], 79)
+        assert branch.delete_sale(bill_ids[0])
+        changed, totals = run_consolidate()
+        assert not changed['full'] and changed['records'] == 2 and totals == (3, 435)
+        head_office.close()
+        branch.close()
+    print("✓ รวมซ้ำไม่นับซ้ำ รอบถัดไปนำเข้าเฉพาะบิลที่เพิ่ม/ลบ")
+    
     print("\nทดสอบฐานข้อมูลสำเร็จ!")
@@ -0,0 +1,148 @@
+"""
+Thread สำหรับเขียนฐานข้อมูลเบื้องหลัง (write-behind)
+ให้หน้าจอ Tk ไม่ต้องรอดิสก์ทุกครั้งที่กดปุ่ม
+
+ใช้งาน:
+    worker = DatabaseWorker("shabu_pos.db", root=root)
+    worker.submit("add_order_item", "T1", "กุ้งสด", 89, callback=on_done)
+"""
+
+import queue
+import threading
+
+from database import ShabuDatabase
+
+# คำสั่งที่รวมเป็น transaction เดียวได้เมื่อมาติดกันในคิว
+# ชื่อคำสั่งเดี่ยว -> ชื่อเมธอดแบบกลุ่มที่รับ list ของ args และคืน list ผลลัพธ์
+BATCH_METHODS = {
+    "add_order_item": "add_order_items",
+}
+
+_STOP = object()
+
+
+class DatabaseWorker:
+    """Thread ที่เป็นเจ้าของการเชื่อมต่อฐานข้อมูลและรับคำสั่งผ่านคิว
+
+    ผลลัพธ์ถูกส่งกลับไปยัง callback บน Tk main thread ผ่าน root.after
+    ถ้าไม่ระบุ root (เช่น ใช้งานแบบ headless) callback จะถูกเรียกบน thread ของ worker
+    """
+
+    def __init__(self, db_name="shabu_pos.db", root=None, profile=None,
+                 poll_interval=15, max_batch=200):
+        self.db_name = db_name
+        self.root = root
+        self.profile = profile
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self.commands = queue.Queue()
+        self.results = queue.Queue()
+        self._pending = None
+        self._ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="ShabuDatabaseWorker",
+                                       daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self.root is not None:
+            self.root.after(self.poll_interval, self._drain_results)
+
+    # ==================== API (เรียกจาก main thread) ====================
+
+    def submit(self, method, *args, callback=None, threadsafe=False):
+        """ส่งคำสั่งเข้าคิว method คือชื่อเมธอดของ ShabuDatabase
+
+        threadsafe=True เรียก callback บน thread ของ worker ทันทีแม้มี root
+        (สำหรับผู้ใช้ worker ร่วมที่ไม่ได้อยู่บน Tk เช่น OrderServer ที่ส่งผลต่อเข้า event loop เอง)
+        """
+        self.commands.put((method, args, callback, threadsafe))
+
+    def stop(self, timeout=10):
+        """รอให้คำสั่งในคิวทำเสร็จ แล้วปิดการเชื่อมต่อ"""
+        self.commands.put(_STOP)
+        self.thread.join(timeout)
+        if self.root is not None:
+            self._deliver_all()
+
+    # ==================== Worker Thread ====================
+
+    def _run(self):
+        db = ShabuDatabase(self.db_name, profile=self.profile)
+        self._ready.set()
+        try:
+            while True:
+                command = self._next_command()
+                if command is _STOP:
+                    break
+                batch = self._collect_batch(command)
+                if len(batch) > 1:
+                    self._execute_batch(db, batch)
+                else:
+                    self._execute(db, command)
+        finally:
+            db.close()
+
+    def _next_command(self):
+        if self._pending is not None:
+            command, self._pending = self._pending, None
+            return command
+        return self.commands.get()
+
+    def _collect_batch(self, command):
+        """ดึงคำสั่งชนิดเดียวกันที่รออยู่ในคิวต่อกันมารวมเป็นชุดเดียว"""
+        batch = [command]
+        if command[0] not in BATCH_METHODS:
+            return batch
+        while len(batch) < self.max_batch:
+            try:
+                following = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            if following is not _STOP and following[0] == command[0]:
+                batch.append(following)
+            else:
+                self._pending = following
+                break
+        return batch
+
+    def _execute(self, db, command):
+        method, args, callback, threadsafe = command
+        try:
+            result = getattr(db, method)(*args)
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด ({method}): {e}")
+            result = None
+        self._post(callback, result, threadsafe)
+
+    def _execute_batch(self, db, batch):
+        method = batch[0][0]
+        try:
+            results = getattr(db, BATCH_METHODS[method])([args for _, args, _, _ in batch])
+        except Exception as e:
+            print(f"✗ เกิดข้อผิดพลาด ({method}): {e}")
+            results = [None] * len(batch)
+        for (_, _, callback, threadsafe), result in zip(batch, results):
+            self._post(callback, result, threadsafe)
+
+    def _post(self, callback, result, threadsafe=False):
+        if callback is None:
+            return
+        if self.root is None or threadsafe:
+            callback(result)
+        else:
+            self.results.put((callback, result))
+
+    # ==================== Main Thread ====================
+
+    def _deliver_all(self):
+        while True:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                return
+            callback(result)
+
+    def _drain_results(self):
+        """เรียก callback ที่ทำเสร็จแล้วบน Tk main thread แล้วนัดตรวจรอบถัดไป"""
+        self._deliver_all()
+        if self.thread.is_alive():
+            self.root.after(self.poll_interval, self._drain_results)
@@ -0,0 +1,58 @@
+"""
+ส่งออกประวัติการขายพร้อมรายการในบิลเป็นไฟล์ CSV (เปิดด้วย Excel ได้) หรือ Parquet
+อ่านและเขียนทีละชุด จึงส่งออกข้อมูลทั้งปีได้โดยใช้หน่วยความจำคงที่
+
+ใช้งาน:
+    python export_sales.py                                    ทั้งหมด -> sales-YYYYMMDD.csv
+    python export_sales.py --from 2024-01-01 --to 2024-12-31 --output sales-2024.csv
+    python export_sales.py --output sales.parquet             Parquet (ต้องติดตั้ง pyarrow)
+
+หนึ่งแถวต่อหนึ่งรายการในบิล: bill_id, table_name, created_at, bill_total,
+menu_name, price, quantity, line_total
+--from/--to และ created_at เป็นวันเวลาท้องถิ่น เหมือนรายงานยอดขายรายวัน
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from database import EXPORT_CHUNK_ROWS, ShabuDatabase
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ส่งออกประวัติการขายเป็น CSV หรือ Parquet")
+    parser.add_argument("--db", default="shabu_pos.db", help="ไฟล์ฐานข้อมูลของร้าน")
+    parser.add_argument("--from", dest="date_from", help="วันที่เริ่ม (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="วันที่สิ้นสุด (YYYY-MM-DD รวมวันนี้)")
+    parser.add_argument("--output", help="ไฟล์ปลายทาง (.csv หรือ .parquet)")
+    parser.add_argument("--format", choices=("csv", "parquet"),
+                        help="รูปแบบไฟล์ (ไม่ระบุ = ดูจากนามสกุล)")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS,
+                        help="จำนวนแถวที่อ่าน/เขียนต่อครั้ง")
+    args = parser.parse_args(argv)
+
+    for value in (args.date_from, args.date_to):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                print(f"✗ วันที่ {value} ไม่ถูกต้อง (ใช้รูปแบบ YYYY-MM-DD)")
+                return 1
+    output = args.output or datetime.now().strftime(
+        "sales-%Y%m%d." + ("parquet" if args.format == "parquet" else "csv"))
+
+    db = ShabuDatabase(args.db)
+    try:
+        result = db.export_sales(output, args.date_from, args.date_to, args.format,
+                                 args.chunk_rows)
+        if result is None:
+            return 1
+        print(f"✓ ส่งออก {result['rows']:,} รายการ ({result['bytes']:,} ไบต์, "
+              f"{result['seconds']} วินาที): {result['path']}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+จำลองช่วงลูกค้าแน่นร้าน (เช่น คืนวันศุกร์) โดยไม่เปิดหน้าจอ Tk
+หลายเครื่องขาย (process) ใช้ไฟล์ฐานข้อมูลเดียวกันผ่าน POSService แบบเดียวกับหน้าจอจริง:
+สั่งอาหารพร้อมกันหลายโต๊ะ เติมรีฟิลรัว ๆ ลดรายการ และชำระเงินทับกันข้ามเครื่อง
+
+ใช้งาน:
+    python load_simulator.py                              4 เครื่อง 40 โต๊ะ 30 วินาที
+    python load_simulator.py --terminals 8 --duration 60
+    python load_simulator.py --output rush.json           บันทึกผลเป็น JSON
+
+รายงานอัตราสั่งอาหารต่อวินาที เวลารอล็อกเขียน และจำนวนครั้งที่ล้มเหลว
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from database import ShabuDatabase
+from pos_service import POSService
+from query_stats import percentile
+
+DEFAULT_SCENARIO = {
+    "terminals": 4,
+    "tables": 40,
+    "duration": 30.0,
+    "think_ms": 20.0,
+    "burst_size": 6,
+}
+
+# สัดส่วนการกดของพนักงานแต่ละเครื่อง
+ACTION_WEIGHTS = {
+    "order": 60,
+    "refill_burst": 20,
+    "remove": 8,
+    "checkout": 12,
+}
+
+# รอผลจาก worker นานสุดต่อหนึ่งการกด (วินาที) ถ้าเกินถือว่าล้มเหลว
+ACTION_TIMEOUT = 30
+
+
+class Completion:
+    """รอ callback จาก worker ให้ครบตามจำนวนคำสั่งที่ส่งไป"""
+
+    def __init__(self, count):
+        self.remaining = count
+        self.results = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if count == 0:
+            self.done.set()
+
+    def __call__(self, *result):
+        with self.lock:
+            self.results.append(result[0])
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.done.set()
+
+    def wait(self):
+        return self.done.wait(ACTION_TIMEOUT)
+
+
+def prepare_database(db_path, table_count):
+    """สร้างไฟล์ฐานข้อมูลพร้อมเมนูเริ่มต้นและโต๊ะตามจำนวนที่กำหนด (ออเดอร์ค้างว่าง)"""
+    db = ShabuDatabase(db_path)
+    if not db.get_all_menu_items():
+        db.initialize_default_data()
+    existing = set(db.get_all_tables())
+    for i in range(1, table_count + 1):
+        if f"T{i}" not in existing:
+            db.add_table(f"T{i}")
+    db._begin_write()
+    db.cursor.execute("DELETE FROM orders")
+    db.conn.commit()
+    db.close()
+
+
+def run_terminal(terminal_id, db_path, scenario, start_at, result_queue):
+    """เครื่องขายหนึ่งเครื่อง: กดตามสัดส่วน ACTION_WEIGHTS จนหมดเวลา"""
+    rng = random.Random(terminal_id)
+    service = POSService(db_path)
+    service.load_tables()
+    tables = [f"T{i}" for i in range(1, scenario["tables"] + 1) if f"T{i}" in service.tables]
+    menu = list(service.menu_items.items())
+    actions = list(ACTION_WEIGHTS)
+    weights = list(ACTION_WEIGHTS.values())
+
+    latencies = {action: [] for action in actions}
+    counts = {"orders": 0, "removed": 0, "checkouts": 0, "empty_checkouts": 0,
+              "failures": 0, "timeouts": 0}
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + scenario["duration"]
+    while time.time() < deadline:
+        action = rng.choices(actions, weights)[0]
+        table_name = rng.choice(tables)
+        started = time.perf_counter()
+
+        if action in ("order", "refill_burst"):
+            size = 1 if action == "order" else rng.randint(2, scenario["burst_size"])
+            # รีฟิลรัว ๆ: กดหลายครั้งติดกันโดยไม่รอผล worker จะรวมเป็น transaction เดียว
+            completion = Completion(size)
+            name, price = rng.choice(menu)
+            for _ in range(size):
+                if action == "order":
+                    name, price = rng.choice(menu)
+                service.add_item(table_name, name, price, callback=completion)
+            ok = completion.wait()
+            added = sum(1 for row in completion.results if row)
+            counts["orders"] += added
+            counts["failures"] += len(completion.results) - added
+
+        elif action == "remove":
+            completion = Completion(1)
+            orders = service.tables.get(table_name) or []
+            if not orders or not service.remove_item(table_name, rng.randrange(len(orders)),
+                                                     callback=completion):
+                continue
+            ok = completion.wait()
+            # แถวที่เครื่องอื่นชำระไปแล้วจะไม่พบ นับเป็นการกดที่ไม่สำเร็จ
+            if completion.results and completion.results[0]:
+                counts["removed"] += 1
+            else:
+                counts["failures"] += 1
+
+        else:
+            completion = Completion(1)
+            service.checkout(table_name, callback=completion)
+            ok = completion.wait()
+            if completion.results and completion.results[0]:
+                counts["checkouts"] += 1
+            else:
+                # โต๊ะว่าง (หรือเครื่องอื่นชำระไปก่อน)
+                counts["empty_checkouts"] += 1
+
+        if not ok:
+            counts["timeouts"] += 1
+        latencies[action].append(time.perf_counter() - started)
+        time.sleep(rng.expovariate(1000.0 / scenario["think_ms"]) if scenario["think_ms"] else 0)
+
+    lock_stats = Completion(1)
+    service.worker.submit("get_lock_stats", callback=lock_stats)
+    lock_stats.wait()
+    service.close()
+    result_queue.put({
+        "terminal": terminal_id,
+        "latencies": latencies,
+        "counts": counts,
+        "lock": lock_stats.results[0] if lock_stats.results else {},
+    })
+
+
+def summarize(terminal_results, duration):
+    """รวมผลทุกเครื่อง"""
+    counts = {}
+    latencies = {action: [] for action in ACTION_WEIGHTS}
+    lock = {"transactions": 0, "wait_total": 0.0, "wait_max": 0.0,
+            "busy_retries": 0, "busy_failures": 0}
+    for result in terminal_results:
+        for key, value in result["counts"].items():
+            counts[key] = counts.get(key, 0) + value
+        for action, values in result["latencies"].items():
+            latencies[action].extend(values)
+        for key, value in result["lock"].items():
+            if key == "wait_max":
+                lock[key] = max(lock[key], value)
+            else:
+                lock[key] += value
+
+    actions = {}
+    for action, values in latencies.items():
+        values.sort()
+        actions[action] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+    transactions = lock["transactions"] or 1
+    return {
+        "terminals": len(terminal_results),
+        "duration": duration,
+        "orders_per_sec": round(counts.get("orders", 0) / duration, 1),
+        "checkouts_per_sec": round(counts.get("checkouts", 0) / duration, 2),
+        "counts": counts,
+        "actions": actions,
+        "lock_wait": {
+            "transactions": lock["transactions"],
+            "total_s": round(lock["wait_total"], 3),
+            "mean_ms": round(lock["wait_total"] / transactions * 1000, 3),
+            "max_ms": round(lock["wait_max"] * 1000, 3),
+            "busy_retries": lock["busy_retries"],
+            "busy_failures": lock["busy_failures"],
+        },
+    }
+
+
+def print_summary(summary):
+    print("\n" + "=" * 60)
+    print(f"ผลจำลอง {summary['terminals']} เครื่อง {summary['duration']:.0f} วินาที")
+    print("=" * 60)
+    counts = summary["counts"]
+    print(f"สั่งอาหาร:        {counts.get('orders', 0):>8} รายการ "
+          f"({summary['orders_per_sec']} รายการ/วินาที)")
+    print(f"ชำระเงิน:         {counts.get('checkouts', 0):>8} บิล "
+          f"({summary['checkouts_per_sec']} บิล/วินาที)")
+    print(f"ลดรายการ:         {counts.get('removed', 0):>8}")
+    print(f"ชำระโต๊ะว่าง:      {counts.get('empty_checkouts', 0):>8}")
+    print(f"ล้มเหลว:          {counts.get('failures', 0):>8}")
+    print(f"รอผลเกินเวลา:     {counts.get('timeouts', 0):>8}")
+    lock = summary["lock_wait"]
+    print(f"\nรอล็อกเขียน: {lock['transactions']} transaction "
+          f"เฉลี่ย {lock['mean_ms']} ms สูงสุด {lock['max_ms']} ms "
+          f"(retry {lock['busy_retries']}, ล้มเหลว {lock['busy_failures']})")
+    print(f"\n{'การกด':<14} {'ครั้ง':>7} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10}")
+    for action, stats in summary["actions"].items():
+        print(f"{action:<14} {stats['count']:>7} {stats['p50_ms']:>10.2f} "
+              f"{stats['p99_ms']:>10.2f} {stats['max_ms']:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="จำลองช่วงลูกค้าแน่นร้านแบบไม่เปิดหน้าจอ")
+    parser.add_argument("--terminals", type=int, default=DEFAULT_SCENARIO["terminals"],
+                        help="จำนวนเครื่องขาย (process)")
+    parser.add_argument("--tables", type=int, default=DEFAULT_SCENARIO["tables"])
+    parser.add_argument("--duration", type=float, default=DEFAULT_SCENARIO["duration"],
+                        help="ระยะเวลาจำลอง (วินาที)")
+    parser.add_argument("--think-ms", type=float, default=DEFAULT_SCENARIO["think_ms"],
+                        help="เวลาเฉลี่ยระหว่างการกดแต่ละครั้งของพนักงาน")
+    parser.add_argument("--burst-size", type=int, default=DEFAULT_SCENARIO["burst_size"],
+                        help="จำนวนรีฟิลสูงสุดที่กดรัวในครั้งเดียว")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "shabu_rush.db"),
+                        help="ไฟล์ฐานข้อมูลที่ใช้จำลอง (ไม่ควรเป็นไฟล์ของร้าน)")
+    parser.add_argument("--output", help="บันทึกผลเป็นไฟล์ JSON")
+    args = parser.parse_args(argv)
+    scenario = {key: getattr(args, key) for key in DEFAULT_SCENARIO}
+
+    prepare_database(args.db, args.tables)
+    result_queue = multiprocessing.Queue()
+    start_at = time.time() + 1.0
+    processes = [
+        multiprocessing.Process(target=run_terminal,
+                                args=(terminal_id, args.db, scenario, start_at, result_queue))
+        for terminal_id in range(args.terminals)
+    ]
+    for process in processes:
+        process.start()
+    results = [result_queue.get(timeout=args.duration + 120) for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = summarize(results, args.duration)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ บันทึกผลที่ {args.output}")
+    return 0 if summary["counts"].get("timeouts", 0) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,52 @@
+import queue
+import sys
+import threading
 import tkinter as tk
-from tkinter import messagebox, simpledialog, Toplevel, ttk
+from tkinter import messagebox, simpledialog, Toplevel
 from datetime import datetime
+from pos_service import POSService
+from backup_scheduler import BackupScheduler
 from database import ShabuDatabase
 
+# หน่วงเวลาค้นหาประวัติขณะพิมพ์ (มิลลิวินาที)
+SEARCH_DEBOUNCE_MS = 300
+# จำนวนบิลที่โหลดต่อหน้าในหน้าต่างประวัติการขาย
+HISTORY_PAGE_SIZE = 200
+# ความถี่ที่หน้าต่างรายงานตรวจผลการวิเคราะห์จาก thread เบื้องหลัง (มิลลิวินาที)
+ANALYTICS_POLL_MS = 100
+# พอร์ตของเซิร์ฟเวอร์ออเดอร์สำหรับแท็บเล็ต/จอครัว (--serve)
+ORDER_SERVER_PORT = 8080
+# callback ที่จับเวลาเมื่อเปิดโหมดวัดความลื่นของหน้าจอ (--profile)
+PROFILED_COMMANDS = (
+    "switch_table", "add_item_to_bill", "remove_item_from_bill", "checkout",
+    "on_order_added", "on_order_removed", "on_open_orders_loaded",
+    "refresh_table_buttons", "refresh_menu_buttons", "update_bill_view",
+    "open_history_window", "open_report_window", "open_menu_management",
+    "on_remote_change",
+)
+
 class ShabuPOS:
-    def __init__(self, root):
+    def __init__(self, root, lazy_orders=False, profile_ui=False, serve_orders=False):
         self.root = root
         self.root.title("ระบบจัดการร้าน: เพลิดเพลินชาบู")
         self.root.geometry("1200x750")
         
-        # เชื่อมต่อฐานข้อมูล
-        self.db = ShabuDatabase("shabu_pos.db")
+        # ตรรกะโต๊ะ/ออเดอร์/ชำระเงิน (ไม่ขึ้นกับ Tk) พร้อมฐานข้อมูลและ worker เบื้องหลัง
+        self.service = POSService("shabu_pos.db", root=self.root)
+        self.db = self.service.db
+        self.worker = self.service.worker
+        
+        # สำรองฐานข้อมูลเบื้องหลังตามรอบ (ไม่ต้องปิดโปรแกรมเพื่อคัดลอกไฟล์)
+        self.backups = BackupScheduler(self.db.db_name)
         
-        # ตรวจสอบและสร้างข้อมูลเริ่มต้น
-        if not self.db.get_all_menu_items():
-            self.db.initialize_default_data()
+        # โหมดวัดความลื่นของหน้าจอ (ต้องห่อ callback ก่อนสร้างปุ่ม)
+        self.profiler = None
+        if profile_ui:
+            from ui_profiler import UIProfiler
+            self.profiler = UIProfiler(self.root, self.db)
+            for name in PROFILED_COMMANDS:
+                setattr(self, name, self.profiler.wrap(name, getattr(self, name)))
+            self.root.bind("<Control-Shift-P>", lambda e: self.toggle_profile_recording())
         
         # ตั้งค่าฟอนต์ภาษาไทยที่ชัดเจน
         self.thai_font = ("TH Sarabun New", 14)
@@ -32,16 +64,21 @@ class ShabuPOS:
             self.thai_font_xlarge = ("Tahoma", 20, "bold")
 
         # โหลดข้อมูลจากฐานข้อมูล
-        self.menu_items = self.db.get_all_menu_items()
-        self.tables = {table: [] for table in self.db.get_all_tables()}
+        self.menu_items = self.service.menu_items
         
-        # โหลดออเดอร์ที่ยังไม่ได้ชำระ
-        for table_name in self.tables:
-            orders = self.db.get_table_orders(table_name)
-            self.tables[table_name] = orders
+        # โหลดโต๊ะพร้อมออเดอร์ที่ยังไม่ได้ชำระ
+        # (lazy_orders: โหลดเฉพาะโต๊ะแรกก่อน ที่เหลือโหลดเบื้องหลังผ่าน worker)
+        self.tables = self.service.load_tables(lazy=lazy_orders,
+                                               callback=self.on_open_orders_loaded)
         
         self.current_table = list(self.tables.keys())[0] if self.tables else "T1"
 
+        # ปุ่มที่สร้างแล้ว (ชื่อ -> widget) และสถานะล่าสุด เพื่อใช้ปุ่มเดิมซ้ำ
+        self.table_buttons = {}
+        self.table_button_state = {}
+        self.menu_buttons = {}
+        self.menu_button_state = {}
+
         # --- UI Layout ---
         self.create_layout()
         self.refresh_table_buttons()
@@ -50,11 +87,51 @@ class ShabuPOS:
         
         # จัดการการปิดหน้าต่าง
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        
+        # หน้าต่างวินิจฉัยความเร็วฐานข้อมูล (ซ่อนไว้ เปิดด้วย Ctrl+Shift+D)
+        self.root.bind("<Control-Shift-D>", lambda e: self.open_diagnostics_window())
+        
+        # เซิร์ฟเวอร์ออเดอร์ในโปรแกรมขาย ออเดอร์จากแท็บเล็ตส่งมาที่หน้าจอผ่านคิว
+        self.order_server = None
+        if serve_orders:
+            from order_server import EventQueue, OrderServer
+            self.order_server = OrderServer(self.db.db_name, port=ORDER_SERVER_PORT,
+                                            worker=self.worker)
+            self.order_server.listeners.append(EventQueue(self.root, self.on_remote_change))
+            if not self.order_server.start_background():
+                self.order_server = None
+                messagebox.showerror("ข้อผิดพลาด",
+                                     f"เปิดเซิร์ฟเวอร์ออเดอร์ที่พอร์ต {ORDER_SERVER_PORT} ไม่ได้")
+
+    def on_open_orders_loaded(self):
+        """วาดโต๊ะและบิลใหม่เมื่อโหลดออเดอร์ของทุกโต๊ะเบื้องหลังเสร็จ (โหมด lazy_orders)"""
+        self.refresh_table_buttons()
+        self.update_bill_view()
+
+    def on_remote_change(self, event):
+        """ออเดอร์เปลี่ยนจากแท็บเล็ต (--serve): โหลดออเดอร์ของโต๊ะนั้นใหม่แล้ววาดใหม่"""
+        table_name = event.get('table')
+        if table_name not in self.tables and event['type'] != 'table_added':
+            return
+        self.tables[table_name] = self.db.get_table_orders(table_name)
+        self.refresh_table_buttons()
+        if table_name == self.current_table:
+            self.update_bill_view()
+
+    def publish_change(self, kind, **data):
+        """แจ้งแท็บเล็ต/จอครัวเมื่อกดจากหน้าจอนี้ (เมื่อเปิด --serve)"""
+        if self.order_server is not None:
+            self.order_server.notify(kind, **data)
 
     def on_closing(self):
         """ฟังก์ชันสำหรับยืนยันการปิดโปรแกรม"""
         if messagebox.askokcancel("ปิดโปรแกรม", "คุณต้องการปิดโปรแกรมใช่หรือไม่?"):
-            self.db.close()
+            if self.profiler is not None:
+                self.profiler.stop_recording()
+            if self.order_server is not None:
+                self.order_server.stop()
+            self.backups.stop()
+            self.service.close()
             self.root.destroy()
 
     def create_layout(self):
@@ -85,6 +162,11 @@ class ShabuPOS:
                  fg="white", font=self.thai_font_large, command=self.open_history_window, 
                  height=2).pack(fill=tk.X, side=tk.BOTTOM, pady=5)
         
+        # Report Button - รายงานยอดขาย (Z-report / ยอดสะสมเดือน)
+        tk.Button(self.frame_left, text="📊 รายงานยอดขาย", bg="#8e44ad", 
+                 fg="white", font=self.thai_font_large, command=self.open_report_window, 
+                 height=2).pack(fill=tk.X, side=tk.BOTTOM, pady=5)
+        
         # Exit Button - ปุ่มปิดโปรแกรม
         tk.Button(self.frame_left, text="❌ ปิดโปรแกรม", bg="#c0392b", 
                  fg="white", font=self.thai_font_large, command=self.on_closing, 
@@ -134,40 +216,66 @@ class ShabuPOS:
                  height=2).pack(fill=tk.X, padx=10, pady=20)
 
     # --- Table Management Functions ---
+    def table_button_style(self, table_name):
+        """คืนค่า (สีพื้น, สีตัวอักษร) ของปุ่มโต๊ะตามสถานะ"""
+        if table_name == self.current_table:
+            return "#2ecc71", "white"
+        if self.tables.get(table_name):
+            return "#e74c3c", "white"
+        return "#ecf0f1", "black"
+
     def refresh_table_buttons(self):
-        for widget in self.table_container.winfo_children():
-            widget.destroy()
-        
-        row, col = 0, 0
-        for table_name in self.tables:
-            status_color = "#e74c3c" if self.tables[table_name] else "#ecf0f1"
-            fg_color = "white" if self.tables[table_name] else "black"
-            
-            if table_name == self.current_table:
-                status_color = "#2ecc71"
-                fg_color = "white"
-
-            btn = tk.Button(self.table_container, text=table_name, bg=status_color, 
-                          fg=fg_color, font=self.thai_font_bold, height=2, width=8, 
-                          command=lambda t=table_name: self.switch_table(t))
-            btn.grid(row=row, column=col, padx=2, pady=2)
-            
-            col += 1
-            if col > 2:
-                col = 0
-                row += 1
+        """ซิงก์ปุ่มโต๊ะกับ self.tables โดยใช้ปุ่มเดิมซ้ำ
+        
+        สร้าง/ทำลายปุ่มเฉพาะโต๊ะที่เพิ่มหรือถูกลบ ที่เหลือแค่ปรับสีและตำแหน่งที่เปลี่ยน
+        """
+        for table_name in list(self.table_buttons):
+            if table_name not in self.tables:
+                self.table_buttons.pop(table_name).destroy()
+                del self.table_button_state[table_name]
+        
+        for index, table_name in enumerate(self.tables):
+            if table_name not in self.table_buttons:
+                self.table_buttons[table_name] = tk.Button(
+                    self.table_container, text=table_name, font=self.thai_font_bold,
+                    height=2, width=8, command=lambda t=table_name: self.switch_table(t))
+                self.table_button_state[table_name] = None
+            self.update_table_button(table_name, position=divmod(index, 3))
+
+    def update_table_button(self, table_name, position=None):
+        """ปรับสี (และตำแหน่ง) ของปุ่มโต๊ะเดียว เฉพาะเมื่อมีการเปลี่ยนแปลง"""
+        btn = self.table_buttons.get(table_name)
+        if btn is None:
+            return
+        old_state = self.table_button_state[table_name]
+        if position is None:
+            position = old_state[2]
+        state = self.table_button_style(table_name) + (position,)
+        if state == old_state:
+            return
+        if old_state is None or old_state[:2] != state[:2]:
+            btn.config(bg=state[0], fg=state[1])
+        if old_state is None or old_state[2] != position:
+            btn.grid(row=position[0], column=position[1], padx=2, pady=2)
+        self.table_button_state[table_name] = state
 
     def switch_table(self, table_name):
+        previous = self.current_table
         self.current_table = table_name
         self.lbl_current_table.config(text=f"โต๊ะ: {self.current_table}")
-        self.refresh_table_buttons()
+        if previous in self.tables and previous in self.table_buttons \
+                and table_name in self.table_buttons:
+            self.update_table_button(previous)
+            self.update_table_button(table_name)
+        else:
+            self.refresh_table_buttons()
         self.update_bill_view()
 
     def add_table(self):
         name = simpledialog.askstring("เพิ่มโต๊ะ", "ตั้งชื่อโต๊ะใหม่:")
         if name:
-            if self.db.add_table(name):
-                self.tables[name] = []
+            if self.service.add_table(name):
+                self.publish_change("table_added", table=name)
                 self.refresh_table_buttons()
                 messagebox.showinfo("สำเร็จ", f"เพิ่มโต๊ะ {name} เรียบร้อย")
             else:
@@ -177,20 +285,18 @@ class ShabuPOS:
         old_name = self.current_table
         new_name = simpledialog.askstring("แก้ไขชื่อ", f"เปลี่ยนชื่อ {old_name} เป็น:")
         if new_name and new_name != old_name:
-            if self.db.rename_table(old_name, new_name):
-                self.tables[new_name] = self.tables.pop(old_name)
+            if self.service.rename_table(old_name, new_name):
                 self.switch_table(new_name)
                 messagebox.showinfo("สำเร็จ", f"เปลี่ยนชื่อเป็น {new_name} เรียบร้อย")
             else:
                 messagebox.showerror("ข้อผิดพลาด", "ชื่อนี้มีอยู่แล้วหรือเกิดข้อผิดพลาด")
 
     def delete_table(self):
-        if len(self.tables[self.current_table]) > 0:
+        if self.service.is_occupied(self.current_table):
             messagebox.showwarning("เตือน", "โต๊ะนี้ยังมีลูกค้าอยู่ ลบไม่ได้")
             return
         if messagebox.askyesno("ยืนยัน", f"ต้องการลบ {self.current_table} ใช่ไหม?"):
-            if self.db.delete_table(self.current_table):
-                del self.tables[self.current_table]
+            if self.service.delete_table(self.current_table):
                 if self.tables:
                     self.switch_table(list(self.tables.keys())[0])
                 else:
@@ -200,24 +306,36 @@ class ShabuPOS:
                 messagebox.showinfo("สำเร็จ", "ลบโต๊ะเรียบร้อย")
 
     # --- Menu Management Functions ---
-    def refresh_menu_buttons(self):
-        for widget in self.menu_container.winfo_children():
-            widget.destroy()
+    def refresh_menu_buttons(self, reload=False):
+        """ซิงก์ปุ่มเมนูกับ self.menu_items โดยใช้ปุ่มเดิมซ้ำ
+        
+        reload=True จะโหลดเมนูจากฐานข้อมูลใหม่ (ใช้หลังเพิ่ม/แก้ไข/ลบเมนู)
+        """
+        if reload:
+            self.menu_items = self.service.reload_menu()
         
-        # โหลดเมนูจากฐานข้อมูล
-        self.menu_items = self.db.get_all_menu_items()
+        for name in list(self.menu_buttons):
+            if name not in self.menu_items:
+                self.menu_buttons.pop(name).destroy()
+                del self.menu_button_state[name]
         
-        row, col = 0, 0
-        for name, price in self.menu_items.items():
+        for index, (name, price) in enumerate(self.menu_items.items()):
             text = f"{name}\n{price}.-"
-            btn = tk.Button(self.menu_container, text=text, font=self.thai_font_large, 
-                          width=15, height=3, bg="white", relief="raised",
-                          command=lambda n=name, p=price: self.add_item_to_bill(n, p))
-            btn.grid(row=row, column=col, padx=8, pady=8)
-            col += 1
-            if col > 3:
-                col = 0
-                row += 1
+            position = divmod(index, 4)
+            btn = self.menu_buttons.get(name)
+            if btn is None:
+                # ราคาอ่านจาก self.menu_items ตอนกด ปุ่มจึงไม่ต้องสร้างใหม่เมื่อแก้ราคา
+                btn = tk.Button(self.menu_container, text=text, font=self.thai_font_large, 
+                              width=15, height=3, bg="white", relief="raised",
+                              command=lambda n=name: self.add_item_to_bill(n, self.menu_items[n]))
+                self.menu_buttons[name] = btn
+                self.menu_button_state[name] = (text, None)
+            old_text, old_position = self.menu_button_state[name]
+            if old_text != text:
+                btn.config(text=text)
+            if old_position != position:
+                btn.grid(row=position[0], column=position[1], padx=8, pady=8)
+            self.menu_button_state[name] = (text, position)
 
     def open_menu_management(self):
         win = Toplevel(self.root)
@@ -284,7 +402,7 @@ class ShabuPOS:
                     self.db.add_menu_item(name, price)
                 
                 load_menu_list()
-                self.refresh_menu_buttons()
+                self.refresh_menu_buttons(reload=True)
                 entry_name.delete(0, tk.END)
                 entry_price.delete(0, tk.END)
                 messagebox.showinfo("สำเร็จ", "บันทึกเมนูเรียบร้อย")
@@ -297,7 +415,7 @@ class ShabuPOS:
                 if messagebox.askyesno("ยืนยัน", f"ลบเมนู {name}?"):
                     if self.db.delete_menu_item(name):
                         load_menu_list()
-                        self.refresh_menu_buttons()
+                        self.refresh_menu_buttons(reload=True)
                         entry_name.delete(0, tk.END)
                         entry_price.delete(0, tk.END)
                         messagebox.showinfo("สำเร็จ", "ลบเมนูเรียบร้อย")
@@ -315,39 +433,73 @@ class ShabuPOS:
             messagebox.showwarning("คำเตือน", "กรุณาเลือกหรือสร้างโต๊ะก่อน")
             return
         
-        # เพิ่มลงฐานข้อมูล
-        if self.db.add_order_item(self.current_table, name, price):
-            # โหลดออเดอร์ใหม่จากฐานข้อมูล
-            self.tables[self.current_table] = self.db.get_table_orders(self.current_table)
-            self.update_bill_view()
-            self.refresh_table_buttons()
+        # เพิ่มลงฐานข้อมูลผ่าน worker แล้วเพิ่มแถวที่ได้ลงบิลเมื่อบันทึกเสร็จ
+        table_name = self.current_table
+        self.service.add_item(table_name, name, price,
+                              callback=lambda row, idx: self.on_order_added(table_name, row, idx))
 
     def remove_item_from_bill(self):
         selection = self.bill_list.curselection()
         if selection:
-            idx = selection[0]
-            order = self.tables[self.current_table][idx]
+            table_name = self.current_table
             
-            # ลบจากฐานข้อมูล
-            if self.db.delete_order_item(order['id']):
-                # โหลดออเดอร์ใหม่
-                self.tables[self.current_table] = self.db.get_table_orders(self.current_table)
-                self.update_bill_view()
-                self.refresh_table_buttons()
+            # ลบจากฐานข้อมูลผ่าน worker แล้วลบแถวนั้นออกจากบิล
+            self.service.remove_item(
+                table_name, selection[0],
+                callback=lambda row, idx: self.on_order_removed(table_name, row, idx))
+
+    def on_order_added(self, table_name, row, idx):
+        """ปรับบิลเฉพาะแถวที่เปลี่ยน แทนการโหลดและวาดบิลใหม่ทั้งหมด
+        
+        row คือแถวหลังเพิ่ม ถ้า quantity เป็น 1 คือแถวใหม่ ไม่เช่นนั้นคือเพิ่มจำนวนในแถวเดิม
+        """
+        if row is None or idx is None:
+            return
+        self.publish_change("order_added", table=table_name, order=row)
+        orders = self.tables[table_name]
+        if table_name == self.current_table:
+            if idx < self.bill_list.size():
+                self.bill_list.delete(idx)
+            self.bill_list.insert(idx, self.format_bill_line(row))
+            self.set_bill_total(self.bill_total + row['price'])
+        # สีปุ่มโต๊ะเปลี่ยนเฉพาะตอนโต๊ะว่างกลายเป็นมีลูกค้า
+        if len(orders) == 1 and row['quantity'] == 1:
+            self.update_table_button(table_name)
+
+    def on_order_removed(self, table_name, row, idx):
+        """ลดจำนวนในแถวเดียวของบิล (ลบแถวเมื่อเหลือ 0)"""
+        if row is None or idx is None:
+            return
+        self.publish_change("order_removed", table=table_name, order=row)
+        if table_name == self.current_table:
+            self.bill_list.delete(idx)
+            if row['quantity'] > 0:
+                self.bill_list.insert(idx, self.format_bill_line(row))
+                self.bill_list.selection_set(idx)
+            self.set_bill_total(self.bill_total - row['price'])
+        if not self.tables.get(table_name):
+            self.update_table_button(table_name)
+
+    def format_bill_line(self, item):
+        quantity = item.get('quantity', 1)
+        name_display = f"{item['name']}" if quantity == 1 else f"{item['name']} x{quantity}"
+        price_display = f"{item['price'] * quantity}"
+        space = 35 - len(name_display) - len(price_display) 
+        if space < 1: space = 1
+        return f"{name_display}{' '*space}{price_display}"
+
+    def set_bill_total(self, total):
+        self.bill_total = total
+        self.lbl_total.config(text=f"รวม: {total} บาท")
 
     def update_bill_view(self):
         self.bill_list.delete(0, tk.END)
         total = 0
         if self.current_table in self.tables:
             for item in self.tables[self.current_table]:
-                name_display = f"{item['name']}"
-                price_display = f"{item['price']}"
-                space = 35 - len(name_display) - len(price_display) 
-                if space < 1: space = 1
-                
-                self.bill_list.insert(tk.END, f"{name_display}{' '*space}{price_display}")
-                total += item['price']
-        self.lbl_total.config(text=f"รวม: {total} บาท")
+                self.bill_list.insert(tk.END, self.format_bill_line(item))
+                total += item['price'] * item.get('quantity', 1)
+        self.set_bill_total(total)
 
     def generate_receipt_text(self, table_name, items, total, timestamp, bill_id):
         text = "========= เพลิดเพลินชาบู =========\n"
@@ -357,42 +509,270 @@ class ShabuPOS:
         text += f"โต๊ะ: {table_name}\n"
         text += "--------------------------------\n"
         for item in items:
-            text += f"{item['name']:<20} {item['price']:>5}\n"
+            quantity = item.get('quantity', 1)
+            name = item['name'] if quantity == 1 else f"{item['name']} x{quantity}"
+            text += f"{name:<20} {item['price'] * quantity:>5}\n"
         text += "--------------------------------\n"
         text += f"ยอดสุทธิ:           {total:>5} บาท\n"
         text += "================================"
         return text
 
     def checkout(self):
-        if not self.current_table or not self.tables[self.current_table]:
+        if not self.current_table or not self.service.is_occupied(self.current_table):
             return
 
-        items = self.tables[self.current_table]
-        total = sum(i['price'] for i in items)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        table_name = self.current_table
+
+        def on_done(receipt):
+            if receipt:
+                self.publish_change("checkout", table=table_name, bill_id=receipt['id'],
+                                    total=receipt['total'])
+                # แสดงใบเสร็จ
+                receipt_text = self.generate_receipt_text(receipt['table'], receipt['items'],
+                                                          receipt['total'], receipt['timestamp'],
+                                                          receipt['id'])
+                messagebox.showinfo("ใบเสร็จ - เพลิดเพลินชาบู", receipt_text)
+
+                # อัปเดต UI
+                self.update_bill_view()
+                self.update_table_button(table_name)
+            else:
+                messagebox.showerror("ข้อผิดพลาด", "ไม่สามารถบันทึกการขายได้")
+
+        # บันทึกการขายและล้างออเดอร์ใน transaction เดียว (ทำงานเบื้องหลัง)
+        self.service.checkout(table_name, callback=on_done)
+
+    # --- Report Functions ---
+    def generate_report_text(self, report):
+        if report['date_from'] == report['date_to']:
+            title = f"รายงานปิดยอด (Z-Report) {report['date_from']}"
+        else:
+            title = f"ยอดขาย {report['date_from']} ถึง {report['date_to']}"
+        text = "========= เพลิดเพลินชาบู =========\n"
+        text += f"{title}\n"
+        text += "--------------------------------\n"
+        text += f"{'ยอดขายรวม':<20} {report['revenue']:>10}\n"
+        text += f"{'จำนวนบิล':<20} {report['bills']:>10}\n"
+        text += f"{'จำนวนรายการ':<20} {report['items']:>10}\n"
+        if report['bills']:
+            text += f"{'เฉลี่ยต่อบิล':<20} {report['revenue'] / report['bills']:>10.2f}\n"
+        if report['hours']:
+            text += "\n--- รายชั่วโมง ---\n"
+            for row in report['hours']:
+                text += f"{row['hour']:02d}:00{'':<15} {row['revenue']:>10} ({row['bills']} บิล)\n"
+        elif len(report['days']) > 1:
+            text += "\n--- รายวัน ---\n"
+            for row in report['days']:
+                text += f"{row['day']:<20} {row['revenue']:>10} ({row['bills']} บิล)\n"
+        text += "\n--- รายเมนู ---\n"
+        for row in report['menu']:
+            text += f"{row['name']:<20} {row['revenue']:>10} (x{row['quantity']})\n"
+        text += "\n--- รายโต๊ะ ---\n"
+        for row in report['tables']:
+            text += f"{row['table']:<20} {row['revenue']:>10} ({row['bills']} บิล)\n"
+        text += "================================"
+        return text
+
+    def open_report_window(self):
+        win = Toplevel(self.root)
+        win.title("รายงานยอดขาย - เพลิดเพลินชาบู")
+        win.geometry("760x650")
+
+        control_frame = tk.Frame(win, bg="#ecf0f1", padx=10, pady=10)
+        control_frame.pack(fill=tk.X)
         
-        # สร้าง bill_id
-        sales_count = len(self.db.get_all_sales())
-        bill_id = f"S-{sales_count + 1:05d}"
+        tk.Label(control_frame, text="วันที่ (YYYY-MM-DD):", font=self.thai_font, 
+                bg="#ecf0f1").pack(side=tk.LEFT, padx=5)
+        day_entry = tk.Entry(control_frame, font=self.thai_font, width=12)
+        day_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        day_entry.pack(side=tk.LEFT, padx=5)
 
-        # บันทึกลงฐานข้อมูล
-        if self.db.add_sale(bill_id, self.current_table, items, total):
-            # ล้างออเดอร์ของโต๊ะนี้
-            self.db.clear_table_orders(self.current_table)
-            
-            # แสดงใบเสร็จ
-            receipt_text = self.generate_receipt_text(self.current_table, items, total, timestamp, bill_id)
-            messagebox.showinfo("ใบเสร็จ - เพลิดเพลินชาบู", receipt_text)
+        report_text = tk.Text(win, font=("Courier New", 12), wrap=tk.NONE)
+        report_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-            # อัปเดต UI
-            self.tables[self.current_table] = []
-            self.update_bill_view()
-            self.refresh_table_buttons()
+        def show_report(date_from, date_to=None):
+            report = self.db.get_sales_report(date_from, date_to)
+            report_text.config(state=tk.NORMAL)
+            report_text.delete("1.0", tk.END)
+            report_text.insert(tk.END, self.generate_report_text(report))
+            report_text.config(state=tk.DISABLED)
+
+        def show_day():
+            show_report(day_entry.get().strip())
+
+        def show_month_to_date():
+            day = day_entry.get().strip()
+            show_report(day[:8] + "01", day)
+
+        tk.Button(control_frame, text="Z-Report รายวัน", command=show_day, bg="#3498db", 
+                 fg="white", font=self.thai_font_bold).pack(side=tk.LEFT, padx=5)
+        tk.Button(control_frame, text="ยอดสะสมเดือนนี้", command=show_month_to_date, 
+                 bg="#27ae60", fg="white", font=self.thai_font_bold).pack(side=tk.LEFT, padx=5)
+
+        def show_analytics():
+            # โหลด NumPy เมื่อกดวิเคราะห์ครั้งแรก ไม่ให้ถ่วงเวลาเปิดโปรแกรม
+            import sales_analytics
+            if not sales_analytics.available():
+                messagebox.showwarning("วิเคราะห์", "ต้องติดตั้ง NumPy ก่อน (pip install numpy)",
+                                       parent=win)
+                return
+            try:
+                date_from, date_to = sales_analytics.last_year(day_entry.get().strip())
+            except ValueError:
+                messagebox.showwarning("วิเคราะห์", "วันที่ต้องเป็นรูปแบบ YYYY-MM-DD", parent=win)
+                return
+
+            # ข้อมูลทั้งปีใช้เวลาเกือบวินาที: วิเคราะห์บน thread แยกด้วยการเชื่อมต่อของตัวเอง
+            # (sqlite3 ใช้การเชื่อมต่อข้าม thread ไม่ได้) แล้วรอผลผ่านคิวด้วย win.after
+            results = queue.Queue()
+
+            def run():
+                db = ShabuDatabase(self.db.db_name)
+                try:
+                    results.put(sales_analytics.analyze(db, date_from, date_to))
+                except Exception as e:
+                    results.put(e)
+                finally:
+                    db.close()
+
+            def poll():
+                if not win.winfo_exists():
+                    return
+                try:
+                    result = results.get_nowait()
+                except queue.Empty:
+                    win.after(ANALYTICS_POLL_MS, poll)
+                    return
+                analytics_button.config(state=tk.NORMAL)
+                if isinstance(result, Exception):
+                    messagebox.showerror("วิเคราะห์", f"วิเคราะห์ไม่สำเร็จ: {result}", parent=win)
+                    return
+                report_text.config(state=tk.NORMAL)
+                report_text.delete("1.0", tk.END)
+                report_text.insert(tk.END, sales_analytics.format_report(result))
+                report_text.config(state=tk.DISABLED)
+
+            analytics_button.config(state=tk.DISABLED)
+            report_text.config(state=tk.NORMAL)
+            report_text.delete("1.0", tk.END)
+            report_text.insert(tk.END, f"กำลังวิเคราะห์ {date_from} ถึง {date_to} ...")
+            report_text.config(state=tk.DISABLED)
+            threading.Thread(target=run, name="ShabuAnalytics", daemon=True).start()
+            win.after(ANALYTICS_POLL_MS, poll)
+
+        show_analytics = self.profiled("show_analytics", show_analytics)
+        analytics_button = tk.Button(control_frame, text="📈 วิเคราะห์ 1 ปี", command=show_analytics,
+                                     bg="#8e44ad", fg="white", font=self.thai_font_bold)
+        analytics_button.pack(side=tk.LEFT, padx=5)
+
+        show_day()
+
+    # --- Diagnostics Functions ---
+    def profiled(self, name, callback):
+        """ห่อ callback ให้จับเวลาเมื่อเปิดโหมด --profile (ไม่เช่นนั้นคืน callback เดิม)"""
+        if self.profiler is None:
+            return callback
+        return self.profiler.wrap(name, callback)
+
+    def toggle_profile_recording(self):
+        path = self.profiler.toggle_recording()
+        if path:
+            messagebox.showinfo("Profiler", f"บันทึก cProfile แล้วที่\n{path}")
         else:
-            messagebox.showerror("ข้อผิดพลาด", "ไม่สามารถบันทึกการขายได้")
+            messagebox.showinfo("Profiler", "เริ่มบันทึก cProfile (กด Ctrl+Shift+P อีกครั้งเพื่อหยุด)")
+
+    def generate_profiler_text(self, stats):
+        loop = stats['loop']
+        text = "===== ความลื่นของหน้าจอ (--profile) =====\n"
+        text += f"heartbeat ทุก {loop['interval_ms']:.0f} ms: {loop['ticks']} ครั้ง "
+        text += f"หน่วง p50 {loop['lag_p50_ms']:.1f} ms p99 {loop['lag_p99_ms']:.1f} ms "
+        text += f"สูงสุด {loop['lag_max_ms']:.1f} ms กระตุก {loop['stutters']} ครั้ง\n"
+        text += f"บันทึก cProfile: {'กำลังบันทึก' if stats['recording'] else 'ปิด'} (Ctrl+Shift+P)\n"
+        text += f"\n{'คำสั่ง':<24} {'ครั้ง':>6} {'p50':>8} {'p99':>8} {'สูงสุด':>8} "
+        text += f"{'DB ms':>9} {'หน้าจอ ms':>10}\n"
+        for row in stats['commands']:
+            text += f"{row['command']:<24} {row['count']:>6} {row['p50_ms']:>8.2f} "
+            text += f"{row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} {row['db_ms']:>9.1f} "
+            text += f"{row['widget_ms']:>10.1f}\n"
+        return text + "\n"
+
+    def generate_query_stats_text(self, title, stats, top=15):
+        text = f"===== {title} =====\n"
+        text += f"ตั้งแต่ {stats['since']}  คำสั่งช้า (>= {stats['threshold_ms']} ms): "
+        text += f"{stats['slow_queries']}  log: {stats['slow_log']}\n"
+        lock = stats['lock']
+        text += f"รอล็อกเขียน {lock['transactions']} ครั้ง รวม {lock['wait_total'] * 1000:.1f} ms "
+        text += f"สูงสุด {lock['wait_max'] * 1000:.1f} ms (busy retry {lock['busy_retries']})\n"
+        text += f"\n{'เมธอด':<24} {'ครั้ง':>7} {'รวม ms':>10} {'เฉลี่ย':>8} {'สูงสุด':>8}\n"
+        for row in stats['methods'][:top]:
+            text += f"{row['method']:<24} {row['count']:>7} {row['total_ms']:>10.1f} "
+            text += f"{row['mean_ms']:>8.2f} {row['max_ms']:>8.2f}\n"
+        text += f"\n{'ครั้ง':>7} {'รวม ms':>10} {'เฉลี่ย':>8} {'สูงสุด':>8}  คำสั่ง SQL\n"
+        for row in stats['statements'][:top]:
+            text += f"{row['count']:>7} {row['total_ms']:>10.1f} {row['mean_ms']:>8.2f} "
+            text += f"{row['max_ms']:>8.2f}  {row['sql'][:90]}\n"
+        return text + "\n"
+
+    def generate_backup_text(self):
+        text = "===== สำรองข้อมูล =====\n"
+        result = self.backups.last_result
+        if result:
+            text += f"ล่าสุด: {result['path']} ({result['bytes']:,} ไบต์, "
+            text += f"{result['seconds']} วินาที, integrity {result['integrity']})\n"
+        else:
+            text += "ยังไม่ได้สำรองในรอบนี้\n"
+        interval = self.backups.interval
+        text += f"สำรองอัตโนมัติ: {'ทุก ' + str(interval // 60) + ' นาที' if interval else 'ปิด'}\n"
+        return text + "\n"
+
+    def open_diagnostics_window(self):
+        win = Toplevel(self.root)
+        win.title("วินิจฉัยฐานข้อมูล - เพลิดเพลินชาบู")
+        win.geometry("1000x650")
+
+        control_frame = tk.Frame(win, bg="#ecf0f1", padx=10, pady=10)
+        control_frame.pack(fill=tk.X)
+
+        stats_text = tk.Text(win, font=("Courier New", 10), wrap=tk.NONE)
+        stats_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        def show(sections):
+            stats_text.config(state=tk.NORMAL)
+            stats_text.delete("1.0", tk.END)
+            stats_text.insert(tk.END, "".join(sections))
+            stats_text.config(state=tk.DISABLED)
+
+        def refresh():
+            # สถิติของหน้าจอหลักอ่านได้ทันที ส่วนของ worker ต้องถามผ่านคิว
+            ui_section = self.generate_query_stats_text("หน้าจอ (อ่านข้อมูล)",
+                                                        self.db.get_query_stats())
+            if self.profiler is not None:
+                ui_section = self.generate_profiler_text(self.profiler.snapshot()) + ui_section
+            ui_section = self.generate_backup_text() + ui_section
+            show([ui_section, "worker: กำลังโหลด...\n"])
+            self.worker.submit(
+                "get_query_stats",
+                callback=lambda stats: stats and win.winfo_exists() and show(
+                    [ui_section, self.generate_query_stats_text("worker (เขียนข้อมูล)", stats)]))
+
+        def reset():
+            self.db.reset_query_stats()
+            self.worker.submit("reset_query_stats", callback=lambda result: refresh())
+
+        tk.Button(control_frame, text="🔄 รีเฟรช", command=refresh, bg="#3498db",
+                 fg="white", font=self.thai_font_bold).pack(side=tk.LEFT, padx=5)
+        tk.Button(control_frame, text="ล้างสถิติ", command=reset, bg="#e67e22",
+                 fg="white", font=self.thai_font_bold).pack(side=tk.LEFT, padx=5)
+        tk.Button(control_frame, text="💾 สำรองข้อมูลตอนนี้", command=self.backups.backup_now,
+                 bg="#27ae60", fg="white", font=self.thai_font_bold).pack(side=tk.LEFT, padx=5)
+
+        refresh()
 
     # --- History Functions with SEARCH capability ---
     def open_history_window(self):
+        # โหลด ttk เมื่อเปิดหน้าต่างประวัติครั้งแรก ไม่ให้ถ่วงเวลาเปิดโปรแกรม
+        from tkinter import ttk
+
         win = Toplevel(self.root)
         win.title("ประวัติการขาย - เพลิดเพลินชาบู")
         win.geometry("900x650")
@@ -419,6 +799,19 @@ class ShabuPOS:
                                    state="readonly", font=self.thai_font, width=15)
         search_combo.pack(side=tk.LEFT, padx=5)
 
+        # Range Filter Frame - กรองช่วงวันที่/ยอดรวม (ใช้ index ของฐานข้อมูล)
+        range_frame = tk.Frame(win, bg="#ecf0f1", padx=10)
+        range_frame.pack(fill=tk.X)
+        range_entries = {}
+        for key, label in (("date_from", "วันที่ตั้งแต่"), ("date_to", "ถึง"),
+                           ("min_total", "ยอดตั้งแต่"), ("max_total", "ถึง")):
+            tk.Label(range_frame, text=f"{label}:", font=self.thai_font, 
+                    bg="#ecf0f1").pack(side=tk.LEFT, padx=5)
+            entry = tk.Entry(range_frame, font=self.thai_font, width=12)
+            entry.pack(side=tk.LEFT, padx=5)
+            entry.bind("<KeyRelease>", lambda e: on_search())
+            range_entries[key] = entry
+
         # Treeview
         columns = ("id", "time", "table", "total")
         tree = ttk.Treeview(win, columns=columns, show="headings", height=20)
@@ -432,40 +825,77 @@ class ShabuPOS:
         tree.column("table", width=100, anchor="center")
         tree.column("total", width=120, anchor="e")
         
+        # โหลดประวัติทีละหน้า (keyset) และโหลดเพิ่มเมื่อเลื่อนใกล้ท้ายรายการ
+        paging = {"query": None, "cursor": None, "done": True}
+
+        def load_next_page():
+            if paging["done"]:
+                return
+            search_text, field, filters = paging["query"]
+            sales = self.db.get_sales_page(paging["cursor"], HISTORY_PAGE_SIZE,
+                                           search_text, field, **filters)
+            for sale in sales:
+                tree.insert("", tk.END, values=(sale['id'], sale['timestamp'], 
+                                               sale['table'], sale['total']))
+            if sales:
+                paging["cursor"] = sales[-1]['cursor']
+            paging["done"] = len(sales) < HISTORY_PAGE_SIZE
+
+        def on_tree_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.9:
+                win.after_idle(load_next_page)
+
         scrollbar = ttk.Scrollbar(win, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscroll=scrollbar.set)
+        tree.configure(yscroll=on_tree_scroll)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         def refresh_tree(search_text=""):
-            for item in tree.get_children():
-                tree.delete(item)
+            tree.delete(*tree.get_children())
             
             # แปลงประเภทการค้นหา
             search_field_map = {opt[0]: opt[1] for opt in search_options}
             field = search_field_map.get(search_type.get(), "all")
             
-            # ค้นหาจากฐานข้อมูล
-            if search_text:
-                sales = self.db.search_sales(search_text, field)
-            else:
-                sales = self.db.get_all_sales()
+            # ตัวกรองช่วง (วันที่รูปแบบ YYYY-MM-DD, ยอดรวมเป็นตัวเลข)
+            filters = {key: entry.get().strip() or None for key, entry in range_entries.items()}
+            for key in ("min_total", "max_total"):
+                try:
+                    filters[key] = int(filters[key]) if filters[key] else None
+                except ValueError:
+                    filters[key] = None
             
-            for sale in sales:
-                tree.insert("", tk.END, values=(sale['id'], sale['timestamp'], 
-                                               sale['table'], sale['total']))
+            # ค้นหาจากฐานข้อมูล (เริ่มที่หน้าแรก)
+            paging.update(query=(search_text, field, filters), cursor=None, done=False)
+            load_next_page()
 
-        def on_search(*args):
+        refresh_tree = self.profiled("refresh_tree", refresh_tree)
+
+        # หน่วงการค้นหาขณะพิมพ์ ให้ค้นครั้งเดียวเมื่อหยุดพิมพ์
+        pending_search = {"job": None}
+
+        def run_search():
+            if pending_search["job"] is not None:
+                win.after_cancel(pending_search["job"])
+                pending_search["job"] = None
             refresh_tree(search_entry.get())
 
+        def on_search(*args):
+            if pending_search["job"] is not None:
+                win.after_cancel(pending_search["job"])
+            pending_search["job"] = win.after(SEARCH_DEBOUNCE_MS, run_search)
+
         search_entry.bind("<KeyRelease>", on_search)
-        search_combo.bind("<<ComboboxSelected>>", on_search)
+        search_combo.bind("<<ComboboxSelected>>", lambda e: run_search())
         
-        tk.Button(search_frame, text="ค้นหา", command=on_search, bg="#3498db", 
+        tk.Button(search_frame, text="ค้นหา", command=run_search, bg="#3498db", 
                  fg="white", font=self.thai_font_bold).pack(side=tk.LEFT, padx=5)
         
         def clear_search():
             search_entry.delete(0, tk.END)
+            for entry in range_entries.values():
+                entry.delete(0, tk.END)
             search_type.set("all")
             refresh_tree()
         
@@ -525,5 +955,7 @@ class ShabuPOS:
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = ShabuPOS(root)
+    app = ShabuPOS(root, lazy_orders="--lazy-orders" in sys.argv[1:],
+                   profile_ui="--profile" in sys.argv[1:],
+                   serve_orders="--serve" in sys.argv[1:])
     root.mainloop()
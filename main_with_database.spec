@@ -1,4 +1,10 @@
 # -*- mode: python ; coding: utf-8 -*-
+# โหมด onedir: แตกไฟล์ไว้ในโฟลเดอร์ครั้งเดียว เปิดโปรแกรมได้ทันทีโดยไม่ต้องแตกไฟล์ทุกครั้ง
+import sys
+
+# รายการ hidden import / exclude ใช้ชุดเดียวกับ build_exe_db.py
+sys.path.insert(0, SPECPATH)
+from build_exe_db import EXCLUDED_MODULES, HIDDEN_IMPORTS
 
 
 a = Analysis(
@@ -6,11 +12,11 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('shabu_pos.db', '.')],
-    hiddenimports=[],
+    hiddenimports=HIDDEN_IMPORTS,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDED_MODULES,
     noarchive=False,
     optimize=0,
 )
@@ -19,16 +25,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main_with_database',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +39,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main_with_database',
+)
@@ -0,0 +1,609 @@
+"""
+เซิร์ฟเวอร์ HTTP/JSON ภายในร้าน ให้แท็บเล็ตของพนักงานและจอครัวใช้ฐานข้อมูลเดียวกับเครื่องขาย
+(asyncio ล้วน ไม่ต้องติดตั้งเพิ่ม) อุปกรณ์ไม่ต้องเปิดไฟล์ SQLite เอง:
+คำสั่งเขียนทั้งหมดผ่าน DatabaseWorker ตัวเดียว (สั่งอาหารที่เข้ามาพร้อมกันรวม commit ครั้งเดียว)
+
+ใช้งาน:
+    python order_server.py --set-host 192.168.1.10  ตั้ง IP ของเครื่องขายในวง LAN ของร้าน (ครั้งเดียว)
+    python order_server.py                          ฟังที่ IP ที่ตั้งไว้ (ยังไม่ตั้ง = เฉพาะเครื่องนี้) พอร์ต 8080
+    python order_server.py --show-token             แสดง token ที่ต้องตั้งในแท็บเล็ต/จอครัว
+    python main_with_database.py --serve            เปิดเซิร์ฟเวอร์ในโปรแกรมขาย (หน้าจอเห็นออเดอร์จากแท็บเล็ต)
+
+ทุกคำขอต้องส่ง header X-Shabu-Token ตรงกับ token ของร้าน (สุ่มครั้งแรกแล้วเก็บใน sync_state)
+ยกเว้น /events รับ ?token= ได้ด้วย (EventSource ของเบราว์เซอร์ตั้ง header เองไม่ได้)
+ไม่ส่ง CORS header ยกเว้น origin ที่อนุญาตไว้ (--allow-origin) หน้าเว็บอื่นจึงสั่งอาหาร/ปิดบิลไม่ได้
+
+Endpoints (ชื่อโต๊ะใน URL เข้ารหัสแบบ percent-encoding):
+    GET    /menu                                {ชื่อเมนู: ราคา}
+    GET    /tables                              โต๊ะทั้งหมดพร้อมจำนวนรายการและยอด
+    POST   /tables                              {"name": "T9"}
+    GET    /tables/{โต๊ะ}/orders
+    POST   /tables/{โต๊ะ}/orders                {"name": "กุ้งสด", "quantity": 2} (ราคาตามเมนู)
+    DELETE /tables/{โต๊ะ}/orders/{id}           ลดรายการลง 1 หน่วย
+    POST   /tables/{โต๊ะ}/checkout
+    GET    /changes?since=CURSOR&timeout=25     long-poll เหตุการณ์หลัง CURSOR
+    GET    /events                              server-sent events (รองรับ Last-Event-ID)
+
+cursor ของ change feed มีรูปแบบ "<server id>:<seq>" server id สุ่มใหม่ทุกครั้งที่เปิดเซิร์ฟเวอร์
+cursor จากรอบก่อน (หรือไม่มี server id) ได้ reset เสมอ client ต้องโหลดโต๊ะ/ออเดอร์ใหม่
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from database import ShabuDatabase
+from db_worker import DatabaseWorker
+
+# จำนวนเหตุการณ์ล่าสุดที่เก็บไว้ให้ client ที่หลุดไปตามทัน
+EVENT_BACKLOG = 1000
+# long-poll รอนานสุด (วินาที) และช่วงส่ง ping ของ server-sent events
+LONG_POLL_TIMEOUT = 25
+SSE_PING_INTERVAL = 15
+# ปิดการเชื่อมต่อ keep-alive ที่ไม่มีคำขอใหม่ภายในเวลานี้ (วินาที)
+KEEPALIVE_TIMEOUT = 15
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+# สั่งเมนูเดียวกันได้สูงสุดต่อคำขอ
+MAX_QUANTITY = 50
+# ยังไม่ได้ตั้ง IP ในวง LAN ของร้าน (--set-host) จะฟังเฉพาะเครื่องนี้
+DEFAULT_HOST = "127.0.0.1"
+TOKEN_HEADER = "x-shabu-token"
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """ข้อผิดพลาดที่ตอบกลับ client เป็น {"error": ข้อความ} พร้อม status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ==================== HTTP ====================
+
+async def read_request(reader):
+    """อ่านคำขอหนึ่งรายการ คืนค่า (method, path, query, headers, body) หรือ None เมื่อ client ปิด"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HTTPError(400, "คำขอไม่ครบ")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "header ยาวเกินไป")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "request line ไม่ถูกต้อง")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+        headers["connection"] = "close"
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Content-Length ไม่ถูกต้อง")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "ข้อมูลใหญ่เกินไป")
+    body = await reader.readexactly(length) if length else b""
+
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers, body
+
+
+def cors_headers(origin):
+    """CORS header สำหรับ origin ที่อนุญาต (None = ไม่ส่ง เบราว์เซอร์จะไม่ให้หน้าเว็บอื่นเรียก)"""
+    if origin is None:
+        return ""
+    return (f"Access-Control-Allow-Origin: {origin}\r\n"
+            "Vary: Origin\r\n"
+            "Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS\r\n"
+            "Access-Control-Allow-Headers: Content-Type, Last-Event-ID, X-Shabu-Token\r\n")
+
+
+def encode_response(status, payload=None, keep_alive=True, origin=None):
+    body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"{cors_headers(origin)}"
+            "\r\n")
+    return head.encode("latin-1") + body
+
+
+def parse_json(body):
+    if not body:
+        return {}
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        raise HTTPError(400, "JSON ไม่ถูกต้อง")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "ต้องเป็น JSON object")
+    return data
+
+
+def query_number(query, name, default, cast=int):
+    try:
+        return cast(query.get(name, [default])[0])
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} ต้องเป็นตัวเลข")
+
+
+# ==================== Change Feed ====================
+
+class ChangeFeed:
+    """ลำดับเหตุการณ์การเปลี่ยนแปลงออเดอร์ (seq เพิ่มทีละ 1 นับใหม่เมื่อเปิดเซิร์ฟเวอร์)
+
+    client จำ cursor ล่าสุด ("<server_id>:<seq>") ไว้แล้วขอเฉพาะเหตุการณ์หลังจากนั้น
+    ถ้า cursor มาจากเซิร์ฟเวอร์รอบก่อนหรือเก่ากว่าที่เก็บไว้ (reset) ต้องโหลดโต๊ะ/ออเดอร์ใหม่ทั้งหมด
+    """
+
+    def __init__(self, backlog=EVENT_BACKLOG):
+        self.server_id = secrets.token_hex(4)
+        self.seq = 0
+        self.events = deque(maxlen=backlog)
+        self.changed = asyncio.Condition()
+        self.closed = False
+
+    async def publish(self, kind, **data):
+        self.seq += 1
+        event = dict(data, seq=self.seq, type=kind, time=time.strftime("%Y-%m-%d %H:%M:%S"))
+        self.events.append(event)
+        async with self.changed:
+            self.changed.notify_all()
+        return event
+
+    async def close(self):
+        """ปลุก client ที่รออยู่ทั้งหมดตอนปิดเซิร์ฟเวอร์"""
+        self.closed = True
+        async with self.changed:
+            self.changed.notify_all()
+
+    def cursor(self, seq=None):
+        return f"{self.server_id}:{self.seq if seq is None else seq}"
+
+    def parse(self, cursor):
+        """seq ใน cursor ของเซิร์ฟเวอร์รอบนี้ หรือ None (รอบก่อน/ไม่มี server id/รูปแบบผิด)"""
+        server_id, _, seq = str(cursor).partition(":")
+        if server_id != self.server_id or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        return int(seq)
+
+    def since(self, cursor):
+        """คืนค่า (เหตุการณ์หลัง cursor, reset)"""
+        seq = self.parse(cursor)
+        if seq is None:
+            return [], True
+        oldest = self.events[0]["seq"] if self.events else self.seq + 1
+        return [event for event in self.events if event["seq"] > seq], seq < oldest - 1
+
+    async def wait(self, cursor, timeout):
+        """รอจนมีเหตุการณ์หลัง cursor หรือครบ timeout วินาที"""
+        seq = self.parse(cursor)
+        if seq == self.seq and not self.closed:
+            try:
+                async with self.changed:
+                    await asyncio.wait_for(
+                        self.changed.wait_for(lambda: self.seq != seq or self.closed), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(cursor)
+
+
+# ==================== Server ====================
+
+class OrderServer:
+    """เซิร์ฟเวอร์ออเดอร์บน asyncio event loop เดียว
+
+    อ่านข้อมูลผ่านการเชื่อมต่อของ loop เอง (WAL อ่านได้โดยไม่รอผู้เขียน)
+    เขียนผ่าน DatabaseWorker แล้วรอผลด้วย future จึงไม่บล็อก loop
+    worker=None สร้าง worker ของตัวเอง ฝังในโปรแกรมขายให้ส่ง worker ของเครื่องขาย
+    (คำสั่งเขียนจากหน้าจอและแท็บเล็ตเข้าคิวเดียวกัน ผ่านการเชื่อมต่อเดียว)
+    listeners ถูกเรียกด้วยทุกเหตุการณ์บน thread ของ loop (ใช้ส่งต่อให้หน้าจอ Tk ผ่านคิว)
+    host=None / token=None ใช้ค่าที่ตั้งไว้ใน sync_state (token สุ่มให้ครั้งแรก)
+    """
+
+    def __init__(self, db_name="shabu_pos.db", host=None, port=8080, profile=None,
+                 token=None, allowed_origins=(), worker=None):
+        self.db_name = db_name
+        self.host = host
+        self.port = port
+        self.profile = profile
+        self.token = token
+        self.allowed_origins = set(allowed_origins)
+        self.listeners = []
+        self.db = None
+        self.worker = worker
+        # ปิด worker ตอนหยุดเฉพาะเมื่อสร้างเอง
+        self._owns_worker = worker is None
+        self.feed = None
+        self.loop = None
+        self.thread = None
+        self._server = None
+        self._stopped = None
+        # writer ของแต่ละการเชื่อมต่อ -> task ที่ดูแล (รอให้จบก่อนปิดฐานข้อมูล)
+        self._connections = {}
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.db = ShabuDatabase(self.db_name, profile=self.profile)
+        if not self.db.get_all_menu_items():
+            self.db.initialize_default_data()
+        self.host = self.host or self.db.get_sync_value("order_server_host", DEFAULT_HOST)
+        self.token = self.token or shop_token(self.db)
+        if self._owns_worker:
+            self.worker = DatabaseWorker(self.db_name, profile=self.profile)
+        self.feed = ChangeFeed()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"✓ เซิร์ฟเวอร์ออเดอร์พร้อมที่ http://{self.host}:{self.port} "
+              f"(ดู token ด้วย python order_server.py --show-token)")
+
+    async def run(self):
+        """เปิดเซิร์ฟเวอร์และรอจนกว่าจะสั่งหยุด"""
+        await self.start()
+        try:
+            await self._stopped.wait()
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        self._server.close()
+        await self.feed.close()
+        for writer in list(self._connections):
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections.values()), timeout=5)
+        await self._server.wait_closed()
+        if self._owns_worker:
+            self.worker.stop()
+        # ปิดและปล่อยการเชื่อมต่อบน thread ของ loop (sqlite3 ห้ามปิดข้าม thread)
+        self.db.close()
+        self.db = None
+
+    def stop(self):
+        """สั่งหยุด (เรียกจาก thread ใดก็ได้)"""
+        if self.loop is not None and self._stopped is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self.thread is not None:
+            self.thread.join(10)
+
+    def start_background(self):
+        """เปิดเซิร์ฟเวอร์บน thread แยก (ใช้ฝังในโปรแกรมขาย) รอจนพร้อมรับคำขอ"""
+        ready = threading.Event()
+
+        async def run():
+            await self.start()
+            ready.set()
+            try:
+                await self._stopped.wait()
+            finally:
+                await self._shutdown()
+
+        def target():
+            try:
+                asyncio.run(run())
+            finally:
+                ready.set()
+
+        self.thread = threading.Thread(target=target, name="ShabuOrderServer", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self._server is not None
+
+    def notify(self, kind, **data):
+        """ประกาศการเปลี่ยนแปลงที่เกิดนอกเซิร์ฟเวอร์ (เช่น กดจากหน้าจอขาย) เรียกจาก thread ใดก็ได้"""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(
+                lambda: self.loop.create_task(self.feed.publish(kind, **data)))
+
+    # ==================== Worker Bridge ====================
+
+    def call(self, method, *args):
+        """ส่งคำสั่งเขียนให้ DatabaseWorker แล้วคืน future ของผลลัพธ์"""
+        future = self.loop.create_future()
+
+        def resolve(result):
+            if not future.done():
+                future.set_result(result)
+
+        self.worker.submit(method, *args,
+                           callback=lambda result: self.loop.call_soon_threadsafe(resolve, result),
+                           threadsafe=True)
+        return future
+
+    async def publish(self, kind, **data):
+        event = await self.feed.publish(kind, **data)
+        for listener in self.listeners:
+            listener(event)
+
+    # ==================== Connection ====================
+
+    async def _handle(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEPALIVE_TIMEOUT)
+                except HTTPError as e:
+                    writer.write(encode_response(e.status, {"error": str(e)}, keep_alive=False))
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                origin = headers.get("origin")
+                origin = origin if origin in self.allowed_origins else None
+
+                if method == "GET" and path == "/events":
+                    try:
+                        self._authorize(method, path, query, headers)
+                        await self._stream_events(writer, query, headers, origin)
+                    except HTTPError as e:
+                        writer.write(encode_response(e.status, {"error": str(e)},
+                                                     keep_alive=False, origin=origin))
+                    break
+
+                try:
+                    self._authorize(method, path, query, headers)
+                    status, payload = await self._dispatch(method, path, query, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    print(f"✗ เกิดข้อผิดพลาด ({method} {path}): {e}")
+                    status, payload = 500, {"error": "เกิดข้อผิดพลาดในเซิร์ฟเวอร์"}
+                writer.write(encode_response(status, payload, keep_alive, origin))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def _authorize(self, method, path, query, headers):
+        """ตรวจ token ของร้าน (preflight OPTIONS ของเบราว์เซอร์ไม่มี header จึงไม่ต้องตรวจ)"""
+        if method == "OPTIONS":
+            return
+        token = headers.get(TOKEN_HEADER)
+        if token is None and path == "/events":
+            token = query.get("token", [None])[0]
+        if not token or not hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8")):
+            raise HTTPError(401, "token ไม่ถูกต้อง")
+
+    async def _stream_events(self, writer, query, headers, origin=None):
+        """server-sent events: ส่งเหตุการณ์ทันทีที่เกิด และ ping เป็นระยะให้รู้ว่ายังเชื่อมต่ออยู่"""
+        # เชื่อมต่อใหม่หลังหลุด เบราว์เซอร์ส่ง Last-Event-ID มาเอง
+        if "last-event-id" in headers:
+            query = {"since": [headers["last-event-id"]]}
+        cursor = query.get("since", [self.feed.cursor()])[0]
+        writer.write(("HTTP/1.1 200 OK\r\n"
+                      "Content-Type: text/event-stream; charset=utf-8\r\n"
+                      "Cache-Control: no-cache\r\n"
+                      "Connection: keep-alive\r\n"
+                      f"{cors_headers(origin)}\r\n").encode("latin-1"))
+        try:
+            while True:
+                events, reset = await self.feed.wait(cursor, SSE_PING_INTERVAL)
+                if self.feed.closed:
+                    break
+                if reset:
+                    cursor = self.feed.cursor()
+                    writer.write(f"id: {cursor}\nevent: reset\ndata: {{}}\n\n".encode())
+                elif not events:
+                    writer.write(b": ping\n\n")
+                for event in events:
+                    cursor = self.feed.cursor(event["seq"])
+                    data = json.dumps(event, ensure_ascii=False)
+                    writer.write(f"id: {cursor}\nevent: {event['type']}\n"
+                                 f"data: {data}\n\n".encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    # ==================== Routes ====================
+
+    async def _dispatch(self, method, path, query, body):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if method == "OPTIONS":
+            return 204, None
+
+        if parts == ["menu"]:
+            self._allow(method, "GET")
+            return 200, self.db.get_all_menu_items()
+
+        if parts == ["tables"]:
+            self._allow(method, "GET", "POST")
+            if method == "GET":
+                return 200, self._list_tables()
+            return await self._add_table(parse_json(body))
+
+        if len(parts) == 3 and parts[0] == "tables" and parts[2] == "orders":
+            self._allow(method, "GET", "POST")
+            table_name = self._require_table(parts[1])
+            if method == "GET":
+                orders = self.db.get_table_orders(table_name)
+                return 200, {"table": table_name, "orders": orders, "total": bill_total(orders)}
+            return await self._add_order(table_name, parse_json(body))
+
+        if len(parts) == 4 and parts[0] == "tables" and parts[2] == "orders":
+            self._allow(method, "DELETE")
+            return await self._remove_order(self._require_table(parts[1]), parts[3])
+
+        if len(parts) == 3 and parts[0] == "tables" and parts[2] == "checkout":
+            self._allow(method, "POST")
+            return await self._checkout(self._require_table(parts[1]))
+
+        if parts == ["changes"]:
+            self._allow(method, "GET")
+            # ไม่ระบุ since = ตั้งแต่เปิดเซิร์ฟเวอร์รอบนี้
+            since = query.get("since", [self.feed.cursor(0)])[0]
+            timeout = min(query_number(query, "timeout", LONG_POLL_TIMEOUT, float),
+                          LONG_POLL_TIMEOUT)
+            events, reset = await self.feed.wait(since, max(0.0, timeout))
+            return 200, {"cursor": self.feed.cursor(), "seq": self.feed.seq, "events": events,
+                         "reset": reset}
+
+        raise HTTPError(404, "ไม่พบ endpoint")
+
+    def _allow(self, method, *methods):
+        if method not in methods:
+            raise HTTPError(405, f"ใช้ได้เฉพาะ {', '.join(methods)}")
+
+    def _require_table(self, table_name):
+        if not self.db.get_table_id(table_name):
+            raise HTTPError(404, f"ไม่พบโต๊ะ {table_name}")
+        return table_name
+
+    def _list_tables(self):
+        return [{"name": table_name, "items": sum(item["quantity"] for item in orders),
+                 "total": bill_total(orders)}
+                for table_name, orders in self.db.load_open_orders().items()]
+
+    async def _add_table(self, data):
+        table_name = str(data.get("name") or "").strip()
+        if not table_name:
+            raise HTTPError(400, "ต้องระบุ name")
+        if not await self.call("add_table", table_name):
+            raise HTTPError(409, f"มีโต๊ะ {table_name} อยู่แล้ว")
+        await self.publish("table_added", table=table_name)
+        return 201, {"name": table_name}
+
+    async def _add_order(self, table_name, data):
+        menu_name = data.get("name")
+        price = self.db.get_all_menu_items().get(menu_name)
+        if price is None:
+            raise HTTPError(404, f"ไม่พบเมนู {menu_name}")
+        quantity = data.get("quantity", 1)
+        if not isinstance(quantity, int) or not 1 <= quantity <= MAX_QUANTITY:
+            raise HTTPError(400, f"quantity ต้องเป็นจำนวนเต็ม 1-{MAX_QUANTITY}")
+
+        # ทุกหน่วยในคำสั่งเดียว: เพิ่มครบทั้งหมดหรือไม่เพิ่มเลย
+        row = await self.call("add_order_item", table_name, menu_name, price, quantity)
+        if not row:
+            raise HTTPError(409, "บันทึกออเดอร์ไม่สำเร็จ")
+        await self.publish("order_added", table=table_name, order=row)
+        return 201, {"table": table_name, "order": row, "added": quantity}
+
+    async def _remove_order(self, table_name, order_id):
+        try:
+            order_id = int(order_id)
+        except ValueError:
+            raise HTTPError(400, "id ต้องเป็นตัวเลข")
+        if not any(item["id"] == order_id for item in self.db.get_table_orders(table_name)):
+            raise HTTPError(404, f"ไม่พบรายการ {order_id} ในโต๊ะ {table_name}")
+        row = await self.call("delete_order_item", order_id)
+        if not row:
+            raise HTTPError(404, f"ไม่พบรายการ {order_id}")
+        await self.publish("order_removed", table=table_name, order=row)
+        return 200, {"table": table_name, "order": row}
+
+    async def _checkout(self, table_name):
+        receipt = await self.call("checkout_table", table_name)
+        if not receipt:
+            raise HTTPError(409, f"โต๊ะ {table_name} ไม่มีรายการ")
+        await self.publish("checkout", table=table_name, bill_id=receipt["id"],
+                           total=receipt["total"])
+        return 200, receipt
+
+
+def bill_total(orders):
+    return sum(item["price"] * item["quantity"] for item in orders)
+
+
+def shop_token(db, renew=False):
+    """token ที่แท็บเล็ต/จอครัวต้องส่งมา เก็บใน sync_state (สุ่มใหม่เมื่อยังไม่มีหรือสั่ง renew)"""
+    token = None if renew else db.get_sync_value("order_server_token")
+    if not token:
+        token = secrets.token_urlsafe(16)
+        db.set_sync_value("order_server_token", token)
+    return token
+
+
+class EventQueue:
+    """ส่งเหตุการณ์จาก thread ของเซิร์ฟเวอร์ไปยัง Tk main thread (ตรวจคิวด้วย root.after)"""
+
+    def __init__(self, root, handler, poll_interval=100):
+        self.root = root
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.events = queue.Queue()
+        self.root.after(self.poll_interval, self._drain)
+
+    def __call__(self, event):
+        self.events.put(event)
+
+    def _drain(self):
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            self.handler(event)
+        self.root.after(self.poll_interval, self._drain)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="เซิร์ฟเวอร์ HTTP/JSON สำหรับแท็บเล็ตและจอครัว")
+    parser.add_argument("--db", default="shabu_pos.db", help="ไฟล์ฐานข้อมูลของร้าน")
+    parser.add_argument("--host", help="IP ที่ฟัง (ไม่ระบุ = ค่าที่ตั้งด้วย --set-host)")
+    parser.add_argument("--set-host", metavar="IP",
+                        help="บันทึก IP ของเครื่องนี้ในวง LAN ของร้านเป็นค่าเริ่มต้น แล้วออก")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--allow-origin", action="append", default=[], metavar="ORIGIN",
+                        help="origin ของหน้าเว็บที่อนุญาตให้เรียกผ่านเบราว์เซอร์ (ระบุซ้ำได้)")
+    parser.add_argument("--show-token", action="store_true", help="แสดง token ของร้านแล้วออก")
+    parser.add_argument("--new-token", action="store_true",
+                        help="สุ่ม token ใหม่ (อุปกรณ์เดิมต้องตั้งค่าใหม่) แล้วออก")
+    args = parser.parse_args(argv)
+
+    if args.show_token or args.new_token or args.set_host:
+        db = ShabuDatabase(args.db)
+        try:
+            if args.set_host:
+                db.set_sync_value("order_server_host", args.set_host)
+                print(f"✓ ตั้งค่า IP ของเซิร์ฟเวอร์ออเดอร์เป็น {args.set_host}")
+            else:
+                print(f"token: {shop_token(db, renew=args.new_token)}")
+        finally:
+            db.close()
+        return 0
+
+    server = OrderServer(args.db, args.host, args.port, allowed_origins=args.allow_origin)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("\n✓ ปิดเซิร์ฟเวอร์ออเดอร์")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+วัดความเร็วของเซิร์ฟเวอร์ออเดอร์ (order_server.py) ด้วย client จำลองหลายตัวพร้อมกัน
+แต่ละ client คือแท็บเล็ตหนึ่งเครื่อง: ดูบิล สั่งอาหาร ลดรายการ และชำระเงิน ผ่าน keep-alive
+พร้อมจอครัวที่ฟัง /events เพื่อวัดว่าเหตุการณ์ไปถึงครบ
+
+ใช้งาน:
+    python order_server_bench.py                         เปิดเซิร์ฟเวอร์บนฐานข้อมูลจำลอง แล้ววัด 10 วินาที
+    python order_server_bench.py --clients 64 --duration 30
+    python order_server_bench.py --url 127.0.0.1:8080    วัดเซิร์ฟเวอร์ที่เปิดอยู่แล้ว (ไม่ควรเป็นของร้าน)
+    python order_server_bench.py --output server.json    บันทึกผลเป็น JSON
+
+รายงานจำนวนคำขอต่อวินาที และ p50/p99 ของแต่ละชนิดคำขอ
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from load_simulator import prepare_database
+from query_stats import percentile
+
+DEFAULT_SCENARIO = {
+    "clients": 32,
+    "listeners": 2,
+    "tables": 40,
+    "duration": 10.0,
+}
+
+# สัดส่วนคำขอของแท็บเล็ต
+REQUEST_WEIGHTS = {
+    "get_orders": 45,
+    "add_order": 35,
+    "get_tables": 8,
+    "remove_order": 6,
+    "checkout": 6,
+}
+
+
+class Client:
+    """client HTTP/1.1 แบบ keep-alive หนึ่งการเชื่อมต่อ"""
+
+    def __init__(self, host, port, token):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.writer.write((f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                           f"X-Shabu-Token: {self.token}\r\n"
+                           "Content-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(data.decode("utf-8")) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_client(client_id, host, port, token, tables, menu, deadline, results):
+    rng = random.Random(client_id)
+    client = Client(host, port, token)
+    actions = list(REQUEST_WEIGHTS)
+    weights = list(REQUEST_WEIGHTS.values())
+    try:
+        while time.perf_counter() < deadline:
+            action = rng.choices(actions, weights)[0]
+            table_path = f"/tables/{quote(rng.choice(tables))}"
+            started = time.perf_counter()
+            if action == "get_orders":
+                status, _ = await client.request("GET", table_path + "/orders")
+            elif action == "add_order":
+                status, _ = await client.request("POST", table_path + "/orders",
+                                                 {"name": rng.choice(menu),
+                                                  "quantity": rng.choice((1, 1, 1, 2, 3))})
+            elif action == "get_tables":
+                status, _ = await client.request("GET", "/tables")
+            elif action == "remove_order":
+                status, data = await client.request("GET", table_path + "/orders")
+                if status == 200 and data["orders"]:
+                    order_id = rng.choice(data["orders"])["id"]
+                    status, _ = await client.request("DELETE", f"{table_path}/orders/{order_id}")
+            else:
+                status, _ = await client.request("POST", table_path + "/checkout")
+            results["latencies"][action].append(time.perf_counter() - started)
+            results["status"][status] = results["status"].get(status, 0) + 1
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        results["errors"].append(f"client {client_id}: {e}")
+    finally:
+        client.close()
+
+
+async def run_listener(host, port, token, deadline, results):
+    """จอครัว: นับเหตุการณ์ที่ได้รับทาง server-sent events"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /events HTTP/1.1\r\nHost: {host}\r\nX-Shabu-Token: {token}\r\n\r\n"
+                 .encode("latin-1"))
+    await writer.drain()
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                line = await asyncio.wait_for(reader.readline(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not line:
+                break
+            if line.startswith(b"event: "):
+                results["events"] += 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, token, scenario):
+    probe = Client(host, port, token)
+    _, menu = await probe.request("GET", "/menu")
+    _, tables = await probe.request("GET", "/tables")
+    _, changes = await probe.request("GET", "/changes?timeout=0")
+    probe.close()
+    table_names = [table["name"] for table in tables][:scenario["tables"]]
+    menu_names = list(menu)
+
+    results = {"latencies": {action: [] for action in REQUEST_WEIGHTS}, "status": {},
+               "errors": [], "events": 0}
+    began = time.perf_counter()
+    deadline = began + scenario["duration"]
+    # จอครัวเชื่อมต่อก่อน จะได้รับเหตุการณ์ตั้งแต่คำขอแรก
+    listeners = [asyncio.create_task(run_listener(host, port, token, deadline + 0.5, results))
+                 for _ in range(scenario["listeners"])]
+    await asyncio.sleep(0.1)
+    await asyncio.gather(*[run_client(client_id, host, port, token, table_names, menu_names,
+                                      deadline, results)
+                           for client_id in range(scenario["clients"])])
+    elapsed = time.perf_counter() - began
+    await asyncio.gather(*listeners)
+
+    # การเชื่อมต่อแรกอาจหมด keep-alive ระหว่างวัดแล้ว
+    probe = Client(host, port, token)
+    _, after = await probe.request("GET", f"/changes?since={quote(changes['cursor'])}&timeout=0")
+    probe.close()
+    results["published"] = after["seq"] - changes["seq"]
+    return results, elapsed
+
+
+def summarize(results, elapsed, listeners):
+    actions = {}
+    requests = 0
+    for action, values in results["latencies"].items():
+        values.sort()
+        requests += len(values)
+        actions[action] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+    return {
+        "duration": round(elapsed, 3),
+        "requests": requests,
+        "requests_per_sec": round(requests / elapsed, 1) if elapsed else 0.0,
+        "status": {str(status): count for status, count in sorted(results["status"].items())},
+        "server_errors": sum(count for status, count in results["status"].items()
+                             if status >= 500),
+        "events_published": results["published"],
+        "events_per_listener": results["events"] // listeners if listeners else 0,
+        "errors": results["errors"][:20],
+        "actions": actions,
+    }
+
+
+def print_summary(summary, scenario):
+    print("\n" + "=" * 60)
+    print(f"เซิร์ฟเวอร์ออเดอร์: {scenario['clients']} client {summary['duration']:.0f} วินาที")
+    print("=" * 60)
+    print(f"คำขอทั้งหมด:  {summary['requests']:>8} ({summary['requests_per_sec']} คำขอ/วินาที)")
+    print(f"status:       {summary['status']}")
+    print(f"เหตุการณ์ที่จอครัวได้รับ: {summary['events_per_listener']} ต่อจอ "
+          f"(จาก {summary['events_published']})")
+    for error in summary["errors"]:
+        print(f"✗ {error}")
+    print(f"\n{'คำขอ':<14} {'ครั้ง':>7} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10}")
+    for action, stats in summary["actions"].items():
+        print(f"{action:<14} {stats['count']:>7} {stats['p50_ms']:>10.2f} "
+              f"{stats['p99_ms']:>10.2f} {stats['max_ms']:>10.2f}")
+
+
+def serve(db_path, port):
+    """เปิดเซิร์ฟเวอร์ใน process แยก (ไม่แย่ง GIL กับตัววัด)"""
+    from order_server import OrderServer
+    asyncio.run(OrderServer(db_path, "127.0.0.1", port).run())
+
+
+def read_token(db_path):
+    """token ที่เซิร์ฟเวอร์บนไฟล์จำลองจะใช้ (สุ่มเก็บไว้ในไฟล์ถ้ายังไม่มี)"""
+    from database import ShabuDatabase
+    from order_server import shop_token
+    db = ShabuDatabase(db_path)
+    try:
+        return shop_token(db)
+    finally:
+        db.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="วัดความเร็วของเซิร์ฟเวอร์ออเดอร์")
+    parser.add_argument("--clients", type=int, default=DEFAULT_SCENARIO["clients"],
+                        help="จำนวนแท็บเล็ตจำลอง (การเชื่อมต่อพร้อมกัน)")
+    parser.add_argument("--listeners", type=int, default=DEFAULT_SCENARIO["listeners"],
+                        help="จำนวนจอครัวที่ฟัง /events")
+    parser.add_argument("--tables", type=int, default=DEFAULT_SCENARIO["tables"])
+    parser.add_argument("--duration", type=float, default=DEFAULT_SCENARIO["duration"],
+                        help="ระยะเวลาวัด (วินาที)")
+    parser.add_argument("--url", help="host:port ของเซิร์ฟเวอร์ที่เปิดอยู่ (ไม่ระบุ = เปิดเองบนไฟล์จำลอง)")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "shabu_server.db"),
+                        help="ไฟล์ฐานข้อมูลจำลองเมื่อเปิดเซิร์ฟเวอร์เอง")
+    parser.add_argument("--token", help="token ของร้าน (ต้องระบุเมื่อใช้ --url)")
+    parser.add_argument("--output", help="บันทึกผลเป็นไฟล์ JSON")
+    args = parser.parse_args(argv)
+    scenario = {key: getattr(args, key) for key in DEFAULT_SCENARIO}
+
+    process = None
+    if args.url:
+        host, _, port = args.url.rpartition(":")
+        port = int(port)
+        token = args.token
+    else:
+        host, port = "127.0.0.1", free_port()
+        prepare_database(args.db, args.tables)
+        token = args.token or read_token(args.db)
+        process = multiprocessing.Process(target=serve, args=(args.db, port), daemon=True)
+        process.start()
+    try:
+        if not wait_for_port(host, port):
+            print(f"✗ เชื่อมต่อเซิร์ฟเวอร์ {host}:{port} ไม่ได้")
+            return 1
+        results, elapsed = asyncio.run(run_load(host, port, token, scenario))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join()
+
+    summary = summarize(results, elapsed, args.listeners)
+    print_summary(summary, scenario)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ บันทึกผลที่ {args.output}")
+    return 0 if summary["server_errors"] == 0 and not summary["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
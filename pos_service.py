@@ -0,0 +1,178 @@
+"""
+ตรรกะหน้าขายของร้าน (โต๊ะ ออเดอร์ ชำระเงิน) ที่ไม่ขึ้นกับ Tk
+ใช้ร่วมกันระหว่างหน้าจอ ShabuPOS และตัวจำลองโหลด (load_simulator.py)
+
+ใช้งาน:
+    service = POSService("shabu_pos.db")
+    service.load_tables()
+    service.add_item("T1", "กุ้งสด", 89, callback=lambda row, index: ...)
+    service.checkout("T1", callback=lambda receipt: ...)
+"""
+
+from database import ShabuDatabase
+from db_worker import DatabaseWorker
+
+
+class POSService:
+    """สถานะโต๊ะและออเดอร์ของเครื่องขายหนึ่งเครื่อง
+
+    tables คือ {ชื่อโต๊ะ: [แถวออเดอร์]} ที่ตรงกับฐานข้อมูล (แก้ใน dict เดิมเสมอ)
+    งานที่กดบ่อย (เพิ่ม/ลดรายการ, ชำระเงิน) ส่งผ่าน DatabaseWorker
+    แล้วปรับ tables ก่อนเรียก callback ของผู้เรียก
+    ถ้าระบุ root callback จะถูกเรียกบน Tk main thread ไม่เช่นนั้นเรียกบน thread ของ worker
+    """
+
+    def __init__(self, db_name="shabu_pos.db", root=None, profile=None):
+        self.db = ShabuDatabase(db_name, profile=profile)
+
+        # ตรวจสอบและสร้างข้อมูลเริ่มต้น
+        if not self.db.get_all_menu_items():
+            self.db.initialize_default_data()
+
+        # thread เขียนฐานข้อมูลเบื้องหลัง สำหรับปุ่มที่กดบ่อย
+        self.worker = DatabaseWorker(self.db.db_name, root=root, profile=profile)
+
+        self.menu_items = self.db.get_all_menu_items()
+        self.tables = {}
+
+    def close(self):
+        """รอคำสั่งที่ค้างในคิวให้เสร็จ แล้วปิดการเชื่อมต่อ"""
+        self.worker.stop()
+        self.db.close()
+
+    # ==================== Menu ====================
+
+    def reload_menu(self):
+        self.menu_items = self.db.get_all_menu_items()
+        return self.menu_items
+
+    # ==================== Tables ====================
+
+    def load_tables(self, lazy=False, callback=None):
+        """โหลดโต๊ะพร้อมออเดอร์ที่ยังไม่ได้ชำระ
+
+        lazy=True โหลดเฉพาะโต๊ะแรกก่อน ที่เหลือโหลดเบื้องหลังผ่าน worker
+        แล้วเรียก callback() เมื่อโหลดครบ
+        """
+        self.tables.clear()
+        if not lazy:
+            self.tables.update(self.db.load_open_orders())
+            return self.tables
+
+        self.tables.update((table, []) for table in self.db.get_all_tables())
+        if self.tables:
+            first_table = next(iter(self.tables))
+            self.tables.update(self.db.load_open_orders([first_table]))
+
+            def on_loaded(tables):
+                for table_name, orders in (tables or {}).items():
+                    if table_name in self.tables:
+                        self.tables[table_name] = orders
+                if callback:
+                    callback()
+
+            self.worker.submit("load_open_orders", callback=on_loaded)
+        return self.tables
+
+    def is_occupied(self, table_name):
+        return bool(self.tables.get(table_name))
+
+    def add_table(self, table_name):
+        if self.db.add_table(table_name):
+            self.tables[table_name] = []
+            return True
+        return False
+
+    def rename_table(self, old_name, new_name):
+        if self.db.rename_table(old_name, new_name):
+            self.tables[new_name] = self.tables.pop(old_name, [])
+            return True
+        return False
+
+    def delete_table(self, table_name):
+        """ลบโต๊ะที่ว่าง คืนค่า False ถ้ายังมีลูกค้าหรือลบไม่สำเร็จ"""
+        if self.is_occupied(table_name):
+            return False
+        if self.db.delete_table(table_name):
+            self.tables.pop(table_name, None)
+            return True
+        return False
+
+    # ==================== Orders ====================
+
+    def bill_total(self, table_name):
+        return sum(item['price'] * item.get('quantity', 1)
+                   for item in self.tables.get(table_name, []))
+
+    def add_item(self, table_name, name, price, callback=None):
+        """สั่งอาหาร 1 หน่วย
+
+        callback(row, index) เมื่อบันทึกแล้ว index คือตำแหน่งแถวในบิล
+        row เป็น None ถ้าไม่สำเร็จ
+        """
+        def on_done(row):
+            index = self.apply_order_added(table_name, row) if row else None
+            if callback:
+                callback(row or None, index)
+
+        self.worker.submit("add_order_item", table_name, name, price, callback=on_done)
+
+    def remove_item(self, table_name, index, callback=None):
+        """ลดรายการที่ตำแหน่ง index ของบิลลง 1 หน่วย
+
+        callback(row, index) เมื่อบันทึกแล้ว โดย row['quantity'] คือจำนวนที่เหลือ
+        คืนค่า False ถ้าไม่มีแถวนั้นในบิล
+        """
+        orders = self.tables.get(table_name) or []
+        if not 0 <= index < len(orders):
+            return False
+
+        def on_done(row):
+            removed_index = self.apply_order_removed(table_name, row) if row else None
+            if callback:
+                callback(row or None, removed_index)
+
+        self.worker.submit("delete_order_item", orders[index]['id'], callback=on_done)
+        return True
+
+    def apply_order_added(self, table_name, row):
+        """ใส่แถวที่เพิ่มลงบิลของโต๊ะ คืนค่าตำแหน่งในบิล (None ถ้าไม่มีโต๊ะนี้แล้ว)"""
+        orders = self.tables.get(table_name)
+        if orders is None:
+            return None
+        index = next((i for i, item in enumerate(orders) if item['id'] == row['id']), None)
+        if index is None:
+            index = len(orders)
+            orders.append(row)
+        else:
+            orders[index] = row
+        return index
+
+    def apply_order_removed(self, table_name, row):
+        """ลดจำนวนในแถวเดียวของบิล (ลบแถวเมื่อเหลือ 0) คืนค่าตำแหน่งเดิมในบิล"""
+        orders = self.tables.get(table_name)
+        if not orders:
+            return None
+        index = next((i for i, item in enumerate(orders) if item['id'] == row['id']), None)
+        if index is None:
+            return None
+        if row['quantity'] > 0:
+            orders[index] = row
+        else:
+            del orders[index]
+        return index
+
+    # ==================== Checkout ====================
+
+    def checkout(self, table_name, callback=None):
+        """บันทึกการขายและล้างออเดอร์ของโต๊ะใน transaction เดียว
+
+        callback(receipt) เมื่อเสร็จ receipt เป็น None ถ้าโต๊ะไม่มีรายการหรือไม่สำเร็จ
+        """
+        def on_done(receipt):
+            if receipt and table_name in self.tables:
+                self.tables[table_name] = []
+            if callback:
+                callback(receipt)
+
+        self.worker.submit("checkout_table", table_name, callback=on_done)
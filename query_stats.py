@@ -0,0 +1,239 @@
+"""
+จับเวลาคำสั่ง SQL และเมธอดของ ShabuDatabase
+บันทึกคำสั่งที่ช้ากว่าเกณฑ์ลง slow-query log (หมุนไฟล์อัตโนมัติ) พร้อม EXPLAIN QUERY PLAN
+
+ใช้งาน:
+    stats = QueryStats(threshold_ms=50, log_path="shabu_slow_queries.log")
+    cursor = TimedCursor(conn.cursor(), stats, conn)
+    stats.snapshot()
+"""
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+# คำสั่งที่ขอ EXPLAIN QUERY PLAN ได้
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+_log_handlers = {}
+_log_lock = threading.Lock()
+
+
+def get_slow_query_logger(log_path, max_bytes=1024 * 1024, backups=3):
+    """logger ของ slow-query log หนึ่งตัวต่อไฟล์ (ใช้ร่วมกันทุกการเชื่อมต่อใน process)"""
+    path = os.path.abspath(log_path)
+    with _log_lock:
+        logger = logging.getLogger(f"shabu_pos.slow_queries.{path}")
+        if path not in _log_handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                          encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            _log_handlers[path] = handler
+        return logger
+
+
+def normalize_sql(sql):
+    return " ".join(sql.split())
+
+
+def percentile(sorted_values, fraction):
+    """ค่า percentile แบบ nearest-rank จาก list ที่เรียงแล้ว"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class QueryStats:
+    """สถิติเวลาของคำสั่ง SQL (แยกตามข้อความคำสั่ง) และของเมธอด
+
+    ค่าที่เก็บต่อรายการคือ [จำนวนครั้ง, เวลารวม, เวลาสูงสุด, จำนวนครั้งที่ผิดพลาด] หน่วยวินาที
+    """
+
+    def __init__(self, threshold_ms=50, log_path=None, max_bytes=1024 * 1024, backups=3):
+        self.threshold = threshold_ms / 1000 if threshold_ms is not None else None
+        self.log_path = log_path
+        self.logger = get_slow_query_logger(log_path, max_bytes, backups) if log_path else None
+        self.lock = threading.Lock()
+        self._normalized = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.statements = {}
+            self.methods = {}
+            self.slow_count = 0
+            self.started_at = time.time()
+            # เวลารวมของทุกคำสั่ง (ใช้แยกเวลาฐานข้อมูลออกจากเวลาวาดหน้าจอ)
+            self.total_time = 0.0
+
+    def _add(self, table, key, elapsed, error):
+        with self.lock:
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            if error:
+                entry[3] += 1
+
+    def record_statement(self, sql, elapsed, error=False):
+        """บันทึกเวลาคำสั่ง คืนค่า True ถ้าช้ากว่าเกณฑ์"""
+        key = self._normalized.get(sql)
+        if key is None:
+            key = self._normalized[sql] = normalize_sql(sql)
+        self._add(self.statements, key, elapsed, error)
+        self.total_time += elapsed
+        return self.threshold is not None and elapsed >= self.threshold
+
+    def record_method(self, name, elapsed, error=False):
+        self._add(self.methods, name, elapsed, error)
+
+    def log_slow(self, sql, params, elapsed, plan):
+        with self.lock:
+            self.slow_count += 1
+        if self.logger is None:
+            return
+        lines = [f"{elapsed * 1000:.1f} ms | {normalize_sql(sql)} | params={params!r}"]
+        lines.extend(f"    {step}" for step in plan)
+        self.logger.info("\n".join(lines))
+
+    def snapshot(self, top=None):
+        """สถิติ ณ ขณะนี้ เรียงตามเวลารวมจากมากไปน้อย (เวลาเป็นมิลลิวินาที)"""
+        def rows(table, field):
+            result = [{
+                field: key,
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "max_ms": round(maximum * 1000, 3),
+                "errors": errors,
+            } for key, (count, total, maximum, errors) in table.items()]
+            result.sort(key=lambda row: row["total_ms"], reverse=True)
+            return result[:top] if top else result
+
+        with self.lock:
+            statements = {key: list(value) for key, value in self.statements.items()}
+            methods = {key: list(value) for key, value in self.methods.items()}
+            slow_count = self.slow_count
+            started_at = self.started_at
+        return {
+            "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)),
+            "threshold_ms": self.threshold * 1000 if self.threshold is not None else None,
+            "slow_queries": slow_count,
+            "slow_log": self.log_path,
+            "statements": rows(statements, "sql"),
+            "methods": rows(methods, "method"),
+        }
+
+
+class TimedCursor:
+    """ห่อ sqlite3.Cursor เพื่อจับเวลา execute/executemany รวมเวลาที่ fetch ผลลัพธ์
+
+    เวลาของคำสั่งนับจาก execute จนถึงก่อนคำสั่งถัดไป (หรือเมื่อเรียก flush)
+    attribute อื่น เช่น lastrowid, rowcount ส่งต่อไปยัง cursor จริง
+    """
+
+    def __init__(self, cursor, stats, conn):
+        self._cursor = cursor
+        self._stats = stats
+        self._conn = conn
+        self._pending = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _run(self, method, sql, args, params):
+        self.flush()
+        started = time.perf_counter()
+        try:
+            method(sql, args)
+        except Exception:
+            self._stats.record_statement(sql, time.perf_counter() - started, error=True)
+            raise
+        self._pending = [sql, params, time.perf_counter() - started]
+        return self
+
+    def execute(self, sql, params=()):
+        return self._run(self._cursor.execute, sql, params, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, seq_of_params, None)
+
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[2] += time.perf_counter() - started
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(self._cursor.fetchmany)
+        return self._timed_fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def flush(self):
+        """บันทึกคำสั่งล่าสุดลงสถิติ (และ slow-query log ถ้าช้ากว่าเกณฑ์)"""
+        if self._pending is None:
+            return
+        sql, params, elapsed = self._pending
+        self._pending = None
+        if self._stats.record_statement(sql, elapsed):
+            self._stats.log_slow(sql, params, elapsed, self._explain(sql, params))
+
+    def _explain(self, sql, params):
+        """EXPLAIN QUERY PLAN ของคำสั่งที่ช้า ผ่าน cursor แยก (ไม่กระทบผลลัพธ์ที่ค้างอยู่)"""
+        if params is None:
+            return ["(executemany: ไม่มี plan)"]
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+        try:
+            rows = self._conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except Exception as e:
+            return [f"(EXPLAIN ไม่สำเร็จ: {e})"]
+        return [row[3] for row in rows]
+
+
+def timed_method(method):
+    """ห่อเมธอดของ ShabuDatabase ให้จับเวลาลง self.query_stats
+
+    generator คืนค่าทันทีโดยยังไม่ได้ทำงาน จับเวลาแบบนี้ไม่ได้ (คำสั่ง SQL ข้างในยังถูกจับเวลาโดย TimedCursor)
+    """
+    if inspect.isgeneratorfunction(method):
+        raise TypeError(f"timed_method: {method.__name__} เป็น generator จับเวลาแบบนี้ไม่ได้")
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            if self.cursor is not None:
+                self.cursor.flush()
+            self.query_stats.record_method(name, time.perf_counter() - started, error)
+
+    return wrapper
@@ -0,0 +1,273 @@
+"""
+วิเคราะห์ยอดขายเมนูและโต๊ะด้วย NumPy (ติดตั้งเพิ่ม: pip install numpy)
+- เมนูขายดี (จำนวน/ยอดขาย)
+- ยอดขายเฉลี่ยรายชั่วโมงแยกวันในสัปดาห์ (heatmap)
+- ยอดเฉลี่ยต่อบิลของแต่ละโต๊ะ และรอบโต๊ะ (จำนวนบิลต่อวัน, ช่วงห่างระหว่างบิล)
+
+ดึงหัวบิลเป็นคอลัมน์ทีละชุด (ShabuDatabase.iter_sales_columns) ลง array ที่จองไว้ล่วงหน้า
+แล้ว group by ด้วย np.bincount ทั้งหมด (ไม่วนทีละแถวด้วย dict)
+ยอดรายเมนูอ่านจากตารางสรุป summary_menu (วันตามเวลาท้องถิ่นตรงกับช่วงวันที่ที่กรอง)
+ไม่ดึงรายการในบิลทีละแถว ข้อมูลหนึ่งปีจึงวิเคราะห์ได้ในเวลาต่ำกว่าหนึ่งวินาที
+
+ใช้งาน:
+    python sales_analytics.py                                   ทั้งหมด
+    python sales_analytics.py --from 2024-01-01 --to 2024-12-31
+    (ในโปรแกรม: รายงานยอดขาย -> วิเคราะห์)
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # ไม่มี NumPy ก็ใช้โปรแกรมได้ตามปกติ แค่เปิดการวิเคราะห์ไม่ได้
+    np = None
+
+# จำนวนแถวที่ดึงต่อครั้ง
+FETCH_ROWS = 20000
+WEEKDAYS = ("จันทร์", "อังคาร", "พุธ", "พฤหัส", "ศุกร์", "เสาร์", "อาทิตย์")
+
+
+def available():
+    """ติดตั้ง NumPy แล้วหรือยัง"""
+    return np is not None
+
+
+class Columns:
+    """array ต่อคอลัมน์ที่จองไว้ล่วงหน้า ขยายเป็นสองเท่าเมื่อข้อมูลมากกว่าที่นับไว้"""
+
+    def __init__(self, capacity, dtypes):
+        self.size = 0
+        self.arrays = [np.empty(max(capacity, 1), dtype) for dtype in dtypes]
+
+    def append(self, columns):
+        count = len(columns[0])
+        end = self.size + count
+        if end > len(self.arrays[0]):
+            self.arrays = [np.resize(array, max(end, 2 * len(array))) for array in self.arrays]
+        for array, values in zip(self.arrays, columns):
+            array[self.size:end] = values
+        self.size = end
+
+    def result(self):
+        return [array[:self.size] for array in self.arrays]
+
+
+class Codes:
+    """แปลงชื่อโต๊ะเป็นเลขรหัส 0..n-1 เพื่อใช้เป็น index ของ bincount"""
+
+    def __init__(self):
+        self.index = {}
+
+    def encode(self, names):
+        codes = list(map(self.index.get, names))
+        if None in codes:
+            codes = [self.index.setdefault(name, len(self.index)) for name in names]
+        return codes
+
+    def names(self):
+        return list(self.index)
+
+
+def utc_offset():
+    """ส่วนต่างเวลาท้องถิ่นกับ UTC (วินาที) ใช้ค่าเดียวทั้งช่วง (เวลาไทยไม่มี daylight saving)"""
+    return int(datetime.now().astimezone().utcoffset().total_seconds())
+
+
+def load_sales(db, date_from=None, date_to=None):
+    """ดึงบิลของช่วงวันที่ (รวมไฟล์ archive) เป็น NumPy array และยอดรายเมนูจากตารางสรุป
+
+    คืนค่า dict: bill_table, bill_total, bill_time (วินาทีเวลาท้องถิ่น), tables,
+    menu, menu_quantity, menu_revenue, items
+    """
+    # จองตามจำนวนบิลในตารางสรุป (ไม่ต้องนับจากประวัติการขายก่อน)
+    days = db.get_daily_summary(date_from, date_to)
+    tables = Codes()
+    bills = Columns(sum(day['bills'] for day in days), (np.int32, np.int64, np.int64))
+    offset = utc_offset()
+    for names, totals, created_at in db.iter_sales_columns(date_from, date_to, FETCH_ROWS):
+        # แปลงข้อความ created_at (UTC) เป็นวินาทีทั้งชุดด้วย NumPy แทน strftime ทีละแถวใน SQL
+        times = np.array(created_at, dtype="datetime64[s]").astype(np.int64) + offset
+        bills.append([tables.encode(names), totals, times])
+    bill_table, bill_total, bill_time = bills.result()
+
+    menu = db.get_menu_summary(date_from, date_to)
+    return {
+        'bill_table': bill_table,
+        'bill_total': bill_total,
+        'bill_time': bill_time,
+        'tables': tables.names(),
+        'menu': [row['name'] for row in menu],
+        'menu_quantity': np.array([row['quantity'] for row in menu], dtype=np.int64),
+        'menu_revenue': np.array([row['revenue'] for row in menu], dtype=np.int64),
+        'items': sum(day['items'] for day in days),
+    }
+
+
+def best_sellers(data, top=10):
+    """เมนูขายดีตามจำนวน พร้อมยอดขายและสัดส่วนของยอดรวม"""
+    quantity, revenue = data['menu_quantity'], data['menu_revenue']
+    total = revenue.sum() or 1
+    order = np.argsort(-quantity, kind="stable")[:top]
+    return [{
+        'name': data['menu'][code],
+        'quantity': int(quantity[code]),
+        'revenue': int(revenue[code]),
+        'share': round(float(revenue[code] / total) * 100, 1)
+    } for code in order if quantity[code] > 0]
+
+
+def hourly_heatmap(data):
+    """ยอดขายเฉลี่ยต่อวันแยกวันในสัปดาห์ x ชั่วโมง (7 x 24, จันทร์ = แถวแรก)"""
+    day = data['bill_time'] // 86400
+    hour = (data['bill_time'] % 86400) // 3600
+    weekday = (day + 3) % 7  # 1970-01-01 เป็นวันพฤหัส
+    revenue = np.bincount(weekday * 24 + hour, weights=data['bill_total'],
+                          minlength=7 * 24).reshape(7, 24)
+    bills = np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24)
+    # หารด้วยจำนวนวันที่เปิดขายของแต่ละวันในสัปดาห์
+    open_days = np.bincount((np.unique(day) + 3) % 7, minlength=7)
+    per_day = np.maximum(open_days, 1)[:, None]
+    return {
+        'revenue': (revenue / per_day).round().astype(int).tolist(),
+        'bills': (bills / per_day).round(1).tolist(),
+        'open_days': open_days.tolist(),
+    }
+
+
+def table_performance(data):
+    """ยอดเฉลี่ยต่อบิลและรอบโต๊ะของแต่ละโต๊ะ เรียงตามยอดขาย
+
+    ระบบไม่ได้บันทึกเวลาที่ลูกค้านั่ง รอบโต๊ะจึงวัดจากจำนวนบิลต่อวันที่เปิดขาย
+    และช่วงห่างเฉลี่ยระหว่างบิลที่ต่อกันของโต๊ะเดียวกันในวันเดียวกัน
+    """
+    count = len(data['tables'])
+    table, total, when = data['bill_table'], data['bill_total'], data['bill_time']
+    bills = np.bincount(table, minlength=count)
+    revenue = np.bincount(table, weights=total, minlength=count)
+    open_days = max(len(np.unique(when // 86400)), 1)
+
+    order = np.lexsort((when, table))
+    table_sorted, when_sorted = table[order], when[order]
+    same = ((table_sorted[1:] == table_sorted[:-1])
+            & (when_sorted[1:] // 86400 == when_sorted[:-1] // 86400))
+    gaps = np.diff(when_sorted)[same]
+    gap_table = table_sorted[1:][same]
+    gap_count = np.bincount(gap_table, minlength=count)
+    gap_total = np.bincount(gap_table, weights=gaps, minlength=count)
+
+    rows = []
+    for code in np.argsort(-revenue, kind="stable"):
+        if not bills[code]:
+            continue
+        rows.append({
+            'table': data['tables'][code],
+            'bills': int(bills[code]),
+            'revenue': int(revenue[code]),
+            'average': round(float(revenue[code] / bills[code]), 2),
+            'turns_per_day': round(float(bills[code] / open_days), 2),
+            'gap_minutes': (round(float(gap_total[code] / gap_count[code]) / 60, 1)
+                            if gap_count[code] else None),
+        })
+    return rows, (round(float(np.median(gaps)) / 60, 1) if len(gaps) else None)
+
+
+def analyze(db, date_from=None, date_to=None, top=10):
+    """วิเคราะห์ยอดขายช่วงวันที่ คืนค่า dict สำหรับรายงาน (เวลาที่ใช้อยู่ใน 'seconds')"""
+    started = time.perf_counter()
+    data = load_sales(db, date_from, date_to)
+    loaded = time.perf_counter()
+    tables, median_gap = table_performance(data)
+    result = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'bills': len(data['bill_total']),
+        'items': data['items'],
+        'revenue': int(data['bill_total'].sum()),
+        'average_bill': (round(float(data['bill_total'].mean()), 2)
+                         if len(data['bill_total']) else 0.0),
+        'best_sellers': best_sellers(data, top),
+        'heatmap': hourly_heatmap(data),
+        'tables': tables,
+        'median_gap_minutes': median_gap,
+    }
+    result['seconds'] = {'load': round(loaded - started, 3),
+                         'analyze': round(time.perf_counter() - loaded, 3)}
+    return result
+
+
+def last_year(day=None):
+    """ช่วงวันที่ 365 วันย้อนหลังถึง day (ค่าเริ่มต้นวันนี้) รูปแบบ 'YYYY-MM-DD'"""
+    end = datetime.strptime(day, "%Y-%m-%d").date() if day else date.today()
+    return (end - timedelta(days=364)).isoformat(), end.isoformat()
+
+
+# ==================== Text Report ====================
+
+HEAT_SHADES = " ░▒▓█"
+
+
+def format_report(result):
+    """รายงานแบบข้อความ (ใช้ทั้งหน้าต่างรายงานและ command line)"""
+    period = (f"{result['date_from']} ถึง {result['date_to']}"
+              if result['date_from'] or result['date_to'] else "ทั้งหมด")
+    text = f"===== วิเคราะห์ยอดขาย {period} =====\n"
+    text += f"บิล {result['bills']:,}  จำนวนชิ้น {result['items']:,}  ยอดขาย {result['revenue']:,} บาท  "
+    text += f"เฉลี่ย/บิล {result['average_bill']:,.2f}\n"
+    text += (f"(โหลด {result['seconds']['load'] * 1000:.0f} ms "
+             f"คำนวณ {result['seconds']['analyze'] * 1000:.0f} ms)\n")
+
+    text += f"\n--- เมนูขายดี ---\n{'เมนู':<20} {'จำนวน':>8} {'ยอดขาย':>12} {'%':>6}\n"
+    for row in result['best_sellers']:
+        text += f"{row['name']:<20} {row['quantity']:>8,} {row['revenue']:>12,} {row['share']:>6}\n"
+
+    # แสดงเฉพาะชั่วโมงที่มีการขาย (ช่วงเวลาเปิดร้าน)
+    heatmap = result['heatmap']['revenue']
+    hours = [hour for hour in range(24) if any(row[hour] for row in heatmap)]
+    if hours:
+        hours = range(hours[0], hours[-1] + 1)
+        peak = max(max(row[hour] for hour in hours) for row in heatmap) or 1
+        text += f"\n--- ยอดขายเฉลี่ยรายชั่วโมง (เต็มช่อง = {peak:,} บาท/ชม.) ---\n"
+        text += " " * 7 + "".join(f"{hour:>3}" for hour in hours) + "\n"
+        for name, row in zip(WEEKDAYS, heatmap):
+            cells = "".join(" " + HEAT_SHADES[round(row[hour] / peak * 4)] * 2 for hour in hours)
+            text += f"{name:<7}{cells}\n"
+        busiest = sorted(((row[hour], name, hour) for name, row in zip(WEEKDAYS, heatmap)
+                          for hour in hours), reverse=True)[:5]
+        text += "ช่วงขายดี: " + ", ".join(f"{name} {hour:02d}:00 ({revenue:,})"
+                                          for revenue, name, hour in busiest if revenue) + "\n"
+
+    text += f"\n--- โต๊ะ (ช่วงห่างระหว่างบิลกลาง {result['median_gap_minutes'] or '-'} นาที) ---\n"
+    text += f"{'โต๊ะ':<8} {'บิล':>7} {'ยอดขาย':>12} {'เฉลี่ย/บิล':>10} {'รอบ/วัน':>8} {'ห่าง (นาที)':>11}\n"
+    for row in result['tables']:
+        gap = f"{row['gap_minutes']:.0f}" if row['gap_minutes'] is not None else "-"
+        text += (f"{row['table']:<8} {row['bills']:>7,} {row['revenue']:>12,} "
+                 f"{row['average']:>10,.0f} {row['turns_per_day']:>8.1f} {gap:>11}\n")
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="วิเคราะห์เมนูขายดี ชั่วโมงขายดี และรอบโต๊ะ")
+    parser.add_argument("--db", default="shabu_pos.db", help="ไฟล์ฐานข้อมูลของร้าน")
+    parser.add_argument("--from", dest="date_from", help="วันที่เริ่ม (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="วันที่สิ้นสุด (YYYY-MM-DD รวมวันนี้)")
+    parser.add_argument("--top", type=int, default=10, help="จำนวนเมนูขายดีที่แสดง")
+    args = parser.parse_args(argv)
+
+    if not available():
+        print("✗ ต้องติดตั้ง NumPy ก่อน: pip install numpy")
+        return 1
+
+    from database import ShabuDatabase
+    db = ShabuDatabase(args.db)
+    try:
+        print(format_report(analyze(db, args.date_from, args.date_to, args.top)))
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+วัดความลื่นของหน้าจอ Tk (เปิดใช้เมื่อต้องการเท่านั้น)
+- heartbeat ด้วย root.after ทุก interval_ms วัดว่า event loop ถูกบล็อกนานเท่าไร
+- จับเวลาแต่ละ callback ของปุ่ม แยกเป็นเวลาฐานข้อมูลกับเวลาวาดหน้าจอ
+- บันทึก cProfile (.prof) และ folded stacks สำหรับทำ flamegraph เมื่อสั่ง
+
+ใช้งาน:
+    python main_with_database.py --profile
+    (ในโปรแกรม: Ctrl+Shift+P เริ่ม/หยุดบันทึก cProfile, Ctrl+Shift+D ดูสรุป)
+"""
+
+import cProfile
+import functools
+import os
+import pstats
+import time
+from collections import deque
+from datetime import datetime
+
+from query_stats import percentile
+
+# heartbeat ที่ช้ากว่านี้ถือว่าหน้าจอกระตุก (มิลลิวินาที)
+STUTTER_MS = 100
+# จำนวนค่าล่าสุดที่เก็บไว้คำนวณ percentile ต่อคำสั่ง
+SAMPLE_SIZE = 2000
+
+
+class UIProfiler:
+    """วัดเวลาบน Tk main thread ของ ShabuPOS
+
+    เวลาฐานข้อมูลคือเวลาคำสั่ง SQL ที่รันบนการเชื่อมต่อของหน้าจอ (db.query_stats)
+    ระหว่าง callback ส่วนที่เหลือถือเป็นเวลาวาดหน้าจอ/ตรรกะ Python
+    งานที่ส่งให้ DatabaseWorker ไม่บล็อกหน้าจอ จึงไม่นับรวม
+    """
+
+    def __init__(self, root, db, interval_ms=50, output_dir="profiles"):
+        self.root = root
+        self.db = db
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.commands = {}
+        self.lags = deque(maxlen=SAMPLE_SIZE)
+        self.lag_max = 0.0
+        self.stutters = 0
+        self.ticks = 0
+        self.profile = None
+        self._depth = 0
+        self._expected = time.perf_counter() + self.interval
+        self.root.after(interval_ms, self._heartbeat)
+
+    # ==================== Event Loop Lag ====================
+
+    def _heartbeat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        self.ticks += 1
+        self.lags.append(lag)
+        self.lag_max = max(self.lag_max, lag)
+        if lag * 1000 >= STUTTER_MS:
+            self.stutters += 1
+        self._expected = now + self.interval
+        self.root.after(int(self.interval * 1000), self._heartbeat)
+
+    # ==================== Command Timing ====================
+
+    def wrap(self, name, callback):
+        """คืน callback ที่จับเวลาลงชื่อ name (callback ซ้อนกันนับเฉพาะชั้นนอกสุด)"""
+        @functools.wraps(callback)
+        def timed(*args, **kwargs):
+            if self._depth:
+                return callback(*args, **kwargs)
+            self._depth += 1
+            db_before = self.db.query_stats.total_time
+            started = time.perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                db_time = min(elapsed, max(0.0, self.db.query_stats.total_time - db_before))
+                self._depth -= 1
+                self._record(name, elapsed, db_time)
+        return timed
+
+    def _record(self, name, elapsed, db_time):
+        entry = self.commands.get(name)
+        if entry is None:
+            entry = self.commands[name] = {
+                "count": 0, "total": 0.0, "db": 0.0, "max": 0.0,
+                "samples": deque(maxlen=SAMPLE_SIZE),
+            }
+        entry["count"] += 1
+        entry["total"] += elapsed
+        entry["db"] += db_time
+        entry["max"] = max(entry["max"], elapsed)
+        entry["samples"].append(elapsed)
+
+    # ==================== Report ====================
+
+    def snapshot(self):
+        """สรุปเวลา (มิลลิวินาที) ของ event loop และแต่ละคำสั่ง"""
+        lags = sorted(self.lags)
+        commands = []
+        for name, entry in self.commands.items():
+            samples = sorted(entry["samples"])
+            commands.append({
+                "command": name,
+                "count": entry["count"],
+                "total_ms": round(entry["total"] * 1000, 3),
+                "db_ms": round(entry["db"] * 1000, 3),
+                "widget_ms": round((entry["total"] - entry["db"]) * 1000, 3),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+                "max_ms": round(entry["max"] * 1000, 3),
+            })
+        commands.sort(key=lambda row: row["total_ms"], reverse=True)
+        return {
+            "loop": {
+                "interval_ms": self.interval * 1000,
+                "ticks": self.ticks,
+                "lag_p50_ms": round(percentile(lags, 0.50) * 1000, 3),
+                "lag_p99_ms": round(percentile(lags, 0.99) * 1000, 3),
+                "lag_max_ms": round(self.lag_max * 1000, 3),
+                "stutters": self.stutters,
+            },
+            "commands": commands,
+            "recording": self.profile is not None,
+        }
+
+    def folded_stacks(self):
+        """เวลาของแต่ละคำสั่งในรูปแบบ folded stacks (ใช้กับ flamegraph.pl / speedscope)"""
+        lines = []
+        for name, entry in self.commands.items():
+            db_us = int(entry["db"] * 1_000_000)
+            widget_us = int((entry["total"] - entry["db"]) * 1_000_000)
+            if db_us:
+                lines.append(f"ShabuPOS;{name};database {db_us}")
+            if widget_us:
+                lines.append(f"ShabuPOS;{name};widgets {widget_us}")
+        return "\n".join(lines) + "\n"
+
+    # ==================== cProfile ====================
+
+    def start_recording(self):
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop_recording(self):
+        """หยุดบันทึกแล้วเขียนไฟล์ .prof (cProfile), .txt (สรุป) และ .folded
+
+        คืนค่า path ของไฟล์ .prof หรือ None ถ้ายังไม่ได้เริ่มบันทึก
+        """
+        if self.profile is None:
+            return None
+        profile, self.profile = self.profile, None
+        profile.disable()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, datetime.now().strftime("ui-%Y%m%d-%H%M%S"))
+        profile.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(40)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            f.write(self.folded_stacks())
+        return base + ".prof"
+
+    def toggle_recording(self):
+        """เริ่มหรือหยุดบันทึก cProfile คืนค่า path ไฟล์เมื่อหยุด"""
+        if self.profile is None:
+            self.start_recording()
+            return None
+        return self.stop_recording()